@@ -0,0 +1,15 @@
+import os
+
+import pandas as pd
+import pytest
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tradeBot", "format_data")
+
+
+def load_format(name: str) -> pd.DataFrame:
+    return pd.read_csv(os.path.join(DATA_DIR, f"{name}_format.csv"))
+
+
+@pytest.fixture(scope="session")
+def btc() -> pd.DataFrame:
+    return load_format("BTC")
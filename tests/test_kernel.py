@@ -0,0 +1,105 @@
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tradeBot.account import MockAccount, OrderSide
+from tradeBot.backtest import BackTest, TimeFrame
+from tradeBot.kernel import ExecutionKernel, ShortRule
+from tradeBot.strategy import Strategy
+
+from .conftest import load_format
+
+
+def replay(account: MockAccount, merged: pd.DataFrame, tp_multiple: float = 2.0):
+    """逐根K线驱动 MockAccount 的参考实现(原 BackTest._execute_trades 的循环，开启强平时止损取强平价与止损价中较低者)"""
+    high = merged['high'].to_numpy(dtype=float)
+    low = merged['low'].to_numpy(dtype=float)
+    close = merged['close'].to_numpy(dtype=float)
+    signal = merged['short_signal'].to_numpy(dtype=bool)
+    times = merged['open_time'].to_numpy()
+    equity = [account.balance]
+    for i in range(1, len(merged)):
+        if signal[i] and "WLD" not in account.positions:
+            stop_loss = high[i - 1]
+            take_profit = close[i] - (stop_loss - close[i]) * tp_multiple
+            account.open_position("WLD", OrderSide.SHORT, close[i], stop_loss, take_profit, times[i])
+        position = account.positions.get("WLD")
+        if position is None:
+            equity.append(account.balance)
+            continue
+        stop = position.stop_loss
+        if position.liquidation_price is not None:
+            stop = min(stop, position.liquidation_price)
+        if high[i] >= stop or low[i] <= position.take_profit:
+            price = stop if high[i] >= stop else position.take_profit
+            account.close_position("WLD", price, times[i])
+        equity.append(account.balance)
+    return np.asarray(equity)
+
+
+def merged_bars(btc, alt: str, timeframe: TimeFrame) -> pd.DataFrame:
+    strategy = {TimeFrame.HOUR: Strategy.BTC_WLD_hour, TimeFrame.FOUR_HOUR: Strategy.BTC_WLD_4hour}[timeframe]
+    df_alt = load_format(alt)
+    signals, _ = strategy(df_alt.copy(), btc.copy())
+    data = df_alt.copy()
+    data['open_time'] = pd.to_datetime(data['open_time'])
+    if timeframe == TimeFrame.FOUR_HOUR:
+        data = Strategy._convert_to_4h(data)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return BackTest(MockAccount())._prepare_data(data, signals, timeframe)
+
+
+@pytest.mark.parametrize("alt", ["WLD", "ARB"])
+@pytest.mark.parametrize("timeframe", [TimeFrame.HOUR, TimeFrame.FOUR_HOUR])
+@pytest.mark.parametrize("initial_balance,leverage,liquidation", [(1000.0, 20.0, False), (200.0, 50.0, True)])
+def test_kernel_matches_mock_account(btc, alt, timeframe, initial_balance, leverage, liquidation):
+    merged = merged_bars(btc, alt, timeframe)
+    account = MockAccount(initial_balance, leverage, liquidation=liquidation)
+    equity = replay(account, merged)
+
+    result = ExecutionKernel.run_short(
+        merged['high'].to_numpy(dtype=float), merged['low'].to_numpy(dtype=float),
+        merged['close'].to_numpy(dtype=float), merged['short_signal'].to_numpy(dtype=bool),
+        fee_rate=account.fee_rate, position_value=account.fixed_position_value,
+        leverage=account.leverage, initial_balance=account.initial_balance, liquidation=liquidation)
+
+    orders = account.orders.array
+    trades = result.trades
+    assert len(trades) == len(orders) > 0
+    np.testing.assert_array_equal(trades['size'], orders['size'])
+    np.testing.assert_array_equal(trades['entry_price'], orders['entry_price'])
+    np.testing.assert_array_equal(trades['stop_loss'], orders['stop_loss'])
+    closed = trades['exit_idx'] >= 0
+    np.testing.assert_array_equal(trades['exit_price'][closed], orders['close_price'][closed])
+    np.testing.assert_allclose(trades['pnl'][closed], orders['pnl'][closed], rtol=0, atol=1e-12)
+    np.testing.assert_allclose(result.equity, equity, rtol=1e-12)
+    assert result.balance == pytest.approx(account.balance, rel=1e-12)
+    assert result.equity_peak == pytest.approx(account.equity_peak, rel=1e-12)
+    assert result.max_drawdown == pytest.approx(account.max_drawdown, rel=1e-12)
+    if liquidation:
+        # 单笔亏损不超过保证金，余额不会为负
+        assert (trades['pnl'] >= -account.fixed_position_value).all()
+        assert result.equity.min() >= 0
+    else:
+        assert not trades['liquidated'].any()
+
+
+def test_short_rule_gates_entries_and_exits():
+    bars = [dict(high=h, low=l, close=c) for h, l, c in
+            [(10.0, 9.0, 9.5), (9.8, 9.0, 9.2), (9.9, 9.1, 9.6), (9.7, 8.5, 8.8)]]
+    rule = ShortRule(tp_multiple=2.0)
+    assert not rule.can_enter()
+    rule.prev_high = bars[0]['high']
+    assert rule.can_enter()
+    rule.entered(bars[1])
+    # 止损为前一根最高价，止盈为2倍止损距离
+    assert (rule.stop, rule.target) == (10.0, pytest.approx(9.2 - 0.8 * 2))
+    assert rule.in_position and not rule.can_enter()
+    assert not rule.exit_due(bars[2])
+    assert rule.exit_due(dict(high=10.0, low=9.5, close=9.8))
+    assert rule.exit_due(dict(high=8.0, low=7.5, close=7.8))
+    rule.exited()
+    assert rule.can_enter() and not rule.in_position
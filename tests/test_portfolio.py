@@ -0,0 +1,41 @@
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tradeBot.account import MockAccount
+from tradeBot.backtest import BackTest, TimeFrame
+from tradeBot.panel import Panel
+from tradeBot.portfolio import PortfolioBackTest
+from tradeBot.strategy import Strategy
+
+from .conftest import load_format
+
+
+@pytest.mark.parametrize("initial_balance,leverage,liquidation", [(1000.0, 20.0, False), (200.0, 50.0, True)])
+def test_single_symbol_portfolio_matches_backtest(btc, initial_balance, leverage, liquidation):
+    df_alt = load_format("WLD")
+    signals, _ = Strategy.BTC_WLD_hour(df_alt.copy(), btc.copy())
+    data = df_alt.copy()
+    data['open_time'] = pd.to_datetime(data['open_time'])
+    account = MockAccount(initial_balance, leverage, liquidation=liquidation)
+    with contextlib.redirect_stdout(io.StringIO()):
+        BackTest(account).run(data, signals, TimeFrame.HOUR)
+
+    panel = Panel.from_frames({"WLD": df_alt, "BTC": btc})
+    portfolio = MockAccount(initial_balance, leverage, liquidation=liquidation)
+    backtest = PortfolioBackTest(portfolio)
+    backtest.run(panel, panel.short_signals("BTC"))
+
+    expected, actual = account.orders.array, portfolio.orders.array
+    assert len(actual) == len(expected) > 0
+    for field in expected.dtype.names:
+        if field != 'symbol':
+            np.testing.assert_array_equal(actual[field], expected[field], err_msg=field)
+    assert portfolio.balance == pytest.approx(account.balance, rel=1e-12)
+    # 保证金不超过已实现余额，余额不会为负
+    result = backtest.result
+    assert (result.margin <= result.balance + 1e-9).all()
+    assert result.balance.min() >= 0
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from tradeBot.signal_engine import StreamingSignal
+from tradeBot.strategy import Strategy
+
+from .conftest import load_format
+
+
+@pytest.mark.parametrize("alt", ["WLD", "ARB", "OP"])
+@pytest.mark.parametrize("timeframe", ["hour", "4hour", "day"])
+def test_vectorized_matches_scan(btc, alt, timeframe):
+    merged, time_key = Strategy._prepare_data(load_format(alt), btc.copy(), timeframe)
+    expected, expected_details = Strategy._generate_signals_scan(merged.copy(), time_key)
+    actual, actual_details = Strategy._generate_signals(merged.copy(), time_key)
+
+    assert expected['short_signal'].any()
+    np.testing.assert_array_equal(actual['short_signal'].to_numpy(), expected['short_signal'].to_numpy())
+    assert actual_details == expected_details
+
+
+PARAMS = [dict(streak_len=3, confirm_len=2, warmup=10),
+          dict(streak_len=2, confirm_len=3, warmup=5),
+          dict(streak_len=4, confirm_len=1, warmup=20),
+          dict(streak_len=2, confirm_len=4, warmup=0)]
+
+
+@pytest.mark.parametrize("params", PARAMS)
+def test_vectorized_matches_scan_with_params(btc, params):
+    merged, time_key = Strategy._prepare_data(load_format("WLD"), btc.copy(), "4hour")
+    expected, expected_details = Strategy._generate_signals_scan(merged.copy(), time_key, **params)
+    actual, actual_details = Strategy._generate_signals(merged.copy(), time_key, **params)
+
+    np.testing.assert_array_equal(actual['short_signal'].to_numpy(), expected['short_signal'].to_numpy())
+    assert actual_details == expected_details
+
+
+@pytest.mark.parametrize("params", PARAMS)
+def test_streaming_matches_vectorized(btc, params):
+    merged, time_key = Strategy._prepare_data(load_format("ARB"), btc.copy(), "hour")
+    expected, _ = Strategy._generate_signals(merged.copy(), time_key, **params)
+    expected = expected['short_signal'].to_numpy()
+
+    wld = merged['wld_change'].to_numpy()
+    bench = merged['btc_change'].to_numpy()
+    stream = StreamingSignal(**params)
+    np.testing.assert_array_equal([stream.update_change(w, b) for w, b in zip(wld, bench)], expected)
+
+    # 从历史数据热启动后继续逐行输入
+    split = len(merged) // 2
+    stream = StreamingSignal.from_merged(merged.iloc[:split], **params)
+    np.testing.assert_array_equal([stream.update_change(w, b) for w, b in zip(wld[split:], bench[split:])],
+                                  expected[split:])
@@ -1,33 +1,524 @@
-from .config import Config
-from .account import Account,MockAccount     
-from .db import DB
-import pandas as pd
-import numpy as np
-import os 
-from .strategy import Strategy
-from .backtest import BackTest,TimeFrame,BacktestVisualizer
-def main():
-    config=Config()
-    account=Account(config)
-    db=DB()
-    DB.export_to_csv(DB.add_MACD(DB.read_csv(config.WLD_PATH)),"/home/litterpigger/myprojects/futureBot/tradeBot/format_data/WLD.csv")
-    BTC_df=DB.read_csv(config.BTC_PATH)
-    ARB_df=DB.read_csv(config.ARB_PATH)
-    OP_df=DB.read_csv(config.OP_PATH)
-    merged_data, signal_details = Strategy.BTC_WLD_hour(ARB_df, BTC_df)
-    print(merged_data.head()) 
+"""
+python -m tradeBot <command>
+
+    ingest    CSV 或 Binance kline zip 目录转存到列式存储
+    backtest  单次回测，可保存账户和报告
+    scenarios 同一信号路径上批量评估 杠杆 × 仓位价值 × 手续费 组合
+    sweep     参数扫描(参数同 python -m tradeBot.sweep)
+    bench     合成数据上的流水线基准测试(参数同 python -m tradeBot.bench)
+    portfolio 多币种共用保证金的组合回测
+    live      实盘：订阅K线，出现信号且无持仓时开空，按止损/止盈平仓
+    report    从保存的账户并行渲染报告
+
+各子命令只导入自己需要的模块，离线命令不读取 user.cfg / Private_key，也不创建交易所客户端
+"""
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+DATA_DIR = os.path.join("tradeBot", "format_data")
+STORE_DIR = os.path.join("tradeBot", "store")
+TIMEFRAMES = ('hour', '4hour', 'day')
+# 所有子命令共用的无风险利率默认值，report 重新渲染的指标才能与 backtest 打印的一致
+RISK_FREE_RATE = 0.02
+# 回测用到的列，日线额外需要 day_change_static
+BAR_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume']
+# 参数原样转交给子模块 main 的子命令
+PASSTHROUGH = ('sweep', 'bench')
+# 带参数值的全局选项，定位子命令时跳过其取值
+GLOBAL_VALUE_OPTIONS = ('--timings-log',)
+
+
+class Timings:
+    """记录冷启动各阶段耗时(秒)，从解释器执行本模块开始计时"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._last = _STARTED
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.stages[stage] = now - self._last
+        self._last = now
+
+    def report(self, command: str, path: Optional[str] = None):
+        record = {'command': command, 'time': time.time(),
+                  'total': time.perf_counter() - _STARTED,
+                  **{k: round(v, 4) for k, v in self.stages.items()}}
+        print("timings: " + ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in self.stages.items())
+              + f", total={record['total'] * 1000:.0f}ms", file=sys.stderr)
+        if path:
+            # 追加到 JSON Lines 文件，便于跟踪冷启动时间的变化
+            with open(path, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def _symbol(name: str) -> str:
+    name = name.upper()
+    return name if name.endswith('USDT') else name + 'USDT'
+
+
+def _name(name: str) -> str:
+    """币种名(WLD)，CSV 路径取文件名中 _format.csv 之前的部分，用作重采样缓存和订单的 symbol"""
+    if name.endswith('.csv'):
+        return os.path.basename(name)[:-len('.csv')].replace('_format', '').upper()
+    return _symbol(name)[:-len('USDT')]
+
+
+def load_bars(name: str, timeframe: str = 'hour', start: Optional[str] = None, end: Optional[str] = None,
+              data_dir: str = DATA_DIR, store_dir: str = STORE_DIR):
     """
-    account = MockAccount(initial_balance=1000.0, leverage=20.0)
-    backtest = BackTest(account,risk_free_rate=0.02)
-    backtest.run(ARB_df,merged_data,TimeFrame.HOUR)
-    print(backtest)
-    # 运行回测
-    BV=BacktestVisualizer(account,timeframe=TimeFrame.HOUR)
-    BV.generate_report() 
+    读取一个币种的小时线，只取回测需要的列和 [start, end] 区间
+    name 可以是 CSV 路径；否则优先读列式存储中的 {SYMBOL} 1h，再退回 {data_dir}/{NAME}_format.csv
     """
-    
-   
-    
+    import pandas as pd
+    columns = BAR_COLUMNS + (['day_change_static'] if timeframe == 'day' else [])
+
+    if not name.endswith('.csv'):
+        from .store import MarketStore
+        store = MarketStore(store_dir)
+        if store.manifest(_symbol(name), '1h') is not None:
+            stored = store.manifest(_symbol(name), '1h')['columns']
+            return store.load(_symbol(name), '1h', start, end,
+                              columns=[c for c in columns if c in stored])
+        name = os.path.join(data_dir, f"{_symbol(name)[:-4]}_format.csv")
+
+    df = pd.read_csv(name, usecols=lambda c: c in columns)
+    df['open_time'] = pd.to_datetime(df['open_time'])
+    if start is not None:
+        df = df[df['open_time'] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df['open_time'] <= pd.Timestamp(end)]
+    return df.reset_index(drop=True)
+
+
+def cmd_ingest(args, timings: Timings):
+    import pandas as pd
+    from .ingest import KlineIngest
+    from .store import MarketStore
+    timings.mark('import')
+    store = MarketStore(args.store)
+    gaps = False
+    for path in args.paths:
+        if os.path.isdir(path):
+            # Binance 原始 kline 目录(月度/日度 zip 或解压出的 csv)
+            symbols = [_symbol(args.symbol)] if args.symbol else None
+            for report in KlineIngest(store, args.workers).run(path, symbols, append=args.append):
+                print(report.describe())
+                gaps = gaps or bool(report.gaps or report.misaligned)
+            continue
+        symbol = args.symbol or _symbol(os.path.basename(path).replace('-', '_').split('_')[0])
+        manifest = store.write(symbol, args.interval, pd.read_csv(path), append=args.append)
+        print(f"{path} -> {symbol} {args.interval}: {manifest['rows']} rows")
+    timings.mark('ingest')
+    if args.strict and gaps:
+        raise SystemExit(1)
+
+
+def _backtest_inputs(args, timings: Timings):
+    """backtest / scenarios 共用：读取K线并计算信号，返回 (行情, 信号, TimeFrame)"""
+    from .backtest import TimeFrame
+    from .strategy import Strategy
+    timings.mark('import')
+
+    df_alt = load_bars(args.alt, args.timeframe, args.start, args.end, args.data_dir, args.store)
+    df_bench = load_bars(args.bench, args.timeframe, args.start, args.end, args.data_dir, args.store)
+    timings.mark('load')
+
+    timeframe = TimeFrame(args.timeframe)
+    strategy = {TimeFrame.HOUR: Strategy.BTC_WLD_hour, TimeFrame.FOUR_HOUR: Strategy.BTC_WLD_4hour,
+                TimeFrame.DAY: Strategy.BTC_WLD}[timeframe]
+    symbols = (_name(args.alt), _name(args.bench))
+    data = df_alt
+    if args.cache:
+        # 信号和4小时线按输入数据内容缓存，只改回测参数时直接复用
+        from .cache import StageCache, fingerprint
+        from .resample import Resampler
+        from .signal_engine import SignalEngine
+        cache = StageCache(args.cache)
+        data_key = fingerprint(df_alt, df_bench)
+        signals, _ = cache.cached('signals', lambda: strategy(df_alt.copy(), df_bench.copy(), symbols), data_key,
+                                  code=(Strategy, SignalEngine, Resampler), timeframe=timeframe.value)
+        if timeframe == TimeFrame.FOUR_HOUR:
+            data = cache.cached('resample', lambda: Strategy._convert_to_4h(df_alt, symbols[0]), data_key,
+                                code=(Strategy, Resampler), timeframe=timeframe.value)
+    else:
+        # Strategy 拿到的是副本，按 symbol 与这里和 BackTest 共用同一份重采样结果
+        signals, _ = strategy(df_alt.copy(), df_bench.copy(), symbols)
+        if timeframe == TimeFrame.FOUR_HOUR:
+            data = Strategy._convert_to_4h(data, symbols[0])
+    timings.mark('signal')
+    return data, signals, timeframe
+
+
+def cmd_backtest(args, timings: Timings):
+    import contextlib
+    import io
+    from .account import MockAccount
+    from .backtest import BackTest
+
+    data, signals, timeframe = _backtest_inputs(args, timings)
+
+    account = MockAccount(initial_balance=args.initial_balance, leverage=args.leverage,
+                          liquidation=args.liquidation)
+    account.fixed_position_value = args.position_value
+    backtest = BackTest(account, risk_free_rate=args.risk_free_rate, tp_multiple=args.tp_multiple)
+    if args.profile:
+        from .telemetry import TELEMETRY
+        TELEMETRY.enable()
+    with contextlib.redirect_stdout(io.StringIO()):
+        metrics = backtest.run(data, signals, timeframe, _name(args.alt))
+    timings.mark('backtest')
+    if args.profile:
+        TELEMETRY.dump(args.profile)
+        print(f"profile: {args.profile}")
+
+    for key, value in metrics.items():
+        if key != 'Returns':
+            print(f"{key}: {value}")
+    if args.save_account:
+        import pickle
+        with open(args.save_account, 'wb') as f:
+            pickle.dump(account, f)
+    if args.report:
+        from .report import render_report
+        paths = render_report(account, timeframe, args.report, risk_free_rate=args.risk_free_rate)
+        print("report: " + ", ".join(paths))
+        timings.mark('report')
+    return metrics
+
+
+def cmd_portfolio(args, timings: Timings):
+    import pandas as pd
+    from .account import MockAccount
+    from .backtest import TimeFrame
+    from .panel import Panel
+    from .portfolio import PortfolioBackTest
+    timings.mark('import')
+
+    names = [args.bench] + [name for name in args.symbols if name != args.bench]
+    panel = Panel.from_frames({_symbol(name)[:-4]: load_bars(name, 'hour', args.start, args.end,
+                                                             args.data_dir, args.store)
+                               for name in names})
+    timings.mark('load')
+    signals = panel.short_signals(_symbol(args.bench)[:-4])
+    timings.mark('signal')
+
+    account = MockAccount(initial_balance=args.initial_balance, leverage=args.leverage,
+                          liquidation=args.liquidation)
+    account.fixed_position_value = args.position_value
+    backtest = PortfolioBackTest(account, risk_free_rate=args.risk_free_rate, tp_multiple=args.tp_multiple,
+                                 max_leverage=args.max_leverage, max_positions=args.max_positions)
+    metrics = backtest.run(panel, signals, TimeFrame.HOUR)
+    timings.mark('backtest')
+
+    for key, value in metrics.items():
+        if key != 'Returns':
+            print(f"{key}: {value}")
+    with pd.option_context('display.width', 120):
+        print(backtest.symbol_stats())
+    if args.save_account:
+        import pickle
+        with open(args.save_account, 'wb') as f:
+            pickle.dump(account, f)
+    return metrics
+
+
+def _floats(text: str) -> List[float]:
+    return [float(v) for v in text.split(',') if v]
+
+
+def cmd_scenarios(args, timings: Timings):
+    import pandas as pd
+    from .account import MockAccount
+    from .scenario import ScenarioBackTest
+
+    data, signals, timeframe = _backtest_inputs(args, timings)
+    account = MockAccount(initial_balance=args.initial_balance, leverage=20.0, liquidation=args.liquidation)
+    backtest = ScenarioBackTest(account, risk_free_rate=args.risk_free_rate, tp_multiple=args.tp_multiple)
+    table = backtest.run(data, signals, timeframe, _floats(args.leverage), _floats(args.position_value),
+                         _floats(args.fee_rate), symbol=_name(args.alt))
+    timings.mark('backtest')
+
+    if args.sort:
+        table = table.sort_values(args.sort, ascending=False, kind='stable').reset_index(drop=True)
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"scenarios: {args.output}")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(table.head(args.top) if args.top else table)
+    return table
+
+
+def cmd_sweep(args, timings: Timings):
+    from .sweep import main as sweep_main
+    timings.mark('import')
+    table = sweep_main(args.rest)
+    timings.mark('sweep')
+    return table
+
+
+def cmd_bench(args, timings: Timings):
+    from .bench import main as bench_main
+    timings.mark('import')
+    result = bench_main(args.rest)
+    timings.mark('bench')
+    return result
+
+
+def cmd_report(args, timings: Timings):
+    import pickle
+    from .backtest import TimeFrame
+    from .report import render_reports
+    timings.mark('import')
+    jobs = []
+    for path in args.accounts:
+        with open(path, 'rb') as f:
+            account = pickle.load(f)
+        prefix = os.path.join(args.out_dir, os.path.splitext(os.path.basename(path))[0])
+        jobs.append((account, TimeFrame(args.timeframe), prefix))
+    timings.mark('load')
+    for paths in render_reports(jobs, workers=args.workers, risk_free_rate=args.risk_free_rate):
+        print("report: " + ", ".join(paths))
+    timings.mark('report')
+
+
+def cmd_live(args, timings: Timings):
+    import asyncio
+    import pandas as pd
+    from binance.um_futures import UMFutures
+    from .config import Config
+    from .feed import CandleJoiner, KlineFeed
+    from .gateway import OrderGateway
+    from .kernel import ShortRule
+    from .signal_engine import StreamingSignal
+    from .telemetry import TELEMETRY, MetricsServer
+    timings.mark('import')
+
+    config = Config()
+    # 同步客户端只用来拉历史K线和断线补数据，下单走异步的 OrderGateway
+    client = UMFutures(key=config.API_KEY, private_key=config.SECRET_KEY)
+    alt, bench = config.TRADING_PAIR[0], config.BENCHMARK_PAIR
+
+    def history(symbol: str) -> pd.DataFrame:
+        rows = client.klines(symbol, config.KLINE_INTERVAL, limit=args.warmup_bars)
+        # 最后一根K线还没收盘，由 feed 推送
+        return pd.DataFrame({'open_time': pd.to_datetime([r[0] for r in rows[:-1]], unit='ms'),
+                             'high': [float(r[2]) for r in rows[:-1]],
+                             'close': [float(r[4]) for r in rows[:-1]]})
+
+    df_alt = history(alt)
+    signal = StreamingSignal.from_frames(df_alt, history(bench), streak_len=args.streak_len,
+                                         confirm_len=args.confirm_len, warmup=args.warmup)
+    rule = ShortRule(args.tp_multiple)
+    rule.prev_high = float(df_alt['high'].iloc[-1]) if len(df_alt) else None
+    timings.mark('warmup')
+
+    server = None
+    if args.metrics_port is not None:
+        TELEMETRY.enable()
+        server = MetricsServer(TELEMETRY, args.metrics_host, args.metrics_port).start()
+        print(f"metrics: {server.url}")
+
+    async def run():
+        async with OrderGateway.from_config(config) as gateway:
+            gateway.start_user_stream()
+            if gateway.cache.position(alt) != 0:
+                print(f"{alt} already has a position of {gateway.cache.position(alt)}; "
+                      f"no new entries until it is closed, its exits are not managed")
+
+            async def on_pair(alt_bar, bench_bar):
+                signal_ns = time.perf_counter_ns()
+                with TELEMETRY.span('signal'):
+                    short = signal.update(alt_bar, bench_bar)
+                when = pd.to_datetime(alt_bar.open_time, unit='ms')
+                if rule.in_position and not args.dry_run and gateway.cache.position(alt) == 0:
+                    # 仓位已在交易所侧平掉(强平或手动)
+                    print(f"{alt} position closed outside the bot")
+                    rule.exited()
+                if rule.exit_due(alt_bar):
+                    print(f"exit at {when}: stop {rule.stop:.6g}, target {rule.target:.6g}")
+                    if not args.dry_run:
+                        await gateway.close_position(alt, signal_ns=signal_ns)
+                    rule.exited()
+                elif short:
+                    TELEMETRY.inc('signals')
+                    if rule.can_enter() and (args.dry_run or gateway.cache.position(alt) == 0):
+                        print(f"short signal at {when}")
+                        if not args.dry_run:
+                            await gateway.open_order(alt, 'SELL', config.WLD_AMOUNT, signal_ns=signal_ns)
+                            # K线收盘(交易所时钟)到收到下单回报
+                            TELEMETRY.observe('order.close_to_ack', time.time() - alt_bar.close_time / 1000)
+                        rule.entered(alt_bar)
+                        print(f"stop {rule.stop:.6g}, target {rule.target:.6g}")
+                    else:
+                        print(f"short signal at {when} ignored: already short")
+                rule.prev_high = alt_bar['high']
+
+            feed = KlineFeed.from_config(config, CandleJoiner(alt, bench, on_pair), rest_client=client)
+            await feed.run()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server is not None:
+            server.stop()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m tradeBot", description="tradeBot command line")
+    parser.add_argument('--timings', action='store_true', help="print cold-start timings to stderr")
+    parser.add_argument('--timings-log', default=None, metavar='FILE',
+                        help="append cold-start timings to FILE as JSON lines")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('ingest', help="store klines in the columnar market store")
+    p.add_argument('paths', nargs='+', help="*_format.csv files or directories of Binance kline zips")
+    p.add_argument('--symbol', default=None, help="defaults to the file name prefix, e.g. WLD_format.csv -> WLDUSDT")
+    p.add_argument('--interval', default='1h')
+    p.add_argument('--store', default=STORE_DIR)
+    p.add_argument('--append', action='store_true')
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--strict', action='store_true', help="exit with status 1 when gaps are found")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser('backtest', help="run a single backtest")
+    p.add_argument('--alt', default='WLD', help="symbol (WLD / WLDUSDT) or *_format.csv path")
+    p.add_argument('--bench', default='BTC')
+    p.add_argument('--timeframe', default='hour', choices=TIMEFRAMES)
+    p.add_argument('--start', default=None)
+    p.add_argument('--end', default=None)
+    p.add_argument('--data-dir', default=DATA_DIR)
+    p.add_argument('--store', default=STORE_DIR)
+    p.add_argument('--initial-balance', type=float, default=1000.0)
+    p.add_argument('--leverage', type=float, default=20.0)
+    p.add_argument('--position-value', type=float, default=10.0)
+    p.add_argument('--tp-multiple', type=float, default=2.0)
+    p.add_argument('--liquidation', action='store_true',
+                   help="reserve position-value as margin per trade, refuse entries it cannot fund, "
+                        "liquidate at the margin-loss price")
+    p.add_argument('--risk-free-rate', type=float, default=RISK_FREE_RATE)
+    p.add_argument('--save-account', default=None, help="pickle the MockAccount for `report`")
+    p.add_argument('--report', default=None, help="render report images with this path prefix")
+    p.add_argument('--cache', default=None, metavar='DIR',
+                   help="reuse signals and resampled bars cached in DIR")
+    p.add_argument('--profile', default=None, metavar='FILE',
+                   help="write per-stage BackTest.run timings to FILE as JSON")
+    p.set_defaults(func=cmd_backtest)
+
+    p = sub.add_parser('scenarios', help="evaluate a leverage x position value x fee grid on one signal path")
+    p.add_argument('--alt', default='WLD', help="symbol (WLD / WLDUSDT) or *_format.csv path")
+    p.add_argument('--bench', default='BTC')
+    p.add_argument('--timeframe', default='hour', choices=TIMEFRAMES)
+    p.add_argument('--start', default=None)
+    p.add_argument('--end', default=None)
+    p.add_argument('--data-dir', default=DATA_DIR)
+    p.add_argument('--store', default=STORE_DIR)
+    p.add_argument('--initial-balance', type=float, default=1000.0)
+    p.add_argument('--leverage', default='20', help="comma-separated, e.g. 5,10,20")
+    p.add_argument('--position-value', default='10', help="comma-separated")
+    p.add_argument('--fee-rate', default='0.0002', help="comma-separated")
+    p.add_argument('--tp-multiple', type=float, default=2.0)
+    p.add_argument('--liquidation', action=argparse.BooleanOptionalAction, default=True,
+                   help="margin refusal and liquidation (on by default so margin exhaustion is modelled); "
+                        "--no-liquidation reproduces a plain backtest")
+    p.add_argument('--risk-free-rate', type=float, default=RISK_FREE_RATE)
+    p.add_argument('--cache', default=None, metavar='DIR',
+                   help="reuse signals and resampled bars cached in DIR")
+    p.add_argument('--sort', default=None, help="sort descending by this column, e.g. 'Sharpe Ratio'")
+    p.add_argument('--top', type=int, default=None)
+    p.add_argument('--output', default=None, help="write the table to this CSV file")
+    p.set_defaults(func=cmd_scenarios)
+
+    p = sub.add_parser('portfolio', help="backtest several symbols against one shared-margin account")
+    p.add_argument('symbols', nargs='+', help="symbols (WLD / WLDUSDT) or *_format.csv paths")
+    p.add_argument('--bench', default='BTC')
+    p.add_argument('--start', default=None)
+    p.add_argument('--end', default=None)
+    p.add_argument('--data-dir', default=DATA_DIR)
+    p.add_argument('--store', default=STORE_DIR)
+    p.add_argument('--initial-balance', type=float, default=1000.0)
+    p.add_argument('--leverage', type=float, default=20.0)
+    p.add_argument('--position-value', type=float, default=10.0)
+    p.add_argument('--tp-multiple', type=float, default=2.0)
+    p.add_argument('--max-leverage', type=float, default=None,
+                   help="extra cap on gross notional / equity, off by default (margin already limits it)")
+    p.add_argument('--max-positions', type=int, default=None)
+    p.add_argument('--liquidation', action='store_true',
+                   help="also liquidate each short at the price where its loss equals its margin")
+    p.add_argument('--risk-free-rate', type=float, default=RISK_FREE_RATE)
+    p.add_argument('--save-account', default=None, help="pickle the MockAccount for `report`")
+    p.set_defaults(func=cmd_portfolio)
+
+    p = sub.add_parser('sweep', add_help=False, help="parameter sweep, see python -m tradeBot.sweep --help")
+    p.add_argument('rest', nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_sweep)
+
+    p = sub.add_parser('bench', add_help=False, help="pipeline benchmark, see python -m tradeBot.bench --help")
+    p.add_argument('rest', nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser('live', help="trade live on closed klines (reads user.cfg and Private_key)")
+    p.add_argument('--warmup-bars', type=int, default=500)
+    p.add_argument('--dry-run', action='store_true', help="log signals without placing orders")
+    p.add_argument('--streak-len', type=int, default=3, help="signal parameters, same as the sweep")
+    p.add_argument('--confirm-len', type=int, default=2)
+    p.add_argument('--warmup', type=int, default=10)
+    p.add_argument('--tp-multiple', type=float, default=2.0, help="take profit at this multiple of the stop distance")
+    p.add_argument('--metrics-port', type=int, default=None,
+                   help="serve latency histograms in Prometheus text format on this port")
+    p.add_argument('--metrics-host', default='127.0.0.1')
+    p.set_defaults(func=cmd_live)
+
+    p = sub.add_parser('report', help="render reports for pickled accounts in parallel")
+    p.add_argument('accounts', nargs='+')
+    p.add_argument('--timeframe', default='hour', choices=TIMEFRAMES)
+    p.add_argument('--out-dir', default='reports')
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--risk-free-rate', type=float, default=RISK_FREE_RATE)
+    p.set_defaults(func=cmd_report)
+    return parser
+
+
+def _command_index(argv: List[str]) -> Optional[int]:
+    """跳过全局选项，返回子命令在 argv 中的位置"""
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in GLOBAL_VALUE_OPTIONS:
+            i += 2
+        elif arg.startswith('-'):
+            i += 1
+        else:
+            return i
+    return None
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    # sweep / bench 的参数原样转交，包括 --help；只看全局选项之后的子命令位置
+    i = _command_index(argv)
+    if i is not None and argv[i] in PASSTHROUGH:
+        args = parser.parse_args(argv[:i + 1])
+        args.rest = argv[i + 1:]
+    else:
+        args = parser.parse_args(argv)
+    timings = Timings()
+    timings.mark('startup')
+    result = args.func(args, timings)
+    if args.timings or args.timings_log:
+        timings.report(args.command, args.timings_log)
+    return result
+
 
-  
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
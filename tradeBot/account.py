@@ -1,22 +1,31 @@
-from binance.um_futures import UMFutures
 from .config import Config
-from typing import Dict,Set
+from typing import Dict,Set,Optional
 from datetime import datetime
 from enum import Enum
 from dataclasses import dataclass
 import numpy as np
-config=Config()
+import pandas as pd
+from .kernel import cap_loss, liquidation_price
+from .telemetry import TELEMETRY
 class Account:
-    def __init__(self,config:Config):
-        self.client=UMFutures(key=config.API_KEY,private_key=config.SECRET_KEY)
+    def __init__(self,config:Config,client=None):
+        # client 可以注入 UMFutures 兼容的对象(如 exchange.MockExchange)，用于离线压测
+        if client is None:
+            # 只有实盘才需要交易所客户端，回测不导入 binance
+            from binance.um_futures import UMFutures
+            client=UMFutures(key=config.API_KEY,private_key=config.SECRET_KEY)
+        self.client=client
     def open_order(self,config:Config):
-        params = {
-            'symbol': 'WLDUSDT',
-            'side': 'SELL',
-            'type': 'MARKET',
-            'quantity': config.WLD_AMOUNT,
-        }
-        self.client.new_order(**params)
+        with TELEMETRY.span('sizing'):
+            params = {
+                'symbol': 'WLDUSDT',
+                'side': 'SELL',
+                'type': 'MARKET',
+                'quantity': config.WLD_AMOUNT,
+            }
+        with TELEMETRY.span('exchange.new_order'):
+            self.client.new_order(**params)
+        TELEMETRY.inc('orders_opened')
         print("Successfully open order with amount of", config.WLD_AMOUNT)
     def get_all_orders(self,config:Config):  
         all_orders=self.client.get_position_risk()
@@ -31,7 +40,8 @@ class Account:
        
 
     def close_position(self,keypair):
-        position_info=self.client.get_position_risk(symbol=keypair)[0]
+        with TELEMETRY.span('exchange.get_position_risk'):
+            position_info=self.client.get_position_risk(symbol=keypair)[0]
         
         position_amount=float(position_info.get('positionAmt'))
         position_abs_amount=abs(position_amount)
@@ -47,7 +57,9 @@ class Account:
             'quantity': position_abs_amount,
             'side':side
         } 
-        response=self.client.new_order(**close_param)
+        with TELEMETRY.span('exchange.new_order'):
+            response=self.client.new_order(**close_param)
+        TELEMETRY.inc('positions_closed')
         print(response)
 
     def get_balance(self)->Dict[str,str]:
@@ -84,8 +96,314 @@ class Order:
     close_price: float = None
     pnl: float = 0.0
 
+# 成交台账的行格式，时间为 datetime64[ns]，未平仓时 close_time 为 NaT、close_price 为 NaN
+LEDGER_DTYPE = np.dtype([
+    ('symbol', np.int32),        # TradeLedger.symbols 中的下标
+    ('side', np.int8),           # 1 做多，-1 做空
+    ('status', np.int8),         # 0 OPEN，1 CLOSED
+    ('size', np.float64),
+    ('entry_price', np.float64),
+    ('stop_loss', np.float64),
+    ('take_profit', np.float64),
+    ('open_time', 'M8[ns]'),
+    ('close_time', 'M8[ns]'),
+    ('close_price', np.float64),
+    ('pnl', np.float64),
+])
+
+_SIDE_CODES = {OrderSide.LONG: 1, OrderSide.SHORT: -1}
+_SIDES = {1: OrderSide.LONG, -1: OrderSide.SHORT}
+_STATUS_CODES = {OrderStatus.OPEN: 0, OrderStatus.CLOSED: 1}
+_STATUSES = {0: OrderStatus.OPEN, 1: OrderStatus.CLOSED}
+
+
+def _to_datetime64(values) -> np.ndarray:
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values.astype('M8[ns]', copy=False)
+    return pd.to_datetime(values).to_numpy(dtype='M8[ns]')
+
+
+class OrderView:
+    """台账中一行的对象视图，字段读写直接落在台账数组上，接口与 Order 相同"""
+    __slots__ = ('_ledger', '_row')
+
+    def __init__(self, ledger: 'TradeLedger', row: int):
+        self._ledger = ledger
+        self._row = row
+
+    def _get(self, name: str):
+        return self._ledger._data[name][self._row]
+
+    def _set(self, name: str, value):
+        self._ledger._data[name][self._row] = value
+
+    @property
+    def symbol(self) -> str:
+        return self._ledger.symbols[self._get('symbol')]
+
+    @property
+    def side(self) -> OrderSide:
+        return _SIDES[int(self._get('side'))]
+
+    @property
+    def size(self) -> float:
+        return float(self._get('size'))
+
+    @property
+    def entry_price(self) -> float:
+        return float(self._get('entry_price'))
+
+    @property
+    def stop_loss(self) -> float:
+        return float(self._get('stop_loss'))
+
+    @property
+    def take_profit(self) -> float:
+        return float(self._get('take_profit'))
+
+    @property
+    def open_time(self) -> pd.Timestamp:
+        return pd.Timestamp(self._get('open_time'))
+
+    @property
+    def status(self) -> OrderStatus:
+        return _STATUSES[int(self._get('status'))]
+
+    @status.setter
+    def status(self, value: OrderStatus):
+        self._set('status', _STATUS_CODES[value])
+
+    @property
+    def close_time(self) -> Optional[pd.Timestamp]:
+        value = self._get('close_time')
+        return None if np.isnat(value) else pd.Timestamp(value)
+
+    @close_time.setter
+    def close_time(self, value):
+        self._set('close_time', np.datetime64('NaT') if value is None else _to_datetime64([value])[0])
+
+    @property
+    def close_price(self) -> Optional[float]:
+        value = float(self._get('close_price'))
+        return None if value != value else value
+
+    @close_price.setter
+    def close_price(self, value):
+        self._set('close_price', np.nan if value is None else value)
+
+    @property
+    def pnl(self) -> float:
+        return float(self._get('pnl'))
+
+    @pnl.setter
+    def pnl(self, value: float):
+        self._set('pnl', value)
+
+    def __repr__(self):
+        return (f"OrderView(symbol={self.symbol!r}, side={self.side}, size={self.size}, "
+                f"entry_price={self.entry_price}, open_time={self.open_time}, status={self.status}, "
+                f"close_time={self.close_time}, close_price={self.close_price}, pnl={self.pnl})")
+
+
+class TradeLedger:
+    """
+    MockAccount.orders 的数组实现，预分配、按倍数扩容的结构化数组
+    迭代/下标访问得到 OrderView；分析代码直接用 array(零拷贝，下次追加扩容前有效)
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._data = np.zeros(capacity, dtype=LEDGER_DTYPE)
+        self._n = 0
+        self.symbols = []
+        self._symbol_codes = {}
+
+    def _code(self, symbol: str) -> int:
+        code = self._symbol_codes.get(symbol)
+        if code is None:
+            code = self._symbol_codes[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return code
+
+    def _reserve(self, extra: int) -> int:
+        start = self._n
+        needed = start + extra
+        if needed > len(self._data):
+            grown = np.zeros(max(needed, len(self._data) * 2), dtype=LEDGER_DTYPE)
+            grown[:start] = self._data[:start]
+            self._data = grown
+        self._n = needed
+        return start
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._data[:self._n]
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i: int) -> OrderView:
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        return OrderView(self, i)
+
+    def __iter__(self):
+        return (OrderView(self, i) for i in range(self._n))
+
+    def add(self, symbol: str, side: OrderSide, size: float, entry_price: float,
+            stop_loss: float, take_profit: float, open_time) -> OrderView:
+        row = self._reserve(1)
+        record = self._data[row]
+        record['symbol'] = self._code(symbol)
+        record['side'] = _SIDE_CODES[side]
+        record['status'] = 0
+        record['size'] = size
+        record['entry_price'] = entry_price
+        record['stop_loss'] = stop_loss
+        record['take_profit'] = take_profit
+        record['open_time'] = _to_datetime64([open_time])[0]
+        record['close_time'] = np.datetime64('NaT')
+        record['close_price'] = np.nan
+        record['pnl'] = 0.0
+        return OrderView(self, row)
+
+    def append(self, order: Order) -> OrderView:
+        """兼容旧的 list.append(Order)"""
+        view = self.add(order.symbol, order.side, order.size, order.entry_price,
+                        order.stop_loss, order.take_profit, order.open_time)
+        if order.status == OrderStatus.CLOSED:
+            view.status = order.status
+            view.close_time = order.close_time
+            view.close_price = order.close_price
+        view.pnl = order.pnl
+        return view
+
+    def extend(self, symbol, side: OrderSide, size, entry_price, stop_loss, take_profit,
+               open_time, close_time, close_price, pnl) -> int:
+        """
+        批量追加，close_time 为 NaT 的行视为未平仓，返回第一行的下标
+        symbol 为一个币种名，或与 size 等长的币种名数组(多币种组合回测)
+        """
+        size = np.asarray(size, dtype=np.float64)
+        start = self._reserve(len(size))
+        rows = self._data[start:self._n]
+        close_time = _to_datetime64(close_time)
+        if isinstance(symbol, str):
+            rows['symbol'] = self._code(symbol)
+        else:
+            names, inverse = np.unique(np.asarray(symbol, dtype=str), return_inverse=True)
+            rows['symbol'] = np.array([self._code(name) for name in names], dtype=np.int32)[inverse]
+        rows['side'] = _SIDE_CODES[side]
+        rows['status'] = ~np.isnat(close_time)
+        rows['size'] = size
+        rows['entry_price'] = entry_price
+        rows['stop_loss'] = stop_loss
+        rows['take_profit'] = take_profit
+        rows['open_time'] = _to_datetime64(open_time)
+        rows['close_time'] = close_time
+        rows['close_price'] = close_price
+        rows['pnl'] = pnl
+        return start
+
+    def closed(self) -> np.ndarray:
+        """已平仓交易(零拷贝视图之上的布尔筛选)"""
+        data = self.array
+        return data[data['status'] == 1]
+
+    def __getstate__(self):
+        # 只序列化已使用的部分
+        return {'data': self.array.copy(), 'symbols': list(self.symbols)}
+
+    def __setstate__(self, state):
+        self._data = state['data']
+        self._n = len(self._data)
+        self.symbols = state['symbols']
+        self._symbol_codes = {s: i for i, s in enumerate(self.symbols)}
+
+
+class EquityStore:
+    """
+    MockAccount.daily_balance 的数组实现：时间(datetime64[ns])和余额两个可扩容数组
+    保留 dict 风格的写入(store[t] = v / update)，同一时间连续写入时覆盖最后一个值
+    """
+
+    def __init__(self, capacity: int = 256):
+        self._times = np.empty(capacity, dtype='M8[ns]')
+        self._values = np.empty(capacity, dtype=np.float64)
+        self._n = 0
+
+    def _reserve(self, extra: int) -> int:
+        start = self._n
+        needed = start + extra
+        if needed > len(self._times):
+            capacity = max(needed, len(self._times) * 2)
+            times = np.empty(capacity, dtype='M8[ns]')
+            values = np.empty(capacity, dtype=np.float64)
+            times[:start] = self._times[:start]
+            values[:start] = self._values[:start]
+            self._times, self._values = times, values
+        self._n = needed
+        return start
+
+    @property
+    def times(self) -> np.ndarray:
+        return self._times[:self._n]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self._n]
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __setitem__(self, time, value: float):
+        t = _to_datetime64([time])[0]
+        if self._n and self._times[self._n - 1] == t:
+            self._values[self._n - 1] = value
+            return
+        row = self._reserve(1)
+        self._times[row] = t
+        self._values[row] = value
+
+    def extend(self, times, values):
+        values = np.asarray(values, dtype=np.float64)
+        start = self._reserve(len(values))
+        self._times[start:self._n] = _to_datetime64(times)
+        self._values[start:self._n] = values
+
+    def update(self, items):
+        """兼容 dict.update(zip(times, values))"""
+        for time, value in items:
+            self[time] = value
+
+    def items(self):
+        return zip((pd.Timestamp(t) for t in self.times), self.values.tolist())
+
+    def to_series(self) -> pd.Series:
+        """以时间为索引的余额序列，重复的时间保留最后一个值(与 dict 覆盖一致)"""
+        index = pd.DatetimeIndex(self.times)
+        series = pd.Series(self.values, index=index)
+        if not index.is_unique:
+            series = series[~index.duplicated(keep='last')]
+        return series
+
+    def __getstate__(self):
+        return {'times': self.times.copy(), 'values': self.values.copy()}
+
+    def __setstate__(self, state):
+        self._times = state['times']
+        self._values = state['values']
+        self._n = len(self._times)
+
+
 class Position:
-    def __init__(self, order: Order):
+    __slots__ = ('symbol', 'side', 'size', 'entry_price', 'stop_loss', 'take_profit',
+                 'unrealized_pnl', 'order', 'margin', 'liquidation_price')
+
+    def __init__(self, order: Order, margin: float = 0.0, leverage: Optional[float] = None):
+        """margin 为占用的保证金，给出 leverage 时按 kernel.liquidation_price 计算强平价"""
         self.symbol = order.symbol
         self.side = order.side
         self.size = order.size
@@ -94,20 +412,33 @@ class Position:
         self.take_profit = order.take_profit
         self.unrealized_pnl = 0.0
         self.order = order
+        self.margin = margin
+        self.liquidation_price = None if leverage is None else \
+            liquidation_price(order.entry_price, leverage, _SIDE_CODES[order.side])
 
     def update_pnl(self, current_price: float):
         multiplier = -1 if self.side == OrderSide.SHORT else 1
         self.unrealized_pnl = (current_price - self.entry_price) * self.size * multiplier
 
 class MockAccount:
-    def __init__(self, initial_balance: float = 1000.0, leverage: float = 20.0):
+    """
+    回测账户，默认不限制保证金、不强平，开平仓只按价格和手续费结算
+    liquidation=True 时使用与 ExecutionKernel 相同的保证金和强平规则(见 kernel.py 开头的说明)：
+    每个仓位占用 fixed_position_value 的保证金，可用余额不足时 open_position 拒绝开仓并返回 None；
+    平仓价越过强平价时按强平价成交，单笔亏损不超过保证金
+    """
+
+    liquidation = False  # 旧版本保存的账户没有这个属性
+
+    def __init__(self, initial_balance: float = 1000.0, leverage: float = 20.0, liquidation: bool = False):
         self.initial_balance = initial_balance
         self.balance = initial_balance
         self.leverage = leverage
+        self.liquidation = liquidation
         self.fee_rate = 0.0002  # 万分之二手续费
         self.positions = {}  # symbol -> Position
-        self.orders = []
-        self.daily_balance = {}
+        self.orders = TradeLedger()
+        self.daily_balance = EquityStore()
         self.max_drawdown = 0.0
         self.equity_peak = initial_balance
         self.fixed_position_value=10
@@ -117,17 +448,28 @@ class MockAccount:
         position_size = (self.fixed_position_value * self.leverage) / price
         return position_size
 
+    def free_margin(self) -> float:
+        """已实现余额减去持仓占用的保证金"""
+        return self.balance - sum(position.margin for position in self.positions.values())
+
+    def position_for(self, order) -> Position:
+        """按账户当前的仓位价值和杠杆为订单建立持仓，只有 liquidation=True 时才有强平价"""
+        return Position(order, self.fixed_position_value, self.leverage if self.liquidation else None)
+
     def open_position(self, symbol: str, side: OrderSide, price: float, 
-                     stop_loss: float, take_profit: float, timestamp: datetime) -> Order:
+                     stop_loss: float, take_profit: float, timestamp: datetime) -> Optional[OrderView]:
         # 计算仓位大小
         size = self.calculate_position_size(price)
         
         # 计算手续费
         fee = price * size * self.fee_rate
+        # 可用余额不足以支付保证金和手续费时拒绝开仓
+        if self.liquidation and self.free_margin() < self.fixed_position_value + fee:
+            return None
         self.balance -= fee
 
-        # 创建订单
-        order = Order(
+        # 在台账中记录订单
+        order = self.orders.add(
             symbol=symbol,
             side=side,
             size=size,
@@ -138,8 +480,7 @@ class MockAccount:
         )
         
         # 创建持仓
-        self.positions[symbol] = Position(order)
-        self.orders.append(order)
+        self.positions[symbol] = self.position_for(order)
         
         return order
 
@@ -149,11 +490,17 @@ class MockAccount:
 
         position = self.positions[symbol]
         multiplier = -1 if position.side == OrderSide.SHORT else 1
+        # 越过强平价的部分按强平价成交
+        liquidation = position.liquidation_price
+        if liquidation is not None and (price - liquidation) * multiplier < 0:
+            price = liquidation
         pnl = (price - position.entry_price) * position.size * multiplier
         
-        # 扣除手续费
+        # 扣除手续费，亏损不超过保证金
         fee = price * position.size * self.fee_rate
         final_pnl = pnl - fee
+        if liquidation is not None:
+            final_pnl = float(cap_loss(final_pnl, position.margin))
         
         # 更新余额
         self.balance += final_pnl
@@ -172,7 +519,20 @@ class MockAccount:
         current_drawdown = (self.equity_peak - self.balance) / self.equity_peak
         self.max_drawdown = max(self.max_drawdown, current_drawdown)
 
-    def update_daily_balance(self, date: datetime):
+    def mark_to_market(self, prices: Dict[str, float]):
+        """按最新价格更新各持仓的浮动盈亏，prices 中没有的币种保持上一次的值"""
+        for symbol, position in self.positions.items():
+            price = prices.get(symbol)
+            if price is not None:
+                position.update_pnl(price)
+
+    def equity(self) -> float:
+        """余额加全部持仓的浮动盈亏"""
+        return self.balance + sum(position.unrealized_pnl for position in self.positions.values())
+
+    def update_daily_balance(self, date: datetime, prices: Optional[Dict[str, float]] = None):
+        if prices is not None:
+            self.mark_to_market(prices)
         total_value = self.balance
         for position in self.positions.values():
             total_value += position.unrealized_pnl
@@ -0,0 +1,198 @@
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from .resample import annualization_factor
+
+
+@dataclass
+class Performance:
+    """一次回测的全部指标，比例类指标为小数(0.05 表示 5%)"""
+    initial_balance: float
+    final_balance: float
+    total_return: float
+    annual_return: float
+    sharpe_ratio: float
+    sortino_ratio: float
+    calmar_ratio: float
+    max_drawdown: float                  # 权益曲线上的最大回撤
+    avg_drawdown: float                  # 各回撤区间最大回撤的平均值
+    max_drawdown_duration: float         # 最长水下时间(小时)
+    exposure: float                      # 持仓K线占比
+    total_trades: int
+    closed_trades: int
+    winning_trades: int
+    win_rate: float
+    profit_factor: float
+    avg_holding_hours: float
+    median_holding_hours: float
+    returns: np.ndarray = field(repr=False)          # 每根K线的收益率
+    drawdown: np.ndarray = field(repr=False)         # 每根K线的回撤
+    rolling_sharpe: np.ndarray = field(repr=False)   # 滚动夏普，窗口不足处为 NaN
+    holding_hours: np.ndarray = field(repr=False)
+
+
+class Analytics:
+    """
+    回测指标的向量化计算，BackTest 和 BacktestVisualizer 共用
+    输入为权益数组(EquityStore)和成交台账数组(TradeLedger)，一次遍历得到所有指标
+    """
+
+    @staticmethod
+    def returns(values: np.ndarray) -> np.ndarray:
+        """逐根收益率，与 Series.pct_change().dropna() 一致"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) < 2:
+            return np.empty(0)
+        return values[1:] / values[:-1] - 1
+
+    @staticmethod
+    def sharpe_ratio(returns: np.ndarray, factor: float, risk_free_rate: float) -> float:
+        """年化夏普，标准差用 ddof=1，与 pandas 的 std 一致；波动为0时返回0"""
+        if len(returns) < 2:
+            return float('nan')
+        std = returns.std(ddof=1) * np.sqrt(factor)
+        mean = returns.mean() * factor
+        return float((mean - risk_free_rate) / std) if std != 0 else 0.0
+
+    @staticmethod
+    def sortino_ratio(returns: np.ndarray, factor: float, risk_free_rate: float) -> float:
+        """年化索提诺，下行偏差按全部周期计算"""
+        if len(returns) < 2:
+            return float('nan')
+        downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2)) * np.sqrt(factor)
+        mean = returns.mean() * factor
+        return float((mean - risk_free_rate) / downside) if downside != 0 else 0.0
+
+    @staticmethod
+    def rolling_sharpe(returns: np.ndarray, window: int, factor: float,
+                       risk_free_rate: float) -> np.ndarray:
+        """用累积和在 O(n) 内计算滚动夏普"""
+        n = len(returns)
+        out = np.full(n, np.nan)
+        if window < 2 or n < window:
+            return out
+        csum = np.concatenate(([0.0], np.cumsum(returns)))
+        csq = np.concatenate(([0.0], np.cumsum(returns * returns)))
+        total = csum[window:] - csum[:-window]
+        total_sq = csq[window:] - csq[:-window]
+        mean = total / window
+        var = np.maximum(total_sq - window * mean * mean, 0.0) / (window - 1)
+        std = np.sqrt(var) * np.sqrt(factor)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[window - 1:] = np.where(std > 1e-12, (mean * factor - risk_free_rate) / std, 0.0)
+        return out
+
+    @staticmethod
+    def drawdowns(times: np.ndarray, values: np.ndarray, initial_balance: float):
+        """回撤序列、最大回撤、各回撤区间最大值的平均、最长水下时间(小时)"""
+        if len(values) == 0:
+            return np.empty(0), 0.0, 0.0, 0.0
+        peaks = np.maximum(np.maximum.accumulate(values), initial_balance)
+        drawdown = (peaks - values) / peaks
+        underwater = drawdown > 0
+
+        # 水下区间：从离开峰值的那根K线到回到峰值(或数据结尾)
+        edges = np.diff(np.concatenate(([False], underwater, [False])).astype(np.int8))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        if len(starts) == 0:
+            return drawdown, 0.0, 0.0, 0.0
+        episode_max = np.maximum.reduceat(drawdown, starts)
+        # 区间开始于上一个峰值所在的K线
+        peak_times = times[np.maximum(starts - 1, 0)]
+        end_times = times[np.minimum(ends, len(times) - 1)]
+        durations = (end_times - peak_times) / np.timedelta64(1, 's') / 3600
+        return drawdown, float(drawdown.max()), float(episode_max.mean()), float(durations.max())
+
+    @staticmethod
+    def trade_stats(trades: np.ndarray, times: np.ndarray) -> Dict:
+        """已平仓交易的胜率、盈亏比、持仓时间，以及按K线计算的持仓占比"""
+        closed = trades[trades['status'] == 1]
+        pnl = closed['pnl']
+        holding = (closed['close_time'] - closed['open_time']) / np.timedelta64(1, 's') / 3600
+        gross_profit = pnl[pnl > 0].sum()
+        gross_loss = -pnl[pnl < 0].sum()
+        if gross_loss > 0:
+            profit_factor = float(gross_profit / gross_loss)
+        else:
+            profit_factor = float('inf') if gross_profit > 0 else float('nan')
+
+        exposure = float('nan')
+        if len(times):
+            # 未平仓交易持有到最后一根K线
+            close_time = np.where(np.isnat(trades['close_time']), times[-1], trades['close_time'])
+            held = np.searchsorted(times, close_time, side='left') - \
+                np.searchsorted(times, trades['open_time'], side='left')
+            exposure = float(min(np.maximum(held, 0).sum() / len(times), 1.0))
+
+        return {
+            'closed_trades': len(closed),
+            'winning_trades': int((pnl > 0).sum()),
+            'profit_factor': profit_factor,
+            'holding_hours': holding,
+            'exposure': exposure,
+        }
+
+    @staticmethod
+    def compute(times: np.ndarray, values: np.ndarray, trades: np.ndarray, timeframe,
+                initial_balance: float, final_balance: Optional[float] = None,
+                risk_free_rate: float = 0.03, rolling_window: Optional[int] = None) -> Performance:
+        """
+        times/values 为权益曲线(datetime64[ns] 和余额)，trades 为 LEDGER_DTYPE 数组
+        rolling_window 默认约一个月的K线数
+        """
+        times = np.asarray(times, dtype='M8[ns]')
+        values = np.asarray(values, dtype=np.float64)
+        factor = annualization_factor(timeframe)
+        if final_balance is None:
+            final_balance = float(values[-1]) if len(values) else initial_balance
+
+        returns = Analytics.returns(values)
+        sharpe = Analytics.sharpe_ratio(returns, factor, risk_free_rate)
+        sortino = Analytics.sortino_ratio(returns, factor, risk_free_rate)
+        window = rolling_window or max(2, int(round(factor / 12)))
+        rolling = Analytics.rolling_sharpe(returns, window, factor, risk_free_rate)
+        drawdown, max_dd, avg_dd, dd_hours = Analytics.drawdowns(times, values, initial_balance)
+
+        total_return = (final_balance - initial_balance) / initial_balance
+        years = len(returns) / factor
+        if years > 0 and final_balance > 0:
+            annual_return = (final_balance / initial_balance) ** (1 / years) - 1
+        else:
+            annual_return = float('nan')
+        calmar = annual_return / max_dd if max_dd > 0 else float('nan')
+
+        stats = Analytics.trade_stats(trades, times)
+        holding = stats['holding_hours']
+        total_trades = len(trades)
+        return Performance(
+            initial_balance=initial_balance,
+            final_balance=final_balance,
+            total_return=total_return,
+            annual_return=annual_return,
+            sharpe_ratio=sharpe,
+            sortino_ratio=sortino,
+            calmar_ratio=calmar,
+            max_drawdown=max_dd,
+            avg_drawdown=avg_dd,
+            max_drawdown_duration=dd_hours,
+            exposure=stats['exposure'],
+            total_trades=total_trades,
+            closed_trades=stats['closed_trades'],
+            winning_trades=stats['winning_trades'],
+            win_rate=stats['winning_trades'] / total_trades if total_trades else float('nan'),
+            profit_factor=stats['profit_factor'],
+            avg_holding_hours=float(holding.mean()) if len(holding) else float('nan'),
+            median_holding_hours=float(np.median(holding)) if len(holding) else float('nan'),
+            returns=returns,
+            drawdown=drawdown,
+            rolling_sharpe=rolling,
+            holding_hours=holding,
+        )
+
+    @staticmethod
+    def from_account(account, timeframe, risk_free_rate: float = 0.03, **kwargs) -> Performance:
+        return Analytics.compute(account.daily_balance.times, account.daily_balance.values,
+                                 account.orders.array, timeframe, account.initial_balance,
+                                 account.balance, risk_free_rate, **kwargs)
@@ -1,32 +1,37 @@
-from .account import MockAccount, OrderStatus, OrderSide
+from .account import MockAccount, OrderStatus, OrderSide, Order
+from .analytics import Analytics, Performance
+from .kernel import ExecutionKernel, IntrabarResolver, KernelResult
+from .resample import default_resampler, annualization_factor, bar_length
+from .store import to_epoch_ms
+from .telemetry import TELEMETRY
 import pandas as pd
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 from typing import Dict, Tuple, List,Optional
 from enum import Enum
 
+# _prepare_data 合并时保留的K线列
+BAR_COLUMNS = ('open_time', 'date', 'open', 'high', 'low', 'close', 'volume')
+
 class TimeFrame(Enum):
     DAY = 'day'
     HOUR = 'hour'
     FOUR_HOUR = '4hour'
 
 class BackTest:
-    def __init__(self, account: MockAccount, risk_free_rate: float = 0.03):
+    def __init__(self, account: MockAccount, risk_free_rate: float = 0.03, tp_multiple: float = 2.0,
+                 intrabar: Optional[IntrabarResolver] = None):
         self.account = account
         self.trades = []
         self.risk_free_rate = risk_free_rate
-        self.annualization_factors = {
-            TimeFrame.DAY: 252,
-            TimeFrame.HOUR: 252 * 24,
-            TimeFrame.FOUR_HOUR: 252 * 6
-        }
+        self.tp_multiple = tp_multiple  # 止盈距离 = 止损距离 * tp_multiple
+        self.intrabar = intrabar        # 低周期K线，用于判断同一根K线内止损/止盈的先后
+        # 年化系数由K线长度推算，任意周期都适用
+        self.annualization_factors = {tf: annualization_factor(tf) for tf in TimeFrame}
+        self.performance: Optional[Performance] = None  # 最近一次 generate_performance_metrics 的完整结果
 
     def _prepare_data(self, data: pd.DataFrame, signals: pd.DataFrame, 
-                 timeframe: TimeFrame) -> pd.DataFrame:
-        """统一数据准备逻辑"""
+                 timeframe: TimeFrame, symbol: Optional[str] = None) -> pd.DataFrame:
+        """统一数据准备逻辑，symbol 与 Strategy 的 symbols 一致时共用同一份重采样结果"""
         # 确保所有时间列是datetime格式
         data['open_time'] = pd.to_datetime(data['open_time'])
         if 'date' in signals.columns:
@@ -34,25 +39,16 @@ class BackTest:
                 lambda x: x.replace(hour=0, minute=0, second=0)
             )
         
-        if timeframe == TimeFrame.DAY:
-            daily_data = data.groupby(data['open_time'].dt.date).agg({
-                'open': 'first',
-                'high': 'max',
-                'low': 'min',
-                'close': 'last',
-                'open_time': 'first'
-            }).reset_index(drop=True)
-            
-        elif timeframe == TimeFrame.FOUR_HOUR:
-            # 假设已经传入了4小时数据
-            daily_data = data
-            
-        else:  # HOUR
+        if timeframe == TimeFrame.HOUR:
             daily_data = data
+        else:
+            # 日线、4小时或自定义周期，已经是该周期的数据会原样返回
+            daily_data = default_resampler.resample(data, timeframe, symbol)
         
-        # 统一合并逻辑
+        # 统一合并逻辑，只带上回测用到的列，避免大数据时整表复制
+        columns = [c for c in BAR_COLUMNS if c in daily_data.columns]
         merged_data = pd.merge(
-            daily_data,
+            daily_data[columns],
             signals[['open_time', 'short_signal', 'wld_change', 'btc_change']],
             on='open_time',
             how='inner'
@@ -60,280 +56,136 @@ class BackTest:
         
         return merged_data 
 
-    def _execute_trades(self, merged_data: pd.DataFrame, timeframe: TimeFrame):
+    def _execute_trades(self, merged_data: pd.DataFrame, timeframe: TimeFrame,
+                        symbol: str = "WLD") -> KernelResult:
         """统一交易执行逻辑"""
         time_key = 'date' if timeframe == TimeFrame.DAY else 'open_time'
-        current_position = None
-        
-        for i in range(1, len(merged_data)):
-            current_row = merged_data.iloc[i]
-            
-            # 检查开仓信号
-            if current_row['short_signal'] and not current_position:
-                stop_loss = merged_data['high'].iloc[i-1]
-                entry_price = current_row['close']
-                price_diff = stop_loss - entry_price
-                take_profit = entry_price - (price_diff * 2)  
-                
-                print(f"\nOpening position on {current_row[time_key]}:")
-                print(f"Entry: {entry_price:.4f}")
-                print(f"Stop Loss: {stop_loss:.4f} (Risk: {price_diff:.4f})")
-                print(f"Take Profit: {take_profit:.4f}")
-                
-                self.account.open_position(
-                    symbol="WLD",
-                    side=OrderSide.SHORT,
-                    
-                    price=entry_price,
-                    stop_loss=stop_loss,
-                    take_profit=take_profit,
-                    timestamp=current_row['open_time']
-                )
-                current_position = "SHORT"
-            
-            # 检查止损止盈
-            if "WLD" in self.account.positions:
-                position = self.account.positions["WLD"]
-                
-                if (current_row['high'] >= position.stop_loss or 
-                    current_row['low'] <= position.take_profit):
-                    close_price = (position.stop_loss if current_row['high'] >= position.stop_loss 
-                                 else position.take_profit)
-                    
-                    print(f"\nClosing position on {current_row[time_key]}:")
-                    print(f"Close price: {close_price:.4f}")
-                    print(f"P&L: {(position.entry_price - close_price) * position.size:.2f}")
-                    
-                    self.account.close_position("WLD", close_price, current_row['open_time'])
-                    current_position = None
-            
-            # 更新账户余额
-            self.account.update_daily_balance(current_row[time_key])
+        if time_key not in merged_data.columns:
+            time_key = 'open_time'
+
+        with TELEMETRY.span('backtest.kernel'):
+            result = ExecutionKernel.run_short(
+                merged_data['high'].to_numpy(dtype=float),
+                merged_data['low'].to_numpy(dtype=float),
+                merged_data['close'].to_numpy(dtype=float),
+                merged_data['short_signal'].to_numpy(dtype=bool),
+                fee_rate=self.account.fee_rate,
+                position_value=self.account.fixed_position_value,
+                leverage=self.account.leverage,
+                initial_balance=self.account.balance,
+                equity_peak=self.account.equity_peak,
+                max_drawdown=self.account.max_drawdown,
+                tp_multiple=self.tp_multiple,
+                resolve_ambiguous=self._intrabar_callback(merged_data, timeframe),
+                liquidation=self.account.liquidation
+            )
+        with TELEMETRY.span('backtest.apply'):
+            self._apply_result(result, merged_data, time_key, symbol)
+        return result
+
+    def _intrabar_callback(self, merged_data: pd.DataFrame, timeframe: TimeFrame):
+        """把K线下标换算成时间区间后交给 IntrabarResolver"""
+        if self.intrabar is None:
+            return None
+        starts = to_epoch_ms(merged_data['open_time'])
+        length_ms = int(bar_length(timeframe) // np.timedelta64(1, 'ms'))
+
+        def resolve(bars, stop_loss, take_profit):
+            return self.intrabar.stop_first(starts[bars], starts[bars] + length_ms, stop_loss, take_profit)
+        return resolve
+
+    def _apply_result(self, result: KernelResult, merged_data: pd.DataFrame,
+                      time_key: str, symbol: str):
+        """把内核结果写回 MockAccount"""
+        open_times = merged_data['open_time'].to_numpy(dtype='M8[ns]')
+        trades = result.trades
+        closed = trades['exit_idx'] >= 0
+        close_times = np.full(len(trades), np.datetime64('NaT'), dtype='M8[ns]')
+        close_times[closed] = open_times[trades['exit_idx'][closed]]
+
+        start = self.account.orders.extend(
+            symbol=symbol,
+            side=OrderSide.SHORT,
+            size=trades['size'],
+            entry_price=trades['entry_price'],
+            stop_loss=trades['stop_loss'],
+            take_profit=trades['take_profit'],
+            open_time=open_times[trades['entry_idx']],
+            close_time=close_times,
+            close_price=trades['exit_price'],
+            pnl=np.where(closed, trades['pnl'], 0.0)
+        )
+        # 最后一笔未平仓的交易保留为持仓
+        if len(trades) and not closed[-1]:
+            self.account.positions[symbol] = self.account.position_for(
+                self.account.orders[start + len(trades) - 1])
+            self.account.mark_to_market({symbol: float(merged_data['close'].iloc[-1])})
+
+        self.account.balance = result.balance
+        self.account.equity_peak = result.equity_peak
+        self.account.max_drawdown = result.max_drawdown
+        self.account.daily_balance.extend(merged_data[time_key].to_numpy()[1:], result.equity[1:])
 
     def calculate_sharpe_ratio(self, returns: pd.Series, timeframe: TimeFrame) -> float:
         """计算夏普比率"""
-        annualization_factor = self.annualization_factors[timeframe]
-        returns_std = returns.std() * np.sqrt(annualization_factor)
-        returns_mean = returns.mean() * annualization_factor
-        
-        return (returns_mean - self.risk_free_rate) / returns_std if returns_std != 0 else 0
+        factor = self.annualization_factors.get(timeframe)
+        if factor is None:
+            factor = annualization_factor(timeframe)
+        return Analytics.sharpe_ratio(np.asarray(returns.dropna(), dtype=np.float64), factor, self.risk_free_rate)
 
     def generate_performance_metrics(self, timeframe: TimeFrame) -> Dict:
         """生成统一的性能指标"""
-        returns = pd.Series(self.account.daily_balance).pct_change().dropna()
-        total_return = (self.account.balance - self.account.initial_balance) / self.account.initial_balance
-        
-        winning_trades = len([order for order in self.account.orders 
-                            if order.status == OrderStatus.CLOSED and order.pnl > 0])
-        total_trades = len(self.account.orders)
-        
-        # 计算平均持仓时间
-        holding_times = []
-        for order in self.account.orders:
-            if order.status == OrderStatus.CLOSED:
-                holding_time = (order.close_time - order.open_time).total_seconds() / 3600
-                holding_times.append(holding_time)
+        perf = Analytics.from_account(self.account, timeframe, self.risk_free_rate)
+        returns = pd.Series(perf.returns, index=pd.DatetimeIndex(self.account.daily_balance.times[1:]))
+        total_trades = perf.total_trades
         
         metrics = {
             "Initial Balance": self.account.initial_balance,
             "Final Balance": self.account.balance,
-            "Total Return": f"{total_return:.2%}",
+            "Total Return": f"{perf.total_return:.2%}",
             "Max Drawdown": f"{self.account.max_drawdown:.2%}",
-            "Sharpe Ratio": f"{self.calculate_sharpe_ratio(returns, timeframe):.2f}",
+            "Sharpe Ratio": f"{perf.sharpe_ratio:.2f}",
             "Total Trades": total_trades,
-            "Winning Trades": winning_trades,
-            "Win Rate": f"{winning_trades/total_trades:.2%}" if total_trades > 0 else "N/A",
+            "Winning Trades": perf.winning_trades,
+            "Win Rate": f"{perf.win_rate:.2%}" if total_trades > 0 else "N/A",
             "Returns": returns
         }
         
         if timeframe != TimeFrame.DAY:
             metrics["Average Holding Time (hours)"] = (
-                f"{sum(holding_times)/len(holding_times):.2f}" if holding_times else "N/A"
+                f"{perf.avg_holding_hours:.2f}" if perf.closed_trades else "N/A"
             )
-        
-        return metrics
 
-    def run(self, data: pd.DataFrame, signals: pd.DataFrame, timeframe: TimeFrame):
-        """统一的回测入口"""
-        print(f"Running backtest for {timeframe.value} timeframe")
-        merged_data = self._prepare_data(data, signals, timeframe)
-        print(f"Total {timeframe.value}s after merge: {len(merged_data)}")
-        
-        self._execute_trades(merged_data, timeframe)
-        return self.generate_performance_metrics(timeframe)
-class BacktestVisualizer:
-    def __init__(self, account: MockAccount, timeframe: TimeFrame):
-        self.account = account
-        self.timeframe = timeframe
-        # 设置可视化风格
-        sns.set_style("darkgrid")
-        plt.rcParams['figure.figsize'] = [12, 8]
-        
-        # 时间框架相关的标签
-        self.time_labels = {
-            TimeFrame.DAY: 'Daily',
-            TimeFrame.HOUR: 'Hourly',
-            TimeFrame.FOUR_HOUR: '4-Hour'
-        }
-
-    def _prepare_trade_data(self) -> pd.DataFrame:
-        """准备交易数据用于可视化"""
-        trades = pd.DataFrame([
-            {
-                'entry_time': order.open_time,
-                'exit_time': order.close_time,
-                'entry_price': order.entry_price,
-                'exit_price': order.close_price,
-                'pnl': order.pnl,
-                'holding_time': (order.close_time - order.open_time).total_seconds() / 3600
-            }
-            for order in self.account.orders if order.status == OrderStatus.CLOSED
-        ])
-        return trades
-
-    def plot_equity_curve(self, ax: plt.Axes) -> None:
-        """绘制权益曲线"""
-        balance_data = pd.Series(self.account.daily_balance)
-        ax.plot(balance_data.index, balance_data.values, linewidth=2, color='blue')
-        ax.set_title(f'{self.time_labels[self.timeframe]} Balance History')
-        ax.set_ylabel('Balance (USDT)')
-        ax.grid(True)
-
-    def plot_drawdown(self, ax: plt.Axes) -> None:
-        
-        balance_data = pd.Series(self.account.daily_balance)
-        print("Balance data type:", type(balance_data))
-        print("\nBalance index type:", type(balance_data.index))
-        print("\nFirst few items of daily_balance:")
-        print(pd.Series(self.account.daily_balance).head())
-        print("\nIndex values:")
-        print(balance_data.index[:5])
-        print("\nBalance values:")
-        print(balance_data.values[:5])
-        # 确保索引是datetime类型
-        balance_data.index = pd.to_datetime(balance_data.index)
-        
-        running_max = balance_data.cummax()
-        drawdown = (running_max - balance_data) / running_max * 100
-        
-        # 创建数值索引用于绘图
-        x_values = np.arange(len(drawdown))
-        
-        ax.fill_between(x_values, drawdown.values, color='red', alpha=0.3)
-        
-        # 设置x轴刻度和标签
-        if len(x_values) > 0:
-            # 选择合适数量的刻度
-            n_ticks = min(10, len(x_values))
-            tick_positions = np.linspace(0, len(x_values)-1, n_ticks, dtype=int)
-            ax.set_xticks(tick_positions)
-            # 格式化时间标签
-            tick_labels = [balance_data.index[i].strftime('%Y-%m-%d %H:%M') 
-                        for i in tick_positions]
-            ax.set_xticklabels(tick_labels, rotation=45)
-        
-        ax.set_title('Drawdown (%)')
-        ax.set_ylabel('Drawdown %')
-        ax.grid(True)
-
-    def plot_returns_distribution(self, ax: plt.Axes) -> None:
-        """绘制收益分布"""
-        balance_data = pd.Series(self.account.daily_balance)
-        returns = balance_data.pct_change() * 100
-        sns.histplot(data=returns.dropna(), bins=30, kde=True, ax=ax, color='blue')
-        ax.set_title(f'{self.time_labels[self.timeframe]} Returns Distribution')
-        ax.set_xlabel('Return (%)')
-        ax.grid(True)
-
-    def plot_pnl_distribution(self, trades: pd.DataFrame, ax: plt.Axes) -> None:
-        """绘制盈亏分布"""
-        sns.histplot(data=trades['pnl'], bins=20, kde=True, ax=ax, color='blue')
-        ax.set_title('PnL Distribution')
-        ax.set_xlabel('PnL (USDT)')
-
-    def plot_holding_time_distribution(self, trades: pd.DataFrame, ax: plt.Axes) -> None:
-        """绘制持仓时间分布"""
-        sns.histplot(data=trades['holding_time'], bins=20, kde=True, ax=ax, color='green')
-        ax.set_title('Holding Time Distribution')
-        ax.set_xlabel(f'Holding Time ({self.time_labels[self.timeframe]})')
-
-    def plot_cumulative_pnl(self, trades: pd.DataFrame, ax: plt.Axes) -> None:
-        """绘制累计盈亏"""
-        cumulative_pnl = trades['pnl'].cumsum()
-        ax.plot(range(len(cumulative_pnl)), cumulative_pnl, color='purple')
-        ax.set_title('Cumulative PnL')
-        ax.set_xlabel('Trade Number')
-        ax.set_ylabel('Cumulative PnL (USDT)')
-
-    def plot_trade_pnl(self, trades: pd.DataFrame, ax: plt.Axes) -> None:
-        """绘制每笔交易盈亏"""
-        colors = ['green' if x > 0 else 'red' for x in trades['pnl']]
-        ax.bar(range(len(trades)), trades['pnl'], color=colors)
-        ax.set_title('PnL per Trade')
-        ax.set_xlabel('Trade Number')
-        ax.set_ylabel('PnL (USDT)')
-
-    def add_performance_stats(self, fig: plt.Figure) -> None:
-        """添加性能统计信息"""
-        returns = pd.Series(self.account.daily_balance).pct_change()
-        sharpe_ratio = self.calculate_sharpe_ratio(returns)
-        win_rate = self.calculate_win_rate()
-        
-        stats_text = (
-            f'Initial Balance: ${self.account.initial_balance:.2f}\n'
-            f'Final Balance: ${self.account.balance:.2f}\n'
-            f'Total Return: {((self.account.balance/self.account.initial_balance-1)*100):.2f}%\n'
-            f'Max Drawdown: {self.account.max_drawdown*100:.2f}%\n'
-            f'Sharpe Ratio: {sharpe_ratio:.2f}\n'
-            f'Win Rate: {win_rate:.2f}%'
-        )
-        fig.text(0.15, 0.95, stats_text, fontsize=10, verticalalignment='top',
-                bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-
-    def calculate_win_rate(self) -> float:
-        """计算胜率"""
-        closed_trades = [order for order in self.account.orders 
-                        if order.status == OrderStatus.CLOSED]
-        if not closed_trades:
-            return 0.0
-        winning_trades = sum(1 for order in closed_trades if order.pnl > 0)
-        return (winning_trades / len(closed_trades)) * 100
-
-    def calculate_sharpe_ratio(self, returns: pd.Series) -> float:
-        """计算夏普比率"""
-        annualization_factor = {
-            TimeFrame.DAY: 252,
-            TimeFrame.HOUR: 252 * 24,
-            TimeFrame.FOUR_HOUR: 252 * 6
-        }[self.timeframe]
-        
-        returns_std = returns.std() * np.sqrt(annualization_factor)
-        returns_mean = returns.mean() * annualization_factor
-        return (returns_mean - 0.03) / returns_std if returns_std != 0 else 0
-
-    def generate_report(self, save_path: Optional[str] = None) -> None:
-        """生成完整的视觉报告"""
+        metrics.update({
+            "Sortino Ratio": f"{perf.sortino_ratio:.2f}",
+            "Calmar Ratio": f"{perf.calmar_ratio:.2f}",
+            "Avg Drawdown": f"{perf.avg_drawdown:.2%}",
+            "Max Drawdown Duration (hours)": f"{perf.max_drawdown_duration:.2f}",
+            "Exposure": f"{perf.exposure:.2%}",
+            "Profit Factor": f"{perf.profit_factor:.2f}",
+        })
+        self.performance = perf
+        return metrics
 
-        # 创建主要性能图表
-        fig1, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(12, 15))
-        self.plot_equity_curve(ax1)
-        self.plot_drawdown(ax2)
-        self.plot_returns_distribution(ax3)
-        self.add_performance_stats(fig1)
-        
-        # 创建交易分析图表
-        trades = self._prepare_trade_data()
-        if len(trades) > 0:
-            fig2, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
-            self.plot_pnl_distribution(trades, ax1)
-            self.plot_holding_time_distribution(trades, ax2)
-            self.plot_cumulative_pnl(trades, ax3)
-            self.plot_trade_pnl(trades, ax4)
-            plt.tight_layout()
-        
-        if save_path:
-            fig1.savefig(f'{save_path}_performance.png', dpi=300, bbox_inches='tight')
-            if len(trades) > 0:
-                fig2.savefig(f'{save_path}_trades.png', dpi=300, bbox_inches='tight')
-        else:
-            plt.show()
\ No newline at end of file
+    def run(self, data: pd.DataFrame, signals: pd.DataFrame, timeframe: TimeFrame, symbol: str = "WLD"):
+        """
+        统一的回测入口，多币种同时回测见 portfolio.PortfolioBackTest
+        TELEMETRY 打开时各阶段耗时记为 backtest.prepare/kernel/apply/metrics
+        """
+        label = getattr(timeframe, 'value', timeframe)
+        print(f"Running backtest for {label} timeframe")
+        with TELEMETRY.span('backtest.prepare'):
+            merged_data = self._prepare_data(data, signals, timeframe, symbol)
+        print(f"Total {label}s after merge: {len(merged_data)}")
+        
+        self._execute_trades(merged_data, timeframe, symbol)
+        with TELEMETRY.span('backtest.metrics'):
+            return self.generate_performance_metrics(timeframe)
+
+
+def __getattr__(name):
+    # 绘图相关代码在 report.py，用到时才导入 matplotlib
+    if name == 'BacktestVisualizer':
+        from .report import BacktestVisualizer
+        return BacktestVisualizer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,337 @@
+"""
+流水线基准测试：用固定种子生成的合成K线，按数据规模逐阶段计时并记录峰值内存
+
+    python -m tradeBot.bench run --sizes 10k,1m --out bench.json
+    python -m tradeBot.bench compare old.json new.json
+
+生成的数据按 (种子, 规模, 周期) 缓存在 --data-dir，同一份数据可以在不同提交上重复使用
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .ingest import KLINE_COLUMNS, read_klines
+from .resample import bar_length
+from .store import MarketStore
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+STAGES = ('load_csv', 'load_store', 'format', 'resample', 'signal', 'backtest', 'metrics', 'report')
+DATA_DIR = os.path.join(tempfile.gettempdir(), 'tradebot-bench')
+# 生成算法改变时加一，使旧的缓存数据失效
+GENERATOR_VERSION = 1
+MEMORY_MODES = ('rss', 'tracemalloc', 'off')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+# 小时线超过该根数时时间戳会越过 datetime64[ns] 的上限，改用分钟线
+MAX_HOURLY_BARS = 1_500_000
+
+
+class SyntheticMarket:
+    """
+    固定种子的多币种合成K线，Binance kline 的12列格式(时间为毫秒)
+    第一个币种作为基准，其余币种的对数收益 = beta * 基准收益 + 独立噪声
+    同样的种子、币种和根数总是得到同样的数据
+    """
+
+    def __init__(self, seed: int = 0, start: str = '2000-01-01', interval: str = '1h',
+                 volatility: float = 0.01, beta: float = 1.2, correlation: float = 0.7):
+        self.seed = seed
+        self.start = pd.Timestamp(start)
+        self.interval = interval
+        self.volatility = volatility
+        self.beta = beta
+        self.correlation = correlation
+
+    def klines(self, symbols: Sequence[str], bars: int) -> Dict[str, pd.DataFrame]:
+        step = int(bar_length(self.interval) / np.timedelta64(1, 'ms'))
+        open_time = int(self.start.value // 1_000_000) + np.arange(bars, dtype=np.int64) * step
+        market = np.random.default_rng([self.seed, 0]).normal(0.0, self.volatility, bars)
+        # 独立噪声的波动率使各币种与基准的相关系数等于 correlation
+        idio = self.beta * self.volatility * np.sqrt(1.0 / self.correlation ** 2 - 1.0)
+        frames = {}
+        for i, symbol in enumerate(symbols):
+            rng = np.random.default_rng([self.seed, i + 1])
+            returns = market if i == 0 else self.beta * market + rng.normal(0.0, idio, bars)
+            frames[symbol] = self._ohlcv(rng, open_time, step, 100.0 / (i + 1), returns)
+        return frames
+
+    def _ohlcv(self, rng: np.random.Generator, open_time: np.ndarray, step: int,
+               price: float, returns: np.ndarray) -> pd.DataFrame:
+        bars = len(returns)
+        close = price * np.exp(np.cumsum(returns))
+        open_ = np.empty(bars)
+        open_[0] = price
+        open_[1:] = close[:-1]
+        wick = np.abs(rng.normal(0.0, self.volatility / 2, (2, bars)))
+        high = np.maximum(open_, close) * np.exp(wick[0])
+        low = np.minimum(open_, close) * np.exp(-wick[1])
+        volume = np.round(rng.lognormal(8.0, 1.0, bars), 1)
+        taker = np.round(volume * rng.uniform(0.3, 0.7, bars), 1)
+        return pd.DataFrame({
+            'open_time': open_time,
+            'open': open_, 'high': high, 'low': low, 'close': close,
+            'volume': volume,
+            'close_time': open_time + step - 1,
+            'quote_volume': volume * close,
+            'count': rng.poisson(1000, bars).astype(np.int64),
+            'taker_buy_volume': taker,
+            'taker_buy_quote_volume': taker * close,
+            'ignore': np.zeros(bars, dtype=np.int64),
+        }, columns=KLINE_COLUMNS)
+
+
+def prepare_data(bars: int, symbols: Sequence[str] = ('BENCHUSDT', 'ALTUSDT'), seed: int = 0,
+                 data_dir: str = DATA_DIR) -> Dict:
+    """
+    生成(或复用已缓存的)合成数据，同时写成 Binance kline CSV 和 MarketStore 二进制两种格式
+    返回 {'interval', 'csv': {symbol: path}, 'store': 目录}
+    """
+    interval = '1h' if bars <= MAX_HOURLY_BARS else '1m'
+    directory = os.path.join(data_dir, f"v{GENERATOR_VERSION}-seed{seed}-{bars}-{interval}")
+    csv = {symbol: os.path.join(directory, f"{symbol}-{interval}.csv") for symbol in symbols}
+    store_dir = os.path.join(directory, 'store')
+    store = MarketStore(store_dir)
+    if not all(os.path.exists(path) and store.manifest(symbol, interval) is not None
+               for symbol, path in csv.items()):
+        os.makedirs(directory, exist_ok=True)
+        frames = SyntheticMarket(seed=seed, interval=interval).klines(symbols, bars)
+        for symbol, df in frames.items():
+            df.to_csv(csv[symbol], index=False)
+            store.write(symbol, interval, df.drop(columns='ignore'))
+    return {'interval': interval, 'csv': csv, 'store': store_dir}
+
+
+class _RssSampler(threading.Thread):
+    """后台线程按固定间隔读取 /proc/self/statm，记录常驻内存的峰值(字节)"""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = self.start_rss = _rss()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, _rss())
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return max(self.peak, _rss())
+
+
+def _rss() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # 没有 /proc 时退回进程的高水位(只增不减)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageTimer:
+    """
+    逐阶段计时并记录峰值内存 peak_mb：
+      memory='rss'        阶段内常驻内存峰值相对阶段开始时的增量，后台线程采样，几乎不影响计时
+      memory='tracemalloc' 阶段内 Python/NumPy 分配的峰值，精确但会明显拖慢纯 Python 代码(如绘图)
+      memory='off'        只计时
+    """
+
+    def __init__(self, memory: str = 'rss', log: Optional[Callable[[Dict], None]] = None, **context):
+        if memory not in MEMORY_MODES:
+            raise ValueError(f"memory must be one of {MEMORY_MODES}")
+        self.memory = memory
+        self.log = log
+        self.context = context  # 附加到每条记录的字段，如 bars / interval
+        self.records: List[Dict] = []
+
+    def run(self, stage: str, func: Callable, rows: int):
+        sampler = None
+        if self.memory == 'tracemalloc':
+            tracemalloc.start()
+        elif self.memory == 'rss':
+            sampler = _RssSampler()
+            sampler.start()
+        start = time.perf_counter()
+        # 被测代码里的 print 不计入输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func()
+        seconds = time.perf_counter() - start
+        record = {**self.context, 'stage': stage, 'rows': rows, 'seconds': seconds,
+                  'rows_per_s': rows / seconds if seconds > 0 else None}
+        if self.memory == 'tracemalloc':
+            record['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        elif sampler is not None:
+            record['peak_mb'] = (sampler.stop() - sampler.start_rss) / 2 ** 20
+        record['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.records.append(record)
+        if self.log is not None:
+            self.log(record)
+        return result
+
+
+def run_pipeline(data: Dict, bars: int, stages: Sequence[str] = STAGES, memory: str = 'rss',
+                 log: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+    """
+    按 load → format → resample → signal → backtest → metrics → report 的顺序运行一遍并计时
+    log(record) 在每个阶段结束时调用
+    """
+    from .account import MockAccount
+    from .backtest import BackTest, TimeFrame
+    from .db import DB
+    from .resample import default_resampler
+    from .strategy import Strategy
+
+    bench, alt = list(data['csv'])
+    interval = data['interval']
+    timer = StageTimer(memory, log, bars=bars, interval=interval)
+
+    def load_csv():
+        frames = {}
+        for symbol, path in data['csv'].items():
+            df = read_klines([path], workers=1)
+            df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
+            df['close_time'] = pd.to_datetime(df['close_time'], unit='ms')
+            frames[symbol] = df
+        return frames
+
+    frames = timer.run('load_csv', load_csv, bars * 2)
+    if 'load_store' in stages:
+        store = MarketStore(data['store'])
+        timer.run('load_store', lambda: {s: store.load(s, interval) for s in data['csv']}, bars * 2)
+    if 'format' in stages:
+        frames[alt] = timer.run('format', lambda: DB.add_MACD(DB.add_day_changes(DB.add_day_price(frames[alt]))),
+                                bars)
+    if 'resample' in stages:
+        default_resampler.clear()
+        timer.run('resample', lambda: Strategy._convert_to_4h(frames[alt]), bars)
+
+    signals = timer.run('signal', lambda: Strategy.BTC_WLD_hour(frames[alt], frames[bench])[0], bars)
+    account = MockAccount(initial_balance=1000.0, leverage=20.0)
+    backtest = BackTest(account, risk_free_rate=0.02)
+    if 'backtest' in stages:
+        def execute():
+            merged = backtest._prepare_data(frames[alt], signals, TimeFrame.HOUR)
+            return backtest._execute_trades(merged, TimeFrame.HOUR)
+        timer.run('backtest', execute, bars)
+    if 'metrics' in stages:
+        timer.run('metrics', lambda: backtest.generate_performance_metrics(TimeFrame.HOUR), bars)
+    if 'report' in stages:
+        from .report import render_report
+        with tempfile.TemporaryDirectory() as out:
+            timer.run('report', lambda: render_report(account, TimeFrame.HOUR, os.path.join(out, 'bench'),
+                                                      dpi=72), bars)
+
+    for record in timer.records:
+        record['trades'] = len(account.orders)
+    return [r for r in timer.records if r['stage'] in stages]
+
+
+def environment() -> Dict:
+    """记录结果对应的提交和运行环境，便于比较"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'commit': commit or None,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(base: Dict, new: Dict) -> pd.DataFrame:
+    """两次结果按 (规模, 阶段) 对齐，ratio = new / base，大于 1 表示变慢"""
+    def frame(result):
+        df = pd.DataFrame(result['results'])
+        return df.groupby(['bars', 'stage'], sort=False)[['seconds'] + (['peak_mb'] if 'peak_mb' in df else [])].min()
+    a, b = frame(base), frame(new)
+    table = a.join(b, how='inner', lsuffix='_base', rsuffix='_new')
+    table['ratio'] = table['seconds_new'] / table['seconds_base']
+    return table
+
+
+def _print_record(r: Dict):
+    memory = f", peak {r['peak_mb']:.1f} MB" if 'peak_mb' in r else ''
+    print(f"{r['bars']:>10} {r['stage']:<10} {r['seconds']:8.3f}s{memory}", flush=True)
+
+
+def _parse_sizes(text: str) -> List[int]:
+    sizes = []
+    for item in text.split(','):
+        item = item.strip().lower()
+        if item:
+            sizes.append(SIZES[item] if item in SIZES else int(float(item)))
+    return sizes
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m tradeBot.bench",
+                                     description="Time every pipeline stage on seeded synthetic klines")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('run', help="run the benchmark and write JSON results")
+    p.add_argument('--sizes', default='10k,1m', help="comma separated bar counts: 10k,100k,1m,10m or numbers")
+    p.add_argument('--stages', default=','.join(STAGES))
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--repeat', type=int, default=1, help="runs per size, compare uses the fastest")
+    p.add_argument('--data-dir', default=DATA_DIR)
+    p.add_argument('--memory', default='rss', choices=MEMORY_MODES,
+                   help="peak memory per stage: sampled RSS growth (default), tracemalloc (slows pure-Python "
+                        "stages) or off")
+    p.add_argument('--out', default=None, help="write results as JSON")
+    p.add_argument('--compare', default=None, metavar='BASE', help="compare against an earlier JSON result")
+    p = sub.add_parser('compare', help="compare two JSON results")
+    p.add_argument('base')
+    p.add_argument('new')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.base) as f, open(args.new) as g:
+            table = compare(json.load(f), json.load(g))
+        print(table.to_string(float_format=lambda v: f"{v:.3f}"))
+        return table
+
+    stages = [s for s in args.stages.split(',') if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    results = []
+    for bars in _parse_sizes(args.sizes):
+        start = time.perf_counter()
+        data = prepare_data(bars, seed=args.seed, data_dir=args.data_dir)
+        print(f"{bars} bars ({data['interval']}): data ready in {time.perf_counter() - start:.1f}s",
+              file=sys.stderr)
+        for _ in range(args.repeat):
+            results.extend(run_pipeline(data, bars, stages, memory=args.memory, log=_print_record))
+    output = {'environment': environment(), 'seed': args.seed, 'memory': args.memory,
+              'results': results}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(output, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), output).to_string(float_format=lambda v: f"{v:.3f}"))
+    return output
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""
+按内容寻址的阶段缓存
+
+    cache = StageCache('tradeBot/cache')
+    signals = cache.cached('signals', lambda: compute(...), df_alt, df_bench,
+                           code=(signal_engine,), timeframe='hour', streak_len=3)
+
+键 = 阶段名 + 输入数据指纹 + 阶段参数 + 相关模块源码的指纹，数据、参数或代码任一变化都会重新计算。
+结果先放进进程内的 LRU 备忘表，root 不为空时再写到磁盘：每条一个目录，数组和 DataFrame 的列
+存成 .npy，其余对象 pickle，meta.json 记录结构；磁盘总大小超过 max_bytes 时按最近使用时间淘汰。
+和 Resampler 一样，调用方不要原地修改返回的对象
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .telemetry import TELEMETRY
+
+# 存储格式变化时递增，旧条目自动失效
+CACHE_FORMAT = 1
+META = "meta.json"
+
+_code_versions: Dict[tuple, str] = {}
+
+
+def code_version(*objects) -> str:
+    """模块(或类/函数所在模块)源文件内容的指纹，按 (路径, 修改时间, 大小) 缓存"""
+    h = hashlib.blake2b(str(CACHE_FORMAT).encode(), digest_size=16)
+    for obj in objects:
+        module = obj if hasattr(obj, '__file__') else sys.modules[obj.__module__]
+        path = module.__file__
+        stat = os.stat(path)
+        token = (path, stat.st_mtime_ns, stat.st_size)
+        digest = _code_versions.get(token)
+        if digest is None:
+            with open(path, 'rb') as f:
+                digest = _code_versions[token] = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        h.update(digest.encode())
+    return h.hexdigest()
+
+
+def _update(h, value):
+    """把一个输入写进哈希，DataFrame/数组按列的原始字节"""
+    if isinstance(value, pd.DataFrame):
+        h.update(b'frame')
+        if not isinstance(value.index, pd.RangeIndex) or value.index.start != 0 or value.index.step != 1:
+            _update(h, value.index.to_numpy())
+        h.update(str(len(value)).encode())
+        for name in value.columns:
+            h.update(repr(name).encode())
+            _update(h, value[name].to_numpy())
+    elif isinstance(value, pd.Series):
+        _update(h, value.to_frame())
+    elif isinstance(value, np.ndarray):
+        h.update(f"array{value.dtype.str}{value.shape}".encode())
+        if value.dtype.hasobject:
+            h.update(pd.util.hash_array(value.ravel()).tobytes())
+        else:
+            h.update(np.ascontiguousarray(value).view(np.uint8).data)
+    elif isinstance(value, dict):
+        h.update(b'dict')
+        for k in sorted(value):
+            h.update(repr(k).encode())
+            _update(h, value[k])
+    elif isinstance(value, (list, tuple)):
+        h.update(f"seq{len(value)}".encode())
+        for item in value:
+            _update(h, item)
+    else:
+        h.update(f"{type(value).__name__}:{value!r}".encode())
+
+
+def fingerprint(*values) -> str:
+    """输入数据的内容指纹(十六进制)，与对象身份无关"""
+    h = hashlib.blake2b(digest_size=16)
+    for value in values:
+        _update(h, value)
+    return h.hexdigest()
+
+
+# ---- 磁盘格式 ----
+
+def _encode(value, directory: str, prefix: str) -> Dict:
+    """把值写成 directory 下的文件，返回描述结构的 spec"""
+    if isinstance(value, pd.DataFrame):
+        files = []
+        for i, name in enumerate(value.columns):
+            files.append(_save_array(value[name].to_numpy(), directory, f"{prefix}c{i}"))
+        index = None
+        if not isinstance(value.index, pd.RangeIndex) or value.index.start != 0 or value.index.step != 1:
+            index = _save_array(value.index.to_numpy(), directory, f"{prefix}index")
+        return {'kind': 'frame', 'columns': list(value.columns), 'files': files,
+                'index': index, 'rows': len(value)}
+    if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        return {'kind': 'array', 'file': _save_array(value, directory, prefix + 'a')}
+    if isinstance(value, tuple) and _has_arrays(value):
+        return {'kind': 'tuple', 'items': [_encode(v, directory, f"{prefix}{i}_") for i, v in enumerate(value)]}
+    if isinstance(value, dict) and all(isinstance(k, str) for k in value) and _has_arrays(value):
+        return {'kind': 'dict', 'items': {k: _encode(v, directory, f"{prefix}{i}_")
+                                          for i, (k, v) in enumerate(value.items())}}
+    name = prefix + 'obj.pkl'
+    with open(os.path.join(directory, name), 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {'kind': 'pickle', 'file': name}
+
+
+def _has_arrays(value) -> bool:
+    # 只有包含数组/DataFrame 的容器才拆开存，纯标量的直接 pickle
+    if isinstance(value, (pd.DataFrame, np.ndarray)):
+        return True
+    if isinstance(value, tuple):
+        return any(_has_arrays(v) for v in value)
+    if isinstance(value, dict):
+        return any(_has_arrays(v) for v in value.values())
+    return False
+
+
+def _save_array(arr: np.ndarray, directory: str, name: str) -> str:
+    name += '.npy'
+    np.save(os.path.join(directory, name), np.ascontiguousarray(arr), allow_pickle=arr.dtype.hasobject)
+    return name
+
+
+def _decode(spec: Dict, directory: str):
+    kind = spec['kind']
+    if kind == 'frame':
+        columns = {name: _load_array(directory, f) for name, f in zip(spec['columns'], spec['files'])}
+        index = _load_array(directory, spec['index']) if spec['index'] else None
+        if not columns:
+            return pd.DataFrame(index=index if index is not None else pd.RangeIndex(spec['rows']))
+        return pd.DataFrame(columns, index=index, copy=False)
+    if kind == 'array':
+        return _load_array(directory, spec['file'])
+    if kind == 'tuple':
+        return tuple(_decode(s, directory) for s in spec['items'])
+    if kind == 'dict':
+        return {k: _decode(s, directory) for k, s in spec['items'].items()}
+    with open(os.path.join(directory, spec['file']), 'rb') as f:
+        return pickle.load(f)
+
+
+def _load_array(directory: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(directory, name), allow_pickle=True)
+
+
+def _size(value) -> int:
+    """备忘表里对象的大致字节数"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=False, deep=False).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_size(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_size(v) for v in value.values())
+    return 64
+
+
+EVICT_TO = 0.9  # 淘汰后的目标占用比例
+
+
+class StageCache:
+    """
+    两层缓存：进程内 LRU 备忘表(按字节数限制) + 可选的磁盘目录(按字节数 LRU 淘汰)
+    stats 记录每个阶段的 memo/disk 命中和未命中次数，TELEMETRY 打开时同时计数
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: int = 2 << 30,
+                 memo_bytes: int = 256 << 20):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.memo_bytes = memo_bytes
+        self._memo: 'OrderedDict[str, tuple]' = OrderedDict()   # path key -> (value, bytes)
+        self._memo_used = 0
+        self._disk_used: Optional[int] = None   # 磁盘总字节数的累计值，第一次写入时扫描一次
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def key(self, stage: str, *inputs, code: Sequence = (), **params) -> str:
+        return fingerprint(stage, code_version(*code) if code else '', inputs, params)
+
+    def _count(self, stage: str, event: str):
+        counts = self.stats.setdefault(stage, {'memo': 0, 'disk': 0, 'miss': 0})
+        counts[event] += 1
+        TELEMETRY.inc(f"cache.{stage}.{event}")
+
+    def _entry_dir(self, stage: str, key: str) -> str:
+        return os.path.join(self.root, stage, key)
+
+    # ---- 备忘表 ----
+    def _memo_get(self, name: str):
+        entry = self._memo.get(name)
+        if entry is None:
+            return None
+        self._memo.move_to_end(name)
+        return entry
+
+    def _memo_put(self, name: str, value):
+        size = _size(value)
+        if size > self.memo_bytes:
+            return
+        old = self._memo.pop(name, None)
+        if old is not None:
+            self._memo_used -= old[1]
+        self._memo[name] = (value, size)
+        self._memo_used += size
+        while self._memo_used > self.memo_bytes:
+            _, (_, evicted) = self._memo.popitem(last=False)
+            self._memo_used -= evicted
+
+    # ---- 读写 ----
+    def get(self, stage: str, key: str, default=None):
+        name = f"{stage}/{key}"
+        entry = self._memo_get(name)
+        if entry is not None:
+            self._count(stage, 'memo')
+            return _shallow(entry[0])
+        if self.root is not None:
+            directory = self._entry_dir(stage, key)
+            try:
+                with open(os.path.join(directory, META)) as f:
+                    meta = json.load(f)
+                value = _decode(meta['spec'], directory)
+            except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+                value = None
+                meta = None
+            if meta is not None:
+                # 修改时间作为最近使用时间，淘汰时按它排序
+                os.utime(os.path.join(directory, META))
+                self._memo_put(name, value)
+                self._count(stage, 'disk')
+                return _shallow(value)
+        self._count(stage, 'miss')
+        return default
+
+    def put(self, stage: str, key: str, value):
+        self._memo_put(f"{stage}/{key}", value)
+        if self.root is None:
+            return
+        directory = self._entry_dir(stage, key)
+        # 先写到临时目录再改名，并发的进程不会读到写了一半的条目
+        tmp = directory + f".tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(tmp)
+        try:
+            spec = _encode(value, tmp, '')
+            nbytes = sum(e.stat().st_size for e in os.scandir(tmp))
+            with open(os.path.join(tmp, META), 'w') as f:
+                json.dump({'stage': stage, 'spec': spec, 'bytes': nbytes, 'created': time.time()}, f)
+            nbytes += os.path.getsize(os.path.join(tmp, META))
+            if self._disk_used is None:
+                self._disk_used = self.disk_bytes()
+            if os.path.exists(directory):
+                self._disk_used -= sum(e.stat().st_size for e in os.scandir(directory))
+                shutil.rmtree(directory, ignore_errors=True)
+            os.replace(tmp, directory)
+            self._disk_used += nbytes
+        finally:
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp, ignore_errors=True)
+        # 只在累计值超限时才扫描目录淘汰，避免每次写入都 stat 所有条目
+        if self._disk_used > self.max_bytes:
+            self.evict()
+
+    def cached(self, stage: str, compute: Callable[[], Any], *inputs, code: Sequence = (), **params):
+        """命中时直接返回缓存结果，否则调用 compute() 并保存"""
+        key = self.key(stage, *inputs, code=code, **params)
+        missing = object()
+        value = self.get(stage, key, missing)
+        if value is missing:
+            with TELEMETRY.span(f"cache.{stage}.compute"):
+                value = compute()
+            self.put(stage, key, value)
+        return value
+
+    # ---- 磁盘容量 ----
+    def entries(self):
+        """磁盘上的条目 (最近使用时间, 字节数, 目录)"""
+        if self.root is None or not os.path.isdir(self.root):
+            return []
+        entries = []
+        for stage in os.scandir(self.root):
+            if not stage.is_dir():
+                continue
+            for entry in os.scandir(stage.path):
+                if not entry.is_dir() or '.tmp-' in entry.name:
+                    continue
+                try:
+                    used = os.stat(os.path.join(entry.path, META)).st_mtime
+                    nbytes = sum(e.stat().st_size for e in os.scandir(entry.path))
+                except OSError:
+                    continue
+                entries.append((used, nbytes, entry.path))
+        return entries
+
+    def disk_bytes(self) -> int:
+        return sum(nbytes for _, nbytes, _ in self.entries())
+
+    def evict(self):
+        """
+        磁盘总大小超过 max_bytes 时从最久未使用的条目开始删除，删到 max_bytes 的 EVICT_TO 为止，
+        留出余量使写满后不会每次写入都扫描一遍；扫描结果同时校正累计值
+        """
+        entries = sorted(self.entries())
+        total = sum(nbytes for _, nbytes, _ in entries)
+        if total <= self.max_bytes:
+            self._disk_used = total
+            return
+        for _, nbytes, path in entries:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= nbytes
+        self._disk_used = total
+
+    def clear(self):
+        self._memo.clear()
+        self._memo_used = 0
+        self._disk_used = None
+        if self.root is not None and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+
+def _shallow(value):
+    # DataFrame 返回浅拷贝，调用方新增/替换列不会影响缓存里的对象
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_shallow(v) for v in value)
+    return value
@@ -34,6 +34,8 @@ class Config:
         self.SECRET_KEY=private_key
         self.WLD_AMOUNT=3
         self.TRADING_PAIR=["WLDUSDT"]
+        self.BENCHMARK_PAIR="BTCUSDT"
+        self.KLINE_INTERVAL="1h"
         self.OP_PATH=os.path.join(data_dictionary,'OP_format.csv')
 
         
@@ -3,20 +3,33 @@ import numpy as np
 import os
 import glob
 import sqlite3
+import json
+import io
+from .store import MarketStore
+from .ingest import read_klines
+from .indicators import Indicators
+
+FORMAT_OUTPUT='/home/litterpigger/myprojects/futureBot/tradeBot/format_data/OP_format.csv'
 
 class DB:
-    def __init__(self):
+    def __init__(self,store_path=None):
         current_dictionary=os.path.abspath(os.getcwd())
         print(current_dictionary)
         file_path=os.path.join(current_dictionary,"tradeBot","arb_data")
         self.files_path=glob.glob(os.path.join(file_path,"*.csv"))
-    def db_init(self):
-        dfs=[]
-        for file in sorted(self.files_path):
-            df=pd.read_csv(file)
-            dfs.append(df)
+        if store_path is None:
+            store_path=os.path.join(current_dictionary,"tradeBot","store")
+        self.store=MarketStore(store_path)
+    def store_csv(self,path,symbol,interval,float_dtype=np.float64):
+        # 把CSV一次性转换成列式二进制存储，之后用 load 读取
+        return self.store.write(symbol,interval,pd.read_csv(path),float_dtype=float_dtype)
+    def load(self,symbol,interval,start=None,end=None,columns=None,as_frame=True):
+        # 按时间区间从列式存储读取，as_frame=False 时返回零拷贝的 memmap 数组
+        return self.store.load(symbol,interval,start,end,columns=columns,as_frame=as_frame)
+    def db_init(self,workers=None):
+        # 多进程按固定类型解析各月文件(csv 或 zip)，按 open_time 去重
+        combined_db=read_klines(sorted(self.files_path),workers=workers)
         print('loading completed')
-        combined_db=pd.concat(dfs,ignore_index=True)
         combined_db['open_time']=pd.to_datetime(combined_db['open_time'],unit='ms')
         combined_db['close_time']=pd.to_datetime(combined_db['close_time'],unit='ms')
         
@@ -27,57 +40,28 @@ class DB:
     
     @staticmethod
     def caculate_ema(data,span):
-       return data['close'].ewm(span=span,adjust=False).mean() 
+       return pd.Series(Indicators.ema(data['close'].to_numpy(),span),index=data.index)
     @staticmethod 
     def add_MACD(df):
-        ema12=DB.caculate_ema(df,12)
-        ema26=DB.caculate_ema(df,26)
-        df['MACD']=ema12-ema26
-        df['MACD'].iloc[:21] = np.nan
-        df['Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-        df['Signal'].iloc[:29]=np.nan
-        df['MACD_Histogram'] = df['MACD'] - df['Signal']
+        macd,signal,histogram=Indicators.macd(df['close'].to_numpy())
+        df['MACD']=macd
+        df['Signal']=signal
+        df['MACD_Histogram']=histogram
 
         return df
     @staticmethod
     def add_day_price(df):
-      # Convert open_time to datetime if it's not already
+        # day_price 为下一个自然日第一根K线的开盘价
         df['open_time'] = pd.to_datetime(df['open_time'])
-        
-        # Create a helper column with just the date
-        df['date'] = df['open_time'].dt.date
-        
-        # For each date, find the next day's opening price
-        day_prices = df.groupby('date')['open'].first().reset_index()
-        print(day_prices.head(10))
-        # Shift the prices up by one row to get next day's price
-        day_prices['day_price'] = day_prices['open'].shift(-1)
-        
-        # Merge back to original dataframe
-        df = df.merge(day_prices[['date', 'day_price']], on='date', how='left')
-        
-        # Drop the helper column
-        df = df.drop('date', axis=1)
-        
+        df['day_price'] = Indicators.day_price(df['open_time'].to_numpy(),df['open'].to_numpy())
         return df
     @staticmethod
     def add_day_changes(df):
-    # Convert open_time to datetime if not already
+        # 与24小时前同一时刻比较，按时间戳查找，缺K线时为 NaN 而不是错位到别的K线
         df['open_time'] = pd.to_datetime(df['open_time'])
-        
-        # For dynamic change (comparing with same time yesterday)
-        # Shift the 'open' price by 24 rows (assuming hourly data) to get yesterday's price
-        df['yesterday_price'] = df['open'].shift(24)
-        df['day_change_dynamic'] = ((df['open'] - df['yesterday_price']) / df['yesterday_price'] * 100).round(2)
-        
-        # For static change (comparing day_price with yesterday's day_price)
-        # First get yesterday's day_price
-        df['yesterday_day_price'] = df['day_price'].shift(24)
-        df['day_change_static'] = ((df['day_price'] - df['yesterday_day_price']) / df['yesterday_day_price'] * 100).round(2)
-        
-        # Clean up: remove the temporary columns
-        df = df.drop(['yesterday_price', 'yesterday_day_price'], axis=1)
-        
+        times=df['open_time'].to_numpy()
+        df['day_change_dynamic'] = np.round(Indicators.day_change_dynamic(times,df['open'].to_numpy()),2)
+        df['day_change_static'] = np.round(Indicators.day_change_static(times,df['day_price'].to_numpy()),2)
         return df 
 
     @staticmethod
@@ -85,22 +69,138 @@ class DB:
         df.to_csv(path,index=False)
         print('Export Successfully')
     @staticmethod
-    def format_then_export(path):
+    def format_then_export(path,output=FORMAT_OUTPUT,incremental=False):
         current_dictionary=os.path.abspath(os.getcwd())
         print(current_dictionary)
         
-        files_path=glob.glob(os.path.join(path,"*.csv"))
+        files_path=sorted(glob.glob(os.path.join(path,"*.csv")))
         print(files_path)
-        dfs=[]
-        for file in sorted(files_path):
-            df=pd.read_csv(file)
-            dfs.append(df)
+        if incremental:
+            state=DB._load_format_state(output)
+            if state is not None and os.path.exists(output):
+                if DB._format_incremental(files_path,output,state):
+                    return
+                print('Incremental update not possible, rebuilding')
+        combined_db=read_klines(files_path)
         print('loading completed')
-        combined_db=pd.concat(dfs,ignore_index=True)
         combined_db['open_time']=pd.to_datetime(combined_db['open_time'],unit='ms')
         combined_db['close_time']=pd.to_datetime(combined_db['close_time'],unit='ms')
         combined_db=DB.add_MACD(DB.add_day_changes(DB.add_day_price(combined_db)))
-        DB.export_to_csv(combined_db,'/home/litterpigger/myprojects/futureBot/tradeBot/format_data/OP_format.csv') 
+        DB.export_to_csv(combined_db,output)
+        state=DB._indicator_state(combined_db,len(combined_db),
+                                  DB.caculate_ema(combined_db,12).iloc[-1],
+                                  DB.caculate_ema(combined_db,26).iloc[-1],
+                                  Indicators.ema(combined_db['MACD'].to_numpy(),9)[-1])
+        state['files']=[os.path.basename(f) for f in files_path]
+        DB._save_format_state(output,state)
+
+    # ---- 增量格式化 ----
+    # 状态文件保存已处理的月份文件、总行数、EMA12/EMA26/Signal 的最新值和最后一天的行数
+    @staticmethod
+    def _state_path(output):
+        return output+'.state.json'
+    @staticmethod
+    def _load_format_state(output):
+        path=DB._state_path(output)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+    @staticmethod
+    def _save_format_state(output,state):
+        tmp=DB._state_path(output)+'.tmp'
+        with open(tmp,'w') as f:
+            json.dump(state,f,indent=2)
+        os.replace(tmp,DB._state_path(output))
+    @staticmethod
+    def _indicator_state(df,rows,ema12,ema26,signal):
+        dates=df['open_time'].dt.date
+        return {
+            'rows':int(rows),
+            'ema12':float(ema12),
+            'ema26':float(ema26),
+            'signal':float(signal),
+            'last_date_rows':int((dates==dates.iloc[-1]).sum()),
+        }
+    @staticmethod
+    def _read_tail(path,n_lines):
+        # 从文件末尾往前读 n_lines 行，返回 (每行的起始字节位置, DataFrame)
+        with open(path,'rb') as f:
+            header=f.readline()
+            header_end=f.tell()
+            f.seek(0,os.SEEK_END)
+            size=f.tell()
+            pos=size
+            block=b''
+            while pos>header_end and block.count(b'\n')<=n_lines:
+                step=min(1<<16,pos-header_end)
+                pos-=step
+                f.seek(pos)
+                block=f.read(step)+block
+        lines=block.splitlines(keepends=True)
+        if pos>header_end:
+            lines=lines[1:]  # 第一行可能不完整
+        lines=lines[-n_lines:]
+        offsets=size-np.cumsum([len(line) for line in reversed(lines)])[::-1]
+        tail=pd.read_csv(io.BytesIO(header+b''.join(lines)),float_precision='round_trip')
+        return offsets,tail
+    @staticmethod
+    def _format_incremental(files_path,output,state):
+        """只计算新增月份影响到的行，然后追加写入"""
+        new_files=[f for f in files_path if os.path.basename(f) not in set(state['files'])]
+        if not new_files:
+            print('No new files, nothing to update')
+            return True
+        # 与全量重建一样用 read_klines 解析，兼容没有表头的 Binance 月度文件
+        new_db=read_klines(new_files)
+        new_db['open_time']=pd.to_datetime(new_db['open_time'],unit='ms')
+        new_db['close_time']=pd.to_datetime(new_db['close_time'],unit='ms')
+
+        # 需要重写最后一天(它的 day_price 依赖新数据)，再往前带24行给 shift(24) 用
+        rewrite_rows=state['last_date_rows']
+        context_rows=min(24,state['rows']-rewrite_rows)
+        offsets,tail=DB._read_tail(output,rewrite_rows+context_rows)
+        tail['open_time']=pd.to_datetime(tail['open_time'])
+        tail['close_time']=pd.to_datetime(tail['close_time'])
+        if new_db['open_time'].iloc[0]<=tail['open_time'].iloc[-1]:
+            return False
+
+        raw_columns=list(new_db.columns)
+        window=pd.concat([tail[raw_columns],new_db],ignore_index=True)
+        window=DB.add_day_changes(DB._restore_context(DB.add_day_price(window),tail,context_rows))
+
+        # MACD 从保存的 EMA 状态继续计算
+        first_new=state['rows']
+        new_close=new_db['close']
+        ema12=DB._continue_ewm(new_close,state['ema12'],12)
+        ema26=DB._continue_ewm(new_close,state['ema26'],26)
+        global_idx=np.arange(first_new,first_new+len(new_db))
+        macd=(ema12-ema26).where(global_idx>=21)
+        signal=DB._continue_ewm(macd,state['signal'],9)
+        window['MACD']=np.concatenate([tail['MACD'].to_numpy(),macd.to_numpy()])
+        window['Signal']=np.concatenate([tail['Signal'].to_numpy(),signal.where(global_idx>=29).to_numpy()])
+        window['MACD_Histogram']=window['MACD']-window['Signal']
+
+        with open(output,'r+b') as f:
+            f.truncate(int(offsets[context_rows]))
+        out=window.iloc[context_rows:]
+        out.to_csv(output,mode='a',header=False,index=False)
+
+        new_state=DB._indicator_state(window,state['rows']+len(new_db),
+                                      ema12.iloc[-1],ema26.iloc[-1],signal.iloc[-1])
+        new_state['files']=state['files']+[os.path.basename(f) for f in new_files]
+        DB._save_format_state(output,new_state)
+        print(f'Appended {len(new_db)} rows from {len(new_files)} new files')
+        return True
+    @staticmethod
+    def _restore_context(window,tail,context_rows):
+        # 上下文行只用于计算，day_price 保留原文件中的值
+        window.iloc[:context_rows,window.columns.get_loc('day_price')]=tail['day_price'].iloc[:context_rows].to_numpy()
+        return window
+    @staticmethod
+    def _continue_ewm(values,last,span):
+        # 从上一次的 EMA 值继续递推，结果与整段计算一致
+        return pd.Series(Indicators.ema(values.to_numpy(dtype=float),span,start=last)) 
 
 
     
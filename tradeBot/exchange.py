@@ -0,0 +1,544 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import io
+import itertools
+import time
+from collections import deque
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from binance.error import ClientError
+
+from .feed import latency_summary
+from .kernel import ShortRule
+from .store import to_epoch_ms
+
+# 与 gateway.WEIGHTS 对应的接口权重
+ENDPOINT_WEIGHTS = {
+    'new_order': 1,
+    'cancel_order': 1,
+    'get_position_risk': 5,
+    'balance': 5,
+    'exchange_info': 1,
+}
+# 不需要签名的接口
+UNSIGNED_ENDPOINTS = ('exchange_info',)
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.8f}".rstrip('0').rstrip('.') or '0'
+
+
+class MockExchange:
+    """
+    本地 USDT-M 合约模拟交易所，实现 Account 用到的 UMFutures 接口子集
+    (new_order / cancel_order / get_position_risk / balance / exchange_info)，可以直接注入 Account(config, client=...)
+    价格来自回放的K线：市价单按当前K线收盘价加滑点成交，限价单在之后K线的 high/low 穿过时按限价成交
+    单向持仓模式、全仓保证金；支持 reduceOnly、延迟注入和按权重/下单数触发的 429 限流错误
+    数量不是 step_size 整数倍的订单按交易所规则以 -1111 拒绝
+    """
+
+    def __init__(self, frames: Dict[str, pd.DataFrame], initial_balance: float = 1000.0,
+                 leverage: float = 20.0, taker_fee: float = 0.0005, maker_fee: float = 0.0002,
+                 slippage_bps: float = 0.0, latency: Union[float, Callable[[], float]] = 0.0,
+                 jitter: float = 0.0, weight_limit: Optional[int] = 2400, order_limit: Optional[int] = 300,
+                 seed: int = 0, asset: str = 'USDT', step_size: str = '0.001'):
+        self.asset = asset
+        self.step_size = step_size
+        self.wallet = initial_balance
+        self.leverage = leverage
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.slippage_bps = slippage_bps
+        self.latency = latency
+        self.jitter = jitter
+        self.weight_limit = weight_limit      # 每分钟请求权重，None 为不限
+        self.order_limit = order_limit        # 每10秒下单数，None 为不限
+        self._rng = np.random.default_rng(seed)
+
+        self.bars = {}
+        for symbol, df in frames.items():
+            self.bars[symbol.upper()] = {
+                'open_time': to_epoch_ms(df['open_time']),
+                'high': df['high'].to_numpy(dtype=float),
+                'low': df['low'].to_numpy(dtype=float),
+                'close': df['close'].to_numpy(dtype=float),
+            }
+        self.timeline = np.unique(np.concatenate([b['open_time'] for b in self.bars.values()]))
+        self.cursor = {symbol: -1 for symbol in self.bars}   # 每个币种当前K线
+        self.now_ms = None
+
+        self.positions = {symbol: [0.0, 0.0] for symbol in self.bars}   # [positionAmt, entryPrice]
+        self.open_orders: Dict[int, Dict] = {}
+        self.fills: List[Dict] = []
+        self._order_ids = itertools.count(1)
+        self._weights = deque()   # (monotonic 时间, 权重)
+        self._orders = deque()
+        self.requests = 0
+        self.rejected = 0
+
+    # ---------- 回放 ----------
+
+    def advance_to(self, t) -> None:
+        """把回放时间推进到 t(毫秒或时间)，期间经过的K线用来撮合挂单"""
+        t = int(t) if isinstance(t, (int, np.integer)) else int(to_epoch_ms([t])[0])
+        for symbol, b in self.bars.items():
+            idx = int(np.searchsorted(b['open_time'], t, side='right')) - 1
+            prev = self.cursor[symbol]
+            self.cursor[symbol] = idx
+            if idx > prev and self.open_orders:
+                self._match_resting(symbol, prev + 1, idx)
+        self.now_ms = t
+
+    def step(self) -> Optional[int]:
+        """推进到时间线上的下一根K线，回放结束返回 None"""
+        i = 0 if self.now_ms is None else int(np.searchsorted(self.timeline, self.now_ms, side='right'))
+        if i >= len(self.timeline):
+            return None
+        self.advance_to(int(self.timeline[i]))
+        return int(self.timeline[i])
+
+    def mark_price(self, symbol: str) -> float:
+        idx = self.cursor[symbol]
+        if idx < 0:
+            # 回放还没到该币种的第一根K线
+            raise ClientError(400, -4140, "Invalid symbol status for opening position.", {})
+        return float(self.bars[symbol]['close'][idx])
+
+    # ---------- 限流和延迟 ----------
+
+    def _delay(self) -> float:
+        base = self.latency() if callable(self.latency) else self.latency
+        if self.jitter:
+            base += float(self._rng.uniform(0, self.jitter))
+        return base
+
+    @staticmethod
+    def _window_used(events: deque, now: float, window: float) -> int:
+        while events and now - events[0][0] >= window:
+            events.popleft()
+        return sum(w for _, w in events)
+
+    def _admit(self, endpoint: str) -> Dict[str, str]:
+        """按权重计数，超限时抛出与交易所一致的 429 / -1003，返回限流相关的响应头"""
+        self.requests += 1
+        now = time.monotonic()
+        weight = ENDPOINT_WEIGHTS.get(endpoint, 1)
+        used = self._window_used(self._weights, now, 60.0)
+        is_order = endpoint == 'new_order'
+        orders = self._window_used(self._orders, now, 10.0) if is_order else 0
+        over_weight = self.weight_limit is not None and used + weight > self.weight_limit
+        over_orders = is_order and self.order_limit is not None and orders + 1 > self.order_limit
+        if over_weight or over_orders:
+            self.rejected += 1
+            retry = self._weights[0][0] + 60.0 - now if over_weight else self._orders[0][0] + 10.0 - now
+            headers = {'Retry-After': str(max(1, int(np.ceil(retry))))}
+            raise ClientError(429, -1003, "Too many requests; current limit is exceeded.", headers)
+        self._weights.append((now, weight))
+        headers = {'X-MBX-USED-WEIGHT-1M': str(used + weight)}
+        if is_order:
+            self._orders.append((now, 1))
+            headers['X-MBX-ORDER-COUNT-10S'] = str(orders + 1)
+        return headers
+
+    def _call(self, endpoint: str, handler: Callable, *args, **kwargs):
+        """同步调用：注入延迟后执行"""
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        self._admit(endpoint)
+        return handler(*args, **kwargs)
+
+    # ---------- 账户 ----------
+
+    def _unrealized(self, symbol: str) -> float:
+        amount, entry = self.positions[symbol]
+        if amount == 0 or self.cursor[symbol] < 0:
+            return 0.0
+        return (self.mark_price(symbol) - entry) * amount
+
+    def _initial_margin(self, skip: Optional[str] = None) -> float:
+        return sum(abs(amount) * entry / self.leverage
+                   for symbol, (amount, entry) in self.positions.items() if symbol != skip)
+
+    def available_balance(self) -> float:
+        upnl = sum(self._unrealized(s) for s in self.positions)
+        return self.wallet + upnl - self._initial_margin()
+
+    def _fill(self, order: Dict, price: float, fee_rate: float):
+        symbol = order['symbol']
+        amount, entry = self.positions[symbol]
+        quantity = order['origQty']
+        signed = quantity if order['side'] == 'BUY' else -quantity
+        closing = min(quantity, abs(amount)) if amount * signed < 0 else 0.0
+        realized = (price - entry) * closing * np.sign(amount) if closing else 0.0
+
+        new_amount = amount + signed
+        if abs(new_amount) < 1e-12:
+            new_amount, entry = 0.0, 0.0
+        elif amount == 0 or (amount > 0) != (new_amount > 0):
+            entry = price
+        elif (amount > 0) == (signed > 0):
+            entry = (entry * abs(amount) + price * quantity) / abs(new_amount)
+
+        if abs(new_amount) > abs(amount) or (amount * new_amount < 0):
+            # 开仓或反手部分需要足够的保证金
+            required = abs(new_amount) * entry / self.leverage
+            free = self.wallet + realized + sum(self._unrealized(s) for s in self.positions if s != symbol) \
+                - self._initial_margin(skip=symbol)
+            if required > free:
+                raise ClientError(400, -2019, "Margin is insufficient.", {})
+
+        fee = price * quantity * fee_rate
+        self.wallet += realized - fee
+        self.positions[symbol] = [new_amount, entry]
+        order.update(status='FILLED', executedQty=quantity, avgPrice=price,
+                     cumQuote=price * quantity, updateTime=self.now_ms)
+        self.fills.append({'orderId': order['orderId'], 'symbol': symbol, 'side': order['side'],
+                           'qty': quantity, 'price': price, 'fee': fee, 'realizedPnl': realized,
+                           'time': self.now_ms})
+
+    def _reduce_only_quantity(self, symbol: str, side: str, quantity: float) -> float:
+        """reduceOnly 只能减仓，数量超过持仓时按持仓数量成交"""
+        amount = self.positions[symbol][0]
+        if amount == 0 or (amount > 0) == (side == 'BUY'):
+            raise ClientError(400, -2022, "ReduceOnly Order is rejected.", {})
+        return min(quantity, abs(amount))
+
+    def _match_resting(self, symbol: str, lo: int, hi: int):
+        """用 [lo, hi] 区间的K线撮合该币种的限价挂单"""
+        b = self.bars[symbol]
+        for order_id, order in list(self.open_orders.items()):
+            if order['symbol'] != symbol:
+                continue
+            price = order['price']
+            if order['side'] == 'BUY':
+                touched = np.flatnonzero(b['low'][lo:hi + 1] <= price)
+            else:
+                touched = np.flatnonzero(b['high'][lo:hi + 1] >= price)
+            if not len(touched):
+                continue
+            del self.open_orders[order_id]
+            try:
+                if order['reduceOnly']:
+                    order['origQty'] = self._reduce_only_quantity(symbol, order['side'], order['origQty'])
+                self._fill(order, price, self.maker_fee)
+            except ClientError:
+                order['status'] = 'EXPIRED'
+
+    def _response(self, order: Dict, resp_type: str) -> Dict:
+        result = {
+            'orderId': order['orderId'], 'symbol': order['symbol'], 'status': order['status'],
+            'clientOrderId': order['clientOrderId'], 'price': _fmt(order['price']),
+            'avgPrice': _fmt(order['avgPrice']), 'origQty': _fmt(order['origQty']),
+            'executedQty': _fmt(order['executedQty']), 'cumQuote': _fmt(order['cumQuote']),
+            'timeInForce': order['timeInForce'], 'type': order['type'],
+            'reduceOnly': order['reduceOnly'], 'side': order['side'], 'positionSide': 'BOTH',
+            'updateTime': order['updateTime'],
+        }
+        if resp_type == 'ACK':
+            result.update(status='NEW', executedQty='0', avgPrice='0.00', cumQuote='0')
+        return result
+
+    def _new_order(self, symbol: str, side: str, type: str, quantity=None, price=None,
+                   reduceOnly=None, timeInForce=None, newClientOrderId=None,
+                   newOrderRespType: str = 'ACK', **kwargs) -> Dict:
+        symbol, side, type = symbol.upper(), side.upper(), type.upper()
+        if symbol not in self.bars:
+            raise ClientError(400, -1121, "Invalid symbol.", {})
+        if side not in ('BUY', 'SELL'):
+            raise ClientError(400, -1117, "Invalid side.", {})
+        if type not in ('MARKET', 'LIMIT'):
+            raise ClientError(400, -1116, "Invalid orderType.", {})
+        if quantity is None or float(quantity) <= 0:
+            raise ClientError(400, -4003, "Quantity less than or equal to zero.", {})
+        if Decimal(str(quantity)) % Decimal(self.step_size) != 0:
+            raise ClientError(400, -1111, "Precision is over the maximum defined for this asset.", {})
+        reduce_only = str(reduceOnly).lower() == 'true'
+        quantity = float(quantity)
+        if reduce_only:
+            quantity = self._reduce_only_quantity(symbol, side, quantity)
+
+        order_id = next(self._order_ids)
+        order = {
+            'orderId': order_id, 'symbol': symbol, 'side': side, 'type': type,
+            'clientOrderId': newClientOrderId or f"mock{order_id}", 'status': 'NEW',
+            'price': 0.0, 'avgPrice': 0.0, 'origQty': quantity, 'executedQty': 0.0,
+            'cumQuote': 0.0, 'timeInForce': 'GTC', 'reduceOnly': reduce_only,
+            'updateTime': self.now_ms,
+        }
+        last = self.mark_price(symbol)
+        if type == 'MARKET':
+            slip = last * self.slippage_bps / 10000
+            self._fill(order, last + slip if side == 'BUY' else last - slip, self.taker_fee)
+        else:
+            if price is None:
+                raise ClientError(400, -1102, "Mandatory parameter 'price' was not sent.", {})
+            order['price'] = float(price)
+            order['timeInForce'] = timeInForce or 'GTC'
+            marketable = order['price'] >= last if side == 'BUY' else order['price'] <= last
+            if marketable:
+                self._fill(order, last, self.taker_fee)
+            else:
+                self.open_orders[order_id] = order
+        return self._response(order, newOrderRespType.upper())
+
+    def _cancel_order(self, symbol: str, orderId=None, origClientOrderId=None, **kwargs) -> Dict:
+        for order_id, order in self.open_orders.items():
+            if order['symbol'] == symbol.upper() and (
+                    (orderId is not None and order_id == int(orderId)) or
+                    (origClientOrderId is not None and order['clientOrderId'] == origClientOrderId)):
+                del self.open_orders[order_id]
+                order['status'] = 'CANCELED'
+                return self._response(order, 'RESULT')
+        raise ClientError(400, -2011, "Unknown order sent.", {})
+
+    def _get_position_risk(self, symbol: Optional[str] = None, **kwargs) -> List[Dict]:
+        symbols = [symbol.upper()] if symbol else list(self.positions)
+        rows = []
+        for s in symbols:
+            if s not in self.positions:
+                raise ClientError(400, -1121, "Invalid symbol.", {})
+            amount, entry = self.positions[s]
+            mark = self.mark_price(s) if self.cursor[s] >= 0 else 0.0
+            rows.append({
+                'symbol': s, 'positionAmt': _fmt(amount), 'entryPrice': _fmt(entry),
+                'markPrice': _fmt(mark), 'unRealizedProfit': _fmt(self._unrealized(s)),
+                'liquidationPrice': '0', 'leverage': str(int(self.leverage)),
+                'marginType': 'cross', 'positionSide': 'BOTH',
+                'notional': _fmt(amount * mark), 'updateTime': self.now_ms or 0,
+            })
+        return rows
+
+    def _balance(self, **kwargs) -> List[Dict]:
+        upnl = sum(self._unrealized(s) for s in self.positions)
+        available = self.available_balance()
+        return [{
+            'accountAlias': 'mock', 'asset': self.asset, 'balance': _fmt(self.wallet),
+            'crossWalletBalance': _fmt(self.wallet), 'crossUnPnl': _fmt(upnl),
+            'availableBalance': _fmt(available), 'maxWithdrawAmount': _fmt(max(available, 0.0)),
+            'marginAvailable': True, 'updateTime': self.now_ms or 0,
+        }]
+
+    def _exchange_info(self, **kwargs) -> Dict:
+        return {'symbols': [{
+            'symbol': s, 'status': 'TRADING',
+            'filters': [{'filterType': 'LOT_SIZE', 'stepSize': self.step_size,
+                         'minQty': self.step_size, 'maxQty': '10000000'}],
+        } for s in self.bars]}
+
+    # ---------- UMFutures 接口 ----------
+
+    def new_order(self, symbol: str, side: str, type: str, **kwargs) -> Dict:
+        return self._call('new_order', self._new_order, symbol, side, type, **kwargs)
+
+    def cancel_order(self, symbol: str, **kwargs) -> Dict:
+        return self._call('cancel_order', self._cancel_order, symbol, **kwargs)
+
+    def get_position_risk(self, **kwargs) -> List[Dict]:
+        return self._call('get_position_risk', self._get_position_risk, **kwargs)
+
+    def balance(self, **kwargs) -> List[Dict]:
+        return self._call('balance', self._balance, **kwargs)
+
+    def exchange_info(self, **kwargs) -> Dict:
+        return self._call('exchange_info', self._exchange_info, **kwargs)
+
+
+class MockExchangeServer:
+    """
+    把 MockExchange 挂到本地 HTTP 端口上，路径和错误格式与 fapi 一致，供 OrderGateway 压测
+    给出 secret 时校验 HMAC 签名
+    """
+
+    ROUTES = [
+        ('POST', '/fapi/v1/order', 'new_order'),
+        ('DELETE', '/fapi/v1/order', 'cancel_order'),
+        ('GET', '/fapi/v2/positionRisk', 'get_position_risk'),
+        ('GET', '/fapi/v3/positionRisk', 'get_position_risk'),
+        ('GET', '/fapi/v2/balance', 'balance'),
+        ('GET', '/fapi/v3/balance', 'balance'),
+        ('GET', '/fapi/v1/exchangeInfo', 'exchange_info'),
+    ]
+
+    def __init__(self, exchange: MockExchange, host: str = '127.0.0.1', port: int = 0,
+                 secret: Optional[str] = None):
+        self.exchange = exchange
+        self.host = host
+        self.port = port
+        self.secret = secret.encode() if secret else None
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _handler(self, endpoint: str):
+        from aiohttp import web
+
+        handler = getattr(self.exchange, '_' + endpoint)
+
+        async def handle(request):
+            delay = self.exchange._delay()
+            if delay:
+                await asyncio.sleep(delay)
+            query = request.query_string
+            if self.secret is not None and endpoint not in UNSIGNED_ENDPOINTS:
+                payload, _, signature = query.rpartition('&signature=')
+                expected = hmac.new(self.secret, payload.encode(), hashlib.sha256).hexdigest()
+                if signature != expected:
+                    return web.json_response({'code': -1022, 'msg': "Signature for this request is not valid."},
+                                             status=400)
+            params = {k: v for k, v in request.query.items()
+                      if k not in ('signature', 'timestamp', 'recvWindow')}
+            try:
+                headers = self.exchange._admit(endpoint)
+                return web.json_response(handler(**params), headers=headers)
+            except ClientError as e:
+                return web.json_response({'code': e.error_code, 'msg': e.error_message},
+                                         status=e.status_code, headers=dict(e.header or {}))
+
+        return handle
+
+    async def start(self) -> 'MockExchangeServer':
+        from aiohttp import web
+
+        app = web.Application()
+        for method, path, endpoint in self.ROUTES:
+            app.router.add_route(method, path, self._handler(endpoint))
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def _replay_pairs(df_alt: pd.DataFrame, df_bench: pd.DataFrame):
+    """按 open_time 对齐的 (时间, alt K线, benchmark K线)"""
+    merged = pd.merge(df_alt[['open_time', 'high', 'low', 'close']],
+                      df_bench[['open_time', 'close']], on='open_time', suffixes=('', '_bench'))
+    times = to_epoch_ms(merged['open_time'])
+    for t, high, low, close, bench in zip(times, merged['high'].to_numpy(), merged['low'].to_numpy(),
+                                          merged['close'].to_numpy(), merged['close_bench'].to_numpy()):
+        yield int(t), {'high': high, 'low': low, 'close': close}, {'close': bench}
+
+
+def run_sync_benchmark(df_alt: pd.DataFrame, df_bench: pd.DataFrame, quantity: float = 3.0,
+                       symbol: str = 'WLDUSDT', benchmark: str = 'BTCUSDT', **exchange_kwargs) -> Dict:
+    """StreamingSignal -> Account -> MockExchange 的同步路径"""
+    from .account import Account
+    from .signal_engine import StreamingSignal
+
+    exchange = MockExchange({symbol: df_alt, benchmark: df_bench}, **exchange_kwargs)
+    config = SimpleNamespace(WLD_AMOUNT=quantity)
+    account = Account(config, client=exchange)
+    signal, rule = StreamingSignal(), ShortRule()
+    latencies, bars, signals = [], 0, 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t, alt, bench in _replay_pairs(df_alt, df_bench):
+            exchange.advance_to(t)
+            bars += 1
+            signal_ns = time.perf_counter_ns()
+            short = signal.update(alt, bench)
+            if rule.exit_due(alt):
+                account.close_position(symbol)
+                latencies.append(time.perf_counter_ns() - signal_ns)
+                rule.exited()
+            elif short and rule.can_enter():
+                signals += 1
+                account.open_order(config)
+                latencies.append(time.perf_counter_ns() - signal_ns)
+                rule.entered(alt)
+            rule.prev_high = alt['high']
+    elapsed = time.perf_counter() - start
+    return {'mode': 'sync', 'bars': bars, 'signals': signals, 'orders': len(exchange.fills),
+            'requests': exchange.requests, 'elapsed_s': elapsed, 'bars_per_s': bars / elapsed,
+            'wallet': exchange.wallet, 'latency': latency_summary(latencies)}
+
+
+async def run_async_benchmark(df_alt: pd.DataFrame, df_bench: pd.DataFrame, quantity: float = 3.0,
+                              symbol: str = 'WLDUSDT', benchmark: str = 'BTCUSDT',
+                              **exchange_kwargs) -> Dict:
+    """StreamingSignal -> OrderGateway -> 本地 HTTP 模拟交易所的异步路径"""
+    from .gateway import OrderGateway
+    from .signal_engine import StreamingSignal
+
+    secret = 'mock-secret'
+    exchange = MockExchange({symbol: df_alt, benchmark: df_bench}, **exchange_kwargs)
+    server = await MockExchangeServer(exchange, secret=secret).start()
+    signal, rule = StreamingSignal(), ShortRule()
+    bars, signals = 0, 0
+    try:
+        exchange.advance_to(int(exchange.timeline[0]))
+        async with OrderGateway('mock-key', secret, base_url=server.base_url,
+                                weight_limit=exchange.weight_limit,
+                                order_limit=exchange.order_limit) as gateway:
+            start = time.perf_counter()
+            for t, alt, bench in _replay_pairs(df_alt, df_bench):
+                exchange.advance_to(t)
+                bars += 1
+                signal_ns = time.perf_counter_ns()
+                short = signal.update(alt, bench)
+                if rule.exit_due(alt):
+                    await gateway.close_position(symbol, signal_ns=signal_ns)
+                    rule.exited()
+                elif short and rule.can_enter():
+                    signals += 1
+                    await gateway.open_order(symbol, 'SELL', quantity, signal_ns=signal_ns)
+                    rule.entered(alt)
+                rule.prev_high = alt['high']
+            elapsed = time.perf_counter() - start
+            latency = gateway.latency_summary()
+    finally:
+        await server.stop()
+    return {'mode': 'async', 'bars': bars, 'signals': signals, 'orders': len(exchange.fills),
+            'requests': exchange.requests, 'elapsed_s': elapsed, 'bars_per_s': bars / elapsed,
+            'wallet': exchange.wallet, 'latency': latency}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline signal-to-order benchmark against a mock exchange")
+    parser.add_argument('--alt', required=True)
+    parser.add_argument('--bench', required=True)
+    parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+    parser.add_argument('--quantity', type=float, default=3.0)
+    parser.add_argument('--latency', type=float, default=0.0, help="injected latency per request (s)")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--slippage-bps', type=float, default=0.0)
+    # 回放比真实时间快得多，默认不按墙钟时间限流
+    parser.add_argument('--weight-limit', type=int, default=None)
+    parser.add_argument('--order-limit', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    df_alt, df_bench = pd.read_csv(args.alt), pd.read_csv(args.bench)
+    kwargs = dict(quantity=args.quantity, latency=args.latency, jitter=args.jitter,
+                  slippage_bps=args.slippage_bps, weight_limit=args.weight_limit,
+                  order_limit=args.order_limit)
+    results = []
+    if args.mode in ('sync', 'both'):
+        results.append(run_sync_benchmark(df_alt, df_bench, **kwargs))
+    if args.mode in ('async', 'both'):
+        results.append(asyncio.run(run_async_benchmark(df_alt, df_bench, **kwargs)))
+    for r in results:
+        print(f"[{r['mode']}] {r['bars']} bars, {r['signals']} entries, {r['orders']} fills, "
+              f"{r['requests']} requests in {r['elapsed_s']:.2f}s ({r['bars_per_s']:.0f} bars/s), "
+              f"wallet={r['wallet']:.4f}")
+        print(f"[{r['mode']}] signal -> ack latency:", r['latency'])
+    return results
+
+
+if __name__ == '__main__':
+    main()
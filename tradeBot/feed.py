@@ -0,0 +1,438 @@
+import argparse
+import asyncio
+import inspect
+import json
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+from binance.error import ClientError, ServerError
+from websockets.exceptions import WebSocketException
+
+from .resample import bar_length
+from .store import to_epoch_ms
+from .telemetry import TELEMETRY
+
+BINANCE_FUTURES_STREAM = "wss://fstream.binance.com/stream"
+BACKFILL_LIMIT = 1500   # REST klines 单次最多返回的K线数
+
+
+@dataclass
+class Candle:
+    symbol: str
+    interval: str
+    open_time: int      # 毫秒
+    close_time: int     # 毫秒
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    closed: bool = True
+    sent_ns: int = 0    # 本地替身服务器的发送时间，用于测延迟
+    received_ns: int = 0  # 收到时的 perf_counter_ns，开启埋点时才记录，用于测排队时间
+
+    def __getitem__(self, key):
+        # 让 StreamingSignal.update 可以直接用 candle['close']
+        return getattr(self, key)
+
+
+def parse_kline(raw) -> Optional[Candle]:
+    """解析 Binance 组合流的 kline 消息，其他消息返回 None"""
+    message = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+    data = message.get('data', message)
+    if data.get('e') != 'kline':
+        return None
+    k = data['k']
+    return Candle(
+        symbol=k['s'],
+        interval=k['i'],
+        open_time=int(k['t']),
+        close_time=int(k['T']),
+        open=float(k['o']),
+        high=float(k['h']),
+        low=float(k['l']),
+        close=float(k['c']),
+        volume=float(k['v']),
+        closed=bool(k['x']),
+        sent_ns=int(message.get('_sent_ns', 0)),
+    )
+
+
+def candle_from_rest(symbol: str, interval: str, row) -> Candle:
+    """REST klines 接口返回的一行转为 Candle"""
+    return Candle(symbol=symbol, interval=interval, open_time=int(row[0]), close_time=int(row[6]),
+                  open=float(row[1]), high=float(row[2]), low=float(row[3]),
+                  close=float(row[4]), volume=float(row[5]))
+
+
+class KlineFeed:
+    """
+    订阅 USDT-M kline 组合流，把已收盘的K线按顺序交给回调
+    断线后指数退避重连，并用 REST 补齐断线期间的K线
+    队列有上限，回调处理不过来时停止读 socket，由 TCP 反压
+    """
+
+    def __init__(self, symbols: List[str], interval: str, on_candle: Callable,
+                 url: str = BINANCE_FUTURES_STREAM, rest_client=None, queue_size: int = 1024,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.symbols = [s.upper() for s in symbols]
+        self.interval = interval
+        self.on_candle = on_candle
+        self.url = url
+        self.rest_client = rest_client
+        self.queue_size = queue_size
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.last_open_time: Dict[str, int] = {}   # 每个币种最后入队的K线
+        self.latencies_ns: List[int] = []          # 发送/接收到回调开始的耗时
+        self.delivered = 0
+        self.errors = 0                             # 回调抛出异常的K线数
+        self.reconnects = 0
+        self.missing = 0                            # 补数据后仍然缺失的K线数
+        self.queue: Optional[asyncio.Queue] = None
+        self._stopping = False
+        self._ws = None
+
+    @classmethod
+    def from_config(cls, config, on_candle: Callable, **kwargs) -> 'KlineFeed':
+        """订阅 Config.TRADING_PAIR 和基准币种"""
+        symbols = list(config.TRADING_PAIR) + [config.BENCHMARK_PAIR]
+        return cls(symbols, config.KLINE_INTERVAL, on_candle, **kwargs)
+
+    def stream_url(self) -> str:
+        streams = "/".join(f"{s.lower()}@kline_{self.interval}" for s in self.symbols)
+        return f"{self.url}?streams={streams}"
+
+    async def _enqueue(self, candle: Candle):
+        # 重连和补数据可能带来重复K线，按 open_time 去重
+        if candle.open_time <= self.last_open_time.get(candle.symbol, -1):
+            return
+        self.last_open_time[candle.symbol] = candle.open_time
+        await self.queue.put(candle)
+
+    async def _backfill(self):
+        """
+        重连后通过 REST 补齐每个币种最后一根K线之后、已经收盘的K线
+        断线超过一页(BACKFILL_LIMIT 根)时从上一页最后一根K线之后继续翻页，直到不足一页或追上当前时间
+        补完后仍不连续的K线记入 missing 并打印
+        """
+        if self.rest_client is None or not self.last_open_time:
+            return
+        loop = asyncio.get_running_loop()
+        now_ms = int(time.time() * 1000)
+        try:
+            bar_ms = int(bar_length(self.interval) // np.timedelta64(1, 'ms'))
+        except ValueError:
+            bar_ms = None   # 月线等不固定长度的周期不检查缺口
+        for symbol in self.symbols:
+            last = self.last_open_time.get(symbol)
+            if last is None:
+                continue
+            start, previous, missing = last + 1, last, 0
+            while True:
+                rows = await loop.run_in_executor(None, partial(
+                    self.rest_client.klines, symbol, self.interval, startTime=start, limit=BACKFILL_LIMIT))
+                for row in rows:
+                    candle = candle_from_rest(symbol, self.interval, row)
+                    if candle.close_time >= now_ms:
+                        continue
+                    if bar_ms and candle.open_time - previous > bar_ms:
+                        missing += (candle.open_time - previous) // bar_ms - 1
+                    previous = candle.open_time
+                    TELEMETRY.inc('candles_backfilled')
+                    await self._enqueue(candle)
+                if len(rows) < BACKFILL_LIMIT or int(rows[-1][6]) >= now_ms:
+                    break
+                start = int(rows[-1][0]) + 1
+            if missing:
+                self.missing += missing
+                TELEMETRY.inc('candles_missing', missing)
+                print(f"Backfill left {missing} missing {self.interval} candles for {symbol} "
+                      f"after {last}")
+
+    async def _consume(self):
+        while True:
+            candle = await self.queue.get()
+            try:
+                start_ns = time.time_ns()
+                if candle.sent_ns:
+                    self.latencies_ns.append(start_ns - candle.sent_ns)
+                TELEMETRY.stop('feed.queue', candle.received_ns)
+                with TELEMETRY.span('feed.callback'):
+                    result = self.on_candle(candle)
+                    if inspect.isawaitable(result):
+                        await result
+                self.delivered += 1
+            except Exception as e:
+                # 单根K线出错只记录，消费者退出后队列写满，_enqueue 会永远阻塞
+                self.errors += 1
+                print(f"on_candle failed for {candle.symbol} {candle.open_time}: {e!r}")
+            finally:
+                self.queue.task_done()
+
+    async def _connect_loop(self):
+        delay = self.reconnect_delay
+        while not self._stopping:
+            try:
+                async with connect(self.stream_url()) as ws:
+                    self._ws = ws
+                    delay = self.reconnect_delay
+                    await self._backfill()
+                    async for raw in ws:
+                        candle = parse_kline(raw)
+                        if candle is not None and candle.closed:
+                            if TELEMETRY.enabled:
+                                # 交易所时钟的收盘时间到本地收到，包含时钟偏差
+                                TELEMETRY.observe('feed.close_to_receive', time.time() - candle.close_time / 1000)
+                                TELEMETRY.inc('candles')
+                                candle.received_ns = TELEMETRY.start()
+                            await self._enqueue(candle)
+            except (OSError, WebSocketException, asyncio.TimeoutError, ClientError, ServerError) as e:
+                # 握手失败(InvalidStatus 等)和补数据的 REST 错误同样退避后重连
+                print(f"Kline stream disconnected: {e!r}")
+            finally:
+                self._ws = None
+            if self._stopping:
+                break
+            self.reconnects += 1
+            TELEMETRY.inc('reconnects')
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def run(self):
+        """运行直到 stop() 被调用"""
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        consumer = asyncio.create_task(self._consume())
+        try:
+            await self._connect_loop()
+            await self.queue.join()
+        finally:
+            consumer.cancel()
+
+    async def stop(self):
+        self._stopping = True
+        if self._ws is not None:
+            await self._ws.close()
+
+
+class CandleJoiner:
+    """把同一 open_time 的 alt 和 benchmark K线配对后交给 on_pair(alt, bench)"""
+
+    def __init__(self, alt: str, benchmark: str, on_pair: Callable):
+        self.alt = alt.upper()
+        self.benchmark = benchmark.upper()
+        self.on_pair = on_pair
+        self._pending = {self.alt: {}, self.benchmark: {}}
+
+    def __call__(self, candle: Candle):
+        if candle.symbol not in self._pending:
+            return None
+        self._pending[candle.symbol][candle.open_time] = candle
+        other = self.benchmark if candle.symbol == self.alt else self.alt
+        match = self._pending[other].pop(candle.open_time, None)
+        if match is None:
+            return None
+        del self._pending[candle.symbol][candle.open_time]
+        # 丢弃已经不可能配对的旧K线
+        for pending in self._pending.values():
+            for t in [t for t in pending if t < candle.open_time]:
+                del pending[t]
+        alt, bench = (candle, match) if candle.symbol == self.alt else (match, candle)
+        return self.on_pair(alt, bench)
+
+
+class ReplayServer:
+    """
+    本地 WebSocket 替身，按时间顺序把 CSV 里的K线作为已收盘的 kline 消息推送
+    所有连接共用一个回放游标，drop_after 用来模拟断线，断线期间的K线需要靠 REST 补齐
+    """
+
+    def __init__(self, frames: Dict[str, pd.DataFrame], interval: str = '1h',
+                 host: str = '127.0.0.1', port: int = 0, bar_delay: float = 0.0,
+                 drop_after: Optional[int] = None, skip_on_drop: int = 0):
+        self.interval = interval
+        self.host = host
+        self.port = port
+        self.bar_delay = bar_delay
+        self.drop_after = drop_after
+        self.skip_on_drop = skip_on_drop
+        self.bars = {}
+        for symbol, df in frames.items():
+            self.bars[symbol.upper()] = {
+                'open_time': to_epoch_ms(df['open_time']),
+                'close_time': to_epoch_ms(df['close_time']) if 'close_time' in df
+                else to_epoch_ms(df['open_time']) + 1,
+                'open': df['open'].to_numpy(dtype=float),
+                'high': df['high'].to_numpy(dtype=float),
+                'low': df['low'].to_numpy(dtype=float),
+                'close': df['close'].to_numpy(dtype=float),
+                'volume': df['volume'].to_numpy(dtype=float),
+            }
+        self.timeline = np.unique(np.concatenate([b['open_time'] for b in self.bars.values()]))
+        self.cursor = 0          # 下一根要推送的时间点
+        self.sent = 0
+        self.finished = asyncio.Event()
+        self._server = None
+
+    @classmethod
+    def from_csv(cls, paths: Dict[str, str], **kwargs) -> 'ReplayServer':
+        return cls({symbol: pd.read_csv(path) for symbol, path in paths.items()}, **kwargs)
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/stream"
+
+    def _message(self, symbol: str, i: int) -> str:
+        b = self.bars[symbol]
+        now_ns = time.time_ns()
+        return json.dumps({
+            'stream': f"{symbol.lower()}@kline_{self.interval}",
+            'data': {
+                'e': 'kline', 'E': now_ns // 1_000_000, 's': symbol,
+                'k': {
+                    't': int(b['open_time'][i]), 'T': int(b['close_time'][i]),
+                    's': symbol, 'i': self.interval,
+                    'o': repr(b['open'][i]), 'c': repr(b['close'][i]),
+                    'h': repr(b['high'][i]), 'l': repr(b['low'][i]),
+                    'v': repr(b['volume'][i]), 'x': True,
+                },
+            },
+            '_sent_ns': now_ns,
+        })
+
+    def _index_at(self, symbol: str, t: int) -> int:
+        times = self.bars[symbol]['open_time']
+        i = int(np.searchsorted(times, t))
+        return i if i < len(times) and times[i] == t else -1
+
+    async def _handler(self, ws):
+        query = parse_qs(urlparse(ws.request.path).query)
+        streams = query.get('streams', [''])[0].split('/')
+        symbols = [s.split('@')[0].upper() for s in streams if s]
+        symbols = [s for s in symbols if s in self.bars]
+        sent_here = 0
+        while self.cursor < len(self.timeline):
+            t = self.timeline[self.cursor]
+            for symbol in symbols:
+                i = self._index_at(symbol, t)
+                if i >= 0:
+                    await ws.send(self._message(symbol, i))
+                    self.sent += 1
+            self.cursor += 1
+            sent_here += 1
+            if self.drop_after and sent_here >= self.drop_after:
+                # 模拟断线：断开期间时间继续流逝
+                self.cursor = min(self.cursor + self.skip_on_drop, len(self.timeline))
+                await ws.close()
+                return
+            if self.bar_delay:
+                await asyncio.sleep(self.bar_delay)
+            else:
+                await asyncio.sleep(0)
+        self.finished.set()
+        await ws.wait_closed()
+
+    async def start(self):
+        self._server = await serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+class ReplayRestClient:
+    """配合 ReplayServer 的 REST 替身，只返回回放游标之前已经"发生"的K线"""
+
+    def __init__(self, server: ReplayServer):
+        self.server = server
+
+    def klines(self, symbol: str, interval: str, startTime: int = None, endTime: int = None,
+               limit: int = 500):
+        b = self.server.bars[symbol.upper()]
+        times = b['open_time']
+        now = self.server.timeline[self.server.cursor - 1] if self.server.cursor else -1
+        lo = 0 if startTime is None else int(np.searchsorted(times, startTime))
+        hi = int(np.searchsorted(times, now, side='right'))
+        if endTime is not None:
+            hi = min(hi, int(np.searchsorted(times, endTime, side='right')))
+        hi = min(hi, lo + limit)
+        return [[int(times[i]), repr(b['open'][i]), repr(b['high'][i]), repr(b['low'][i]),
+                 repr(b['close'][i]), repr(b['volume'][i]), int(b['close_time'][i])]
+                for i in range(lo, hi)]
+
+
+def latency_summary(latencies_ns: List[int]) -> Dict[str, float]:
+    """延迟分位数(微秒)"""
+    if not latencies_ns:
+        return {}
+    us = np.asarray(latencies_ns, dtype=float) / 1000
+    return {
+        'count': len(us),
+        'p50_us': float(np.percentile(us, 50)),
+        'p90_us': float(np.percentile(us, 90)),
+        'p99_us': float(np.percentile(us, 99)),
+        'max_us': float(us.max()),
+    }
+
+
+async def _replay_benchmark(alt_path: str, bench_path: str, bars: int, drop_after: Optional[int],
+                            skip_on_drop: int, bar_delay: float):
+    from .signal_engine import StreamingSignal
+
+    frames = {}
+    for path in (alt_path, bench_path):
+        df = pd.read_csv(path)
+        frames[path] = df.iloc[-bars:] if bars else df
+    alt, bench = 'ALTUSDT', 'BENCHUSDT'
+    server = await ReplayServer({alt: frames[alt_path], bench: frames[bench_path]},
+                                drop_after=drop_after, skip_on_drop=skip_on_drop,
+                                bar_delay=bar_delay).start()
+    signal = StreamingSignal()
+    signals = []
+    joiner = CandleJoiner(alt, bench, lambda a, b: signals.append(signal.update(a, b)))
+    feed = KlineFeed([alt, bench], '1h', joiner, url=server.url,
+                     rest_client=ReplayRestClient(server), reconnect_delay=0.05)
+    task = asyncio.create_task(feed.run())
+    started = time.perf_counter()
+    await server.finished.wait()
+    # 等待最后一根K线(可能来自补数据)被处理完
+    last = {symbol: int(b['open_time'][-1]) for symbol, b in server.bars.items()}
+    while any(feed.last_open_time.get(symbol) != t for symbol, t in last.items()):
+        await asyncio.sleep(0.01)
+    await feed.queue.join()
+    elapsed = time.perf_counter() - started
+    await feed.stop()
+    await task
+    await server.stop()
+    return feed, signals, elapsed
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay CSV klines through a local WebSocket stand-in")
+    parser.add_argument('--alt', required=True)
+    parser.add_argument('--bench', required=True)
+    parser.add_argument('--bars', type=int, default=0, help="replay only the last N bars")
+    parser.add_argument('--drop-after', type=int, default=None, help="drop the connection every N bars")
+    parser.add_argument('--skip-on-drop', type=int, default=0, help="bars that pass while disconnected")
+    parser.add_argument('--bar-delay', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    feed, signals, elapsed = asyncio.run(_replay_benchmark(
+        args.alt, args.bench, args.bars, args.drop_after, args.skip_on_drop, args.bar_delay))
+    print(f"delivered {feed.delivered} candles, {len(signals)} pairs, {sum(signals)} short signals "
+          f"in {elapsed:.2f}s, reconnects={feed.reconnects}, missing={feed.missing}")
+    print("candle close -> callback latency:", latency_summary(feed.latencies_ns))
+
+
+if __name__ == '__main__':
+    main()
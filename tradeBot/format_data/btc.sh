@@ -15,16 +15,10 @@ declare -a dates=(
 # Base URL
 base_url="https://data.binance.vision/data/futures/um/monthly/klines/BTCUSDT/1h"
 
-# Download each file
+# Download the files in parallel (4 at a time). The zips are read directly by
+# `python -m tradeBot ingest btc_data`, no unzip step is needed.
 for date in "${dates[@]}"; do
-    filename="BTCUSDT-1h-${date}.zip"
-    url="${base_url}/${filename}"
-    
-    echo "Downloading ${filename}..."
-    wget -P binance_data "${url}"
-    
-    # Add a small delay to be nice to the server
-    sleep 1
-done
+    echo "${base_url}/BTCUSDT-1h-${date}.zip"
+done | xargs -n 1 -P 4 wget -q -nc -P btc_data
 
-echo "Download complete! Files are saved in the binance_data directory."
+echo "Download complete! Files are saved in the btc_data directory."
@@ -0,0 +1,383 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+from base64 import b64encode
+from collections import deque
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from binance.error import ClientError, ServerError
+from binance.lib.utils import cleanNoneValue, encoded_string
+
+from .feed import latency_summary
+from .telemetry import TELEMETRY
+
+BINANCE_FUTURES_API = "https://fapi.binance.com"
+BINANCE_FUTURES_USER_STREAM = "wss://fstream.binance.com/ws"
+
+# USDT-M 默认限额，按交易所公布值留一点余量
+REQUEST_WEIGHT_LIMIT = (2400, 60.0)   # 每分钟请求权重
+ORDER_LIMIT = (300, 10.0)             # 每10秒下单数
+
+# 各接口的请求权重
+WEIGHTS = {
+    "/fapi/v1/order": 1,
+    "/fapi/v2/positionRisk": 5,
+    "/fapi/v2/balance": 5,
+    "/fapi/v1/listenKey": 1,
+    "/fapi/v1/exchangeInfo": 1,
+}
+
+
+def round_step(quantity: float, step_size: str) -> str:
+    """按 LOT_SIZE.stepSize 取到最近的整数倍，返回交易所接受的十进制字符串"""
+    step = Decimal(step_size)
+    units = (Decimal(repr(float(quantity))) / step).to_integral_value(rounding=ROUND_HALF_UP)
+    return format((units * step).normalize(), 'f')
+
+
+class Signer:
+    """请求签名，RSA 私钥只解析一次(Config.SECRET_KEY 是 PEM 时用 RSA，否则按 HMAC 密钥处理)"""
+
+    def __init__(self, secret: str, private_key_pass: Optional[str] = None):
+        self._rsa = None
+        self._secret = None
+        if "PRIVATE KEY" in secret:
+            from Crypto.Hash import SHA256
+            from Crypto.PublicKey import RSA
+            from Crypto.Signature import pkcs1_15
+            self._rsa = pkcs1_15.new(RSA.import_key(secret, passphrase=private_key_pass))
+            self._sha256 = SHA256
+        else:
+            self._secret = secret.encode("utf-8")
+
+    def __call__(self, payload: str) -> str:
+        if self._rsa is not None:
+            return b64encode(self._rsa.sign(self._sha256.new(payload.encode("utf-8")))).decode()
+        return hmac.new(self._secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class RateLimiter:
+    """
+    客户端滑动窗口限流，请求在发出前等待，避免被交易所 429/418
+    响应头里的已用权重会同步回来，多个进程共用一个账户时也不会超
+    """
+
+    def __init__(self, limit: Optional[int], window: float):
+        self.limit = limit
+        self.window = window
+        self._events = deque()   # (时间, 权重)
+        self._used = 0
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now: float):
+        while self._events and now - self._events[0][0] >= self.window:
+            self._used -= self._events.popleft()[1]
+
+    async def acquire(self, weight: int = 1):
+        if self.limit is None:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._expire(now)
+                if self._used + weight <= self.limit or not self._events:
+                    self._events.append((now, weight))
+                    self._used += weight
+                    return
+                await asyncio.sleep(self._events[0][0] + self.window - now)
+
+    def sync(self, used: int):
+        """用交易所返回的已用量校正本地计数"""
+        if used > self._used:
+            self._events.append((time.monotonic(), used - self._used))
+            self._used = used
+
+    def block(self, seconds: float):
+        """收到 429/418 后在 Retry-After 内不再发请求"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    @property
+    def used(self) -> int:
+        self._expire(time.monotonic())
+        return self._used
+
+
+class PositionCache:
+    """
+    本地持仓和余额缓存
+    由下单回报和 user-data stream 的 ACCOUNT_UPDATE 更新，平仓时直接使用缓存的仓位数量
+    """
+
+    def __init__(self):
+        self.positions: Dict[str, Tuple[float, float]] = {}   # symbol -> (positionAmt, entryPrice)
+        self.balances: Dict[str, float] = {}
+        self.updated_ms = 0
+
+    def position(self, symbol: str) -> float:
+        return self.positions.get(symbol, (0.0, 0.0))[0]
+
+    def open_positions(self) -> Dict[str, Tuple[float, float]]:
+        return {s: p for s, p in self.positions.items() if p[0] != 0}
+
+    def load_positions(self, rows: List[Dict]):
+        """get_position_risk 的返回"""
+        for item in rows:
+            self.positions[item["symbol"]] = (float(item["positionAmt"]), float(item["entryPrice"]))
+
+    def load_balances(self, rows: List[Dict]):
+        """balance 的返回"""
+        for item in rows:
+            self.balances[item["asset"]] = float(item["balance"])
+
+    def apply_fill(self, symbol: str, side: str, quantity: float, price: float):
+        """按成交回报更新仓位，加仓时按成交量加权更新开仓均价"""
+        amount, entry = self.positions.get(symbol, (0.0, 0.0))
+        signed = quantity if side.upper() == "BUY" else -quantity
+        new_amount = amount + signed
+        if abs(new_amount) < 1e-12:
+            new_amount, entry = 0.0, 0.0
+        elif amount == 0 or (amount > 0) != (new_amount > 0):
+            entry = price
+        elif (amount > 0) == (signed > 0):
+            entry = (entry * abs(amount) + price * quantity) / abs(new_amount)
+        self.positions[symbol] = (new_amount, entry)
+
+    def apply_account_update(self, event: Dict):
+        """user-data stream 的 ACCOUNT_UPDATE 事件，携带的是绝对值，直接覆盖"""
+        data = event.get("a", {})
+        for b in data.get("B", []):
+            self.balances[b["a"]] = float(b["wb"])
+        for p in data.get("P", []):
+            self.positions[p["s"]] = (float(p["pa"]), float(p["ep"]))
+        self.updated_ms = int(event.get("E", self.updated_ms))
+
+
+class OrderGateway:
+    """
+    异步下单网关
+    复用同一个 aiohttp 连接池，发请求前经过客户端限流
+    持仓/余额查询走本地缓存，平仓直接用缓存的仓位数量发 reduceOnly 市价单，只需一次往返
+    下单数量按 exchangeInfo 的 LOT_SIZE.stepSize 取整，避免 -1111 精度错误
+    latencies_ns 记录从信号产生到收到下单回报的耗时
+    """
+
+    def __init__(self, api_key: str, secret: str, base_url: str = BINANCE_FUTURES_API,
+                 stream_url: str = BINANCE_FUTURES_USER_STREAM, recv_window: int = 5000,
+                 pool_size: int = 8, timeout: float = 10.0, private_key_pass: Optional[str] = None,
+                 weight_limit: Optional[int] = REQUEST_WEIGHT_LIMIT[0],
+                 order_limit: Optional[int] = ORDER_LIMIT[0]):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.stream_url = stream_url.rstrip("/")
+        self.recv_window = recv_window
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.sign = Signer(secret, private_key_pass)
+        # limit 为 None 时不做客户端限流(离线回放压测用)
+        self.weight_limiter = RateLimiter(weight_limit, REQUEST_WEIGHT_LIMIT[1])
+        self.order_limiter = RateLimiter(order_limit, ORDER_LIMIT[1])
+        self.cache = PositionCache()
+        self.step_sizes: Dict[str, str] = {}   # symbol -> LOT_SIZE.stepSize
+        self.latencies_ns: List[int] = []
+        self.requests = 0
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._stream_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls, config, **kwargs) -> 'OrderGateway':
+        return cls(config.API_KEY, config.SECRET_KEY, **kwargs)
+
+    async def start(self, sync: bool = True) -> 'OrderGateway':
+        """建立连接池，sync=True 时先拉一次持仓和余额填充缓存"""
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            connector=connector, headers={"X-MBX-APIKEY": self.api_key},
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        if sync:
+            await self.refresh()
+        return self
+
+    async def close(self):
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+            self._stream_task = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _sync_limits(self, headers):
+        for name, value in headers.items():
+            name = name.lower()
+            if name == "x-mbx-used-weight-1m":
+                self.weight_limiter.sync(int(value))
+            elif name == "x-mbx-order-count-10s":
+                self.order_limiter.sync(int(value))
+
+    async def _request(self, method: str, path: str, params: Optional[Dict] = None,
+                       signed: bool = True):
+        with TELEMETRY.span("gateway.rate_limit"):
+            await self.weight_limiter.acquire(WEIGHTS.get(path, 1))
+            if method == "POST" and path == "/fapi/v1/order":
+                await self.order_limiter.acquire()
+
+        params = cleanNoneValue(params or {})
+        if signed:
+            params["recvWindow"] = self.recv_window
+            params["timestamp"] = int(time.time() * 1000)
+        query = encoded_string(params)
+        if signed:
+            query += "&" + encoded_string({"signature": self.sign(query)})
+        url = self.base_url + path + ("?" + query if query else "")
+
+        self.requests += 1
+        # 非 2xx 在 span 内抛出，计入 {stage}_errors
+        with TELEMETRY.span(f"gateway.{method} {path}"):
+            async with self.session.request(method, url) as response:
+                self._sync_limits(response.headers)
+                text = await response.text()
+                status = response.status
+                if status in (418, 429):
+                    TELEMETRY.inc("rate_limited")
+                    self.weight_limiter.block(float(response.headers.get("Retry-After", 1)))
+                if 400 <= status < 500:
+                    try:
+                        err = json.loads(text)
+                    except ValueError:
+                        raise ClientError(status, None, text, response.headers)
+                    raise ClientError(status, err.get("code"), err.get("msg"), response.headers)
+                if status >= 500:
+                    raise ServerError(status, text)
+                return json.loads(text) if text else {}
+
+    async def load_exchange_info(self):
+        """读取各币种的 LOT_SIZE.stepSize"""
+        info = await self._request("GET", "/fapi/v1/exchangeInfo", signed=False)
+        for item in info.get("symbols", []):
+            for f in item.get("filters", []):
+                if f.get("filterType") == "LOT_SIZE":
+                    self.step_sizes[item["symbol"]] = f["stepSize"]
+
+    async def quantity(self, symbol: str, amount: float) -> str:
+        """取整后的下单数量，第一次用到时加载 exchangeInfo"""
+        if symbol not in self.step_sizes:
+            await self.load_exchange_info()
+        step = self.step_sizes.get(symbol)
+        if step is None:
+            return format(Decimal(repr(float(amount))).normalize(), 'f')
+        return round_step(amount, step)
+
+    async def refresh(self):
+        """从交易所重新拉取持仓和余额，两个请求并发发出"""
+        positions, balances = await asyncio.gather(
+            self._request("GET", "/fapi/v2/positionRisk"),
+            self._request("GET", "/fapi/v2/balance"))
+        self.cache.load_positions(positions)
+        self.cache.load_balances(balances)
+
+    def _record(self, response: Dict, signal_ns: Optional[int]):
+        if signal_ns:
+            self.latencies_ns.append(time.perf_counter_ns() - signal_ns)
+            if TELEMETRY.enabled:
+                TELEMETRY.observe_ns("order.signal_to_ack", self.latencies_ns[-1])
+        executed = float(response.get("executedQty") or 0)
+        if executed:
+            price = float(response.get("avgPrice") or response.get("price") or 0)
+            self.cache.apply_fill(response["symbol"], response["side"], executed, price)
+        return response
+
+    async def new_order(self, signal_ns: Optional[int] = None, **params) -> Dict:
+        """
+        下单，newOrderRespType=RESULT 使市价单的回报里带上成交量和均价，用来更新缓存
+        signal_ns 为信号产生时的 time.perf_counter_ns()
+        """
+        params.setdefault("newOrderRespType", "RESULT")
+        response = await self._request("POST", "/fapi/v1/order", params)
+        return self._record(response, signal_ns)
+
+    async def open_order(self, symbol: str, side: str, quantity: float,
+                         signal_ns: Optional[int] = None) -> Dict:
+        return await self.new_order(signal_ns=signal_ns, symbol=symbol, side=side,
+                                    type="MARKET", quantity=await self.quantity(symbol, quantity))
+
+    async def close_position(self, symbol: str, signal_ns: Optional[int] = None) -> Optional[Dict]:
+        """
+        按缓存的仓位数量直接发 reduceOnly 市价单，没有仓位时不发请求
+        缓存是成交量累加出来的浮点数，发出前按 stepSize 取整
+        """
+        amount = self.cache.position(symbol)
+        if amount == 0:
+            return None
+        quantity = await self.quantity(symbol, abs(amount))
+        if Decimal(quantity) == 0:
+            return None
+        side = "BUY" if amount < 0 else "SELL"
+        return await self.new_order(signal_ns=signal_ns, symbol=symbol, side=side, type="MARKET",
+                                    reduceOnly="true", quantity=quantity)
+
+    def get_all_orders(self) -> Dict[str, Tuple[float, float]]:
+        """非零持仓，来自本地缓存"""
+        return self.cache.open_positions()
+
+    def get_balance(self) -> Dict[str, float]:
+        return {asset: b for asset, b in self.cache.balances.items() if b != 0}
+
+    async def _user_stream(self, keepalive: float, reconnect_delay: float = 1.0,
+                           max_reconnect_delay: float = 30.0):
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import WebSocketException
+
+        delay = reconnect_delay
+        while True:
+            try:
+                listen_key = (await self._request("POST", "/fapi/v1/listenKey", signed=False))["listenKey"]
+                renewed = time.monotonic()
+                async with connect(f"{self.stream_url}/{listen_key}") as ws:
+                    # 断线期间可能错过事件，重连后用 REST 校正一次
+                    await self.refresh()
+                    delay = reconnect_delay
+                    while True:
+                        try:
+                            raw = await asyncio.wait_for(ws.recv(), timeout=keepalive)
+                        except asyncio.TimeoutError:
+                            raw = None
+                        if time.monotonic() - renewed >= keepalive:
+                            await self._request("PUT", "/fapi/v1/listenKey",
+                                                {"listenKey": listen_key}, signed=False)
+                            renewed = time.monotonic()
+                        if raw is None:
+                            continue
+                        event = json.loads(raw)
+                        if event.get("e") == "ACCOUNT_UPDATE":
+                            self.cache.apply_account_update(event)
+                        elif event.get("e") == "listenKeyExpired":
+                            break
+                continue
+            except (OSError, WebSocketException, asyncio.TimeoutError, aiohttp.ClientError,
+                    ClientError, ServerError) as e:
+                # listenKey 申请/续期失败和断线一样，退避后重新申请
+                print(f"User data stream disconnected: {e!r}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_reconnect_delay)
+
+    def start_user_stream(self, keepalive: float = 30 * 60):
+        """后台订阅 user-data stream，用 ACCOUNT_UPDATE 覆盖缓存"""
+        if self._stream_task is None:
+            self._stream_task = asyncio.create_task(self._user_stream(keepalive))
+        return self._stream_task
+
+    def latency_summary(self) -> Dict[str, float]:
+        return latency_summary(self.latencies_ns)
@@ -0,0 +1,340 @@
+import math
+from collections import deque
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+DAY = np.timedelta64(1, 'D')
+Lookback = Union[str, pd.Timedelta, np.timedelta64]
+
+
+def _lookback(value: Lookback) -> np.timedelta64:
+    return pd.Timedelta(value).to_timedelta64()
+
+
+def _times(values) -> np.ndarray:
+    """时间列转 datetime64[ns]，支持毫秒整数、字符串和 datetime"""
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+        return values.astype('M8[ns]')
+    series = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_datetime(series, unit='ms').to_numpy()
+    return pd.to_datetime(series).to_numpy(dtype='M8[ns]')
+
+
+def _pct(now: np.ndarray, before: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (now - before) / before * 100
+
+
+def _ewm(values: np.ndarray, alpha: float, start: Optional[float] = None) -> np.ndarray:
+    """
+    y_t = alpha * x_t + (1 - alpha) * y_{t-1}，与 pandas ewm(adjust=False) 相同
+    start 为 y_{-1}，不给时 y_0 = x_0
+    分块用闭式解 y_t = beta^(t+1) * (y_{-1} + alpha * sum(x_k / beta^(k+1))) 向量化计算，
+    块长保证 beta^-块长 不溢出
+    """
+    x = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    out = np.empty(n)
+    if n == 0:
+        return out
+    beta = 1.0 - alpha
+    if beta <= 0:
+        out[:] = x
+        return out
+    block = int(min(n, max(1, -600.0 / math.log(beta)))) if beta < 1 else n
+    prev = x[0] if start is None else float(start)
+    powers = beta ** np.arange(1, block + 1)
+    for lo in range(0, n, block):
+        chunk = x[lo:lo + block]
+        pw = powers[:len(chunk)]
+        out[lo:lo + len(chunk)] = pw * (prev + alpha * np.cumsum(chunk / pw))
+        prev = out[lo + len(chunk) - 1]
+    return out
+
+
+def _ewm_skipna(values: np.ndarray, alpha: float, start: Optional[float] = None) -> np.ndarray:
+    """跳过 NaN：开头的 NaN 保持 NaN，中间的 NaN 沿用上一个值，与流式 update(nan) 一致"""
+    x = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(x)
+    if valid.all():
+        return _ewm(x, alpha, start)
+    out = np.full(len(x), np.nan)
+    idx = np.flatnonzero(valid)
+    if len(idx) == 0:
+        if start is not None:
+            out[:] = start
+        return out
+    out[idx] = _ewm(x[idx], alpha, start)
+    # 把有效值向后填充到 NaN 位置
+    fill = np.maximum.accumulate(np.where(valid, np.arange(len(x)), -1))
+    has = fill >= 0
+    out[has] = out[fill[has]]
+    if start is not None:
+        out[~has] = start
+    return out
+
+
+def _span_alpha(span: float) -> float:
+    return 2.0 / (span + 1.0)
+
+
+class Indicators:
+    """
+    向量化批量指标，输入为 NumPy 数组(或 Series)，输出 float64 数组
+    每个指标都有对应的 Streaming* 状态对象，逐根更新 O(1)，结果与批量计算一致(浮点误差内)
+    跨天的回看按时间戳计算，缺K线时对应位置为 NaN，不会错位
+    """
+
+    @staticmethod
+    def ema(values, span: float, start: Optional[float] = None) -> np.ndarray:
+        """指数移动平均，start 为上一根K线的 EMA(用于接着之前的状态继续算)"""
+        return _ewm_skipna(values, _span_alpha(span), start)
+
+    @staticmethod
+    def macd(close, fast: int = 12, slow: int = 26, signal: int = 9, macd_warmup: int = 21,
+             signal_warmup: int = 29) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        返回 (MACD, Signal, Histogram)
+        前 macd_warmup 根的 MACD、前 signal_warmup 根的 Signal 置为 NaN，Signal 从第一个有效 MACD 开始计算
+        """
+        close = np.asarray(close, dtype=np.float64)
+        macd = Indicators.ema(close, fast) - Indicators.ema(close, slow)
+        macd[:macd_warmup] = np.nan
+        signal_line = Indicators.ema(macd, signal)
+        signal_line[:signal_warmup] = np.nan
+        return macd, signal_line, macd - signal_line
+
+    @staticmethod
+    def true_range(high, low, close) -> np.ndarray:
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        tr = high - low
+        if len(tr) > 1:
+            prev = close[:-1]
+            tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(high[1:] - prev), np.abs(low[1:] - prev)))
+        return tr
+
+    @staticmethod
+    def atr(high, low, close, period: int = 14) -> np.ndarray:
+        """Wilder ATR：前 period 根真实波幅的均值作为初值，之后按 1/period 平滑"""
+        tr = Indicators.true_range(high, low, close)
+        out = np.full(len(tr), np.nan)
+        if len(tr) < period:
+            return out
+        seed = tr[:period].mean()
+        out[period - 1] = seed
+        out[period:] = _ewm(tr[period:], 1.0 / period, seed)
+        return out
+
+    @staticmethod
+    def rsi(close, period: int = 14) -> np.ndarray:
+        """Wilder RSI，第 period 根开始有值；区间内没有下跌时为100，既无涨也无跌时为50"""
+        close = np.asarray(close, dtype=np.float64)
+        out = np.full(len(close), np.nan)
+        if len(close) <= period:
+            return out
+        diff = np.diff(close)
+        gain = np.maximum(diff, 0.0)
+        loss = np.maximum(-diff, 0.0)
+        avg_gain = _ewm(gain[period:], 1.0 / period, gain[:period].mean())
+        avg_loss = _ewm(loss[period:], 1.0 / period, loss[:period].mean())
+        avg_gain = np.concatenate(([gain[:period].mean()], avg_gain))
+        avg_loss = np.concatenate(([loss[:period].mean()], avg_loss))
+        out[period:] = _rsi_value(avg_gain, avg_loss)
+        return out
+
+    @staticmethod
+    def day_price(open_time, open_) -> np.ndarray:
+        """
+        下一个自然日(UTC)第一根K线的开盘价，同一天的所有K线取值相同
+        下一天没有数据(缺整天或数据结尾)时为 NaN
+        """
+        times = _times(open_time)
+        open_ = np.asarray(open_, dtype=np.float64)
+        n = len(times)
+        if n == 0:
+            return np.empty(0)
+        days = times.astype('M8[D]')
+        starts = np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+        day_open = open_[starts]
+        next_open = np.full(len(starts), np.nan)
+        consecutive = days[starts[1:]] - days[starts[:-1]] == DAY
+        next_open[:-1] = np.where(consecutive, day_open[1:], np.nan)
+        counts = np.diff(np.append(starts, n))
+        return np.repeat(next_open, counts)
+
+    @staticmethod
+    def lookback_values(open_time, values, lookback: Lookback = '1D') -> np.ndarray:
+        """每根K线在 open_time - lookback 时刻那根K线上的值，该时刻没有K线时为 NaN"""
+        times = _times(open_time)
+        values = np.asarray(values, dtype=np.float64)
+        target = times - _lookback(lookback)
+        idx = np.searchsorted(times, target)
+        found = idx < len(times)
+        found[found] = times[idx[found]] == target[found]
+        out = np.full(len(times), np.nan)
+        out[found] = values[idx[found]]
+        return out
+
+    @staticmethod
+    def day_change_dynamic(open_time, open_, lookback: Lookback = '1D') -> np.ndarray:
+        """开盘价相对 lookback 之前同一时刻的涨跌幅(%)"""
+        return _pct(np.asarray(open_, dtype=np.float64), Indicators.lookback_values(open_time, open_, lookback))
+
+    @staticmethod
+    def day_change_static(open_time, day_price, lookback: Lookback = '1D') -> np.ndarray:
+        """day_price 相对 lookback 之前同一时刻 day_price 的涨跌幅(%)"""
+        return _pct(np.asarray(day_price, dtype=np.float64),
+                    Indicators.lookback_values(open_time, day_price, lookback))
+
+
+def _rsi_value(avg_gain, avg_loss):
+    avg_gain = np.asarray(avg_gain, dtype=np.float64)
+    avg_loss = np.asarray(avg_loss, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    rsi = np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), rsi)
+    return rsi
+
+
+class StreamingEMA:
+    """逐根更新的 EMA，update(nan) 不改变状态"""
+
+    def __init__(self, span: Optional[float] = None, alpha: Optional[float] = None,
+                 value: Optional[float] = None):
+        self.alpha = alpha if alpha is not None else _span_alpha(span)
+        self.value = np.nan if value is None else float(value)
+
+    def update(self, x: float) -> float:
+        if x != x:
+            return self.value
+        if self.value != self.value:
+            self.value = float(x)
+        else:
+            self.value = self.alpha * x + (1.0 - self.alpha) * self.value
+        return self.value
+
+
+class StreamingMACD:
+    """逐根更新的 MACD，返回 (MACD, Signal, Histogram)，预热规则与 Indicators.macd 相同"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9, macd_warmup: int = 21,
+                 signal_warmup: int = 29):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal = StreamingEMA(signal)
+        self.macd_warmup = macd_warmup
+        self.signal_warmup = signal_warmup
+        self.count = 0
+
+    def update(self, close: float) -> Tuple[float, float, float]:
+        macd = self.fast.update(close) - self.slow.update(close)
+        if self.count < self.macd_warmup:
+            macd = np.nan
+        signal = self.signal.update(macd)
+        if self.count < self.signal_warmup:
+            signal = np.nan
+        self.count += 1
+        return macd, signal, macd - signal
+
+
+class StreamingATR:
+    """逐根更新的 Wilder ATR"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self._sum = 0.0
+        self.value = np.nan
+
+    def update(self, high: float, low: float, close: float) -> float:
+        tr = high - low
+        if self.prev_close is not None:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        self.count += 1
+        if self.count < self.period:
+            self._sum += tr
+        elif self.count == self.period:
+            self.value = (self._sum + tr) / self.period
+        else:
+            self.value += (tr - self.value) / self.period
+        return self.value
+
+
+class StreamingRSI:
+    """逐根更新的 Wilder RSI"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0                # 已有的涨跌幅个数
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.value = np.nan
+
+    def update(self, close: float) -> float:
+        if self.prev_close is None:
+            self.prev_close = close
+            return self.value
+        diff = close - self.prev_close
+        self.prev_close = close
+        gain, loss = max(diff, 0.0), max(-diff, 0.0)
+        self.count += 1
+        if self.count <= self.period:
+            self.avg_gain += gain
+            self.avg_loss += loss
+            if self.count < self.period:
+                return self.value
+            self.avg_gain /= self.period
+            self.avg_loss /= self.period
+        else:
+            self.avg_gain += (gain - self.avg_gain) / self.period
+            self.avg_loss += (loss - self.avg_loss) / self.period
+        self.value = float(_rsi_value(self.avg_gain, self.avg_loss))
+        return self.value
+
+
+class StreamingDayChange:
+    """
+    逐根更新 day_change_dynamic，并在每个自然日的第一根K线给出上一天的 day_price 和 day_change_static
+    day_price 是下一天的开盘价，要到下一天开盘才能确定，所以上一天的值在这时才给出
+    回看窗口只保留 lookback 内的K线，按时间戳而不是行数查找
+    """
+
+    def __init__(self, lookback: Lookback = '1D'):
+        self.lookback = _lookback(lookback)
+        self._window = deque()         # lookback 内的 (open_time, open)
+        self._days = deque(maxlen=3)   # 最近三个有数据的自然日 (日期, 第一根开盘价)
+        self.day_change_dynamic = np.nan
+        self.previous_day_price = np.nan        # 上一个自然日的 day_price(即今天的开盘价)
+        self.previous_day_change_static = np.nan
+
+    def update(self, open_time, open_: float) -> float:
+        """输入一根K线，返回它的 day_change_dynamic"""
+        t = np.datetime64(pd.Timestamp(open_time).to_datetime64(), 'ns')
+        target = t - self.lookback
+        window = self._window
+        while window and window[0][0] < target:
+            window.popleft()
+        before = window[0][1] if window and window[0][0] == target else np.nan
+        window.append((t, open_))
+        self.day_change_dynamic = float(_pct(np.float64(open_), np.float64(before)))
+
+        day = t.astype('M8[D]')
+        if not self._days or self._days[-1][0] != day:
+            self._days.append((day, open_))
+            days = list(self._days)
+            self.previous_day_price = np.nan
+            self.previous_day_change_static = np.nan
+            if len(days) >= 2 and days[-1][0] - days[-2][0] == DAY:
+                self.previous_day_price = days[-1][1]
+                if len(days) == 3 and days[-2][0] - days[-3][0] == DAY:
+                    self.previous_day_change_static = float(_pct(np.float64(days[-1][1]),
+                                                                 np.float64(days[-2][1])))
+        return self.day_change_dynamic
@@ -0,0 +1,313 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+# 成交记录表，未平仓的交易 exit_idx 为 -1
+TRADE_DTYPE = np.dtype([
+    ('entry_idx', np.int64),
+    ('exit_idx', np.int64),
+    ('size', np.float64),
+    ('entry_price', np.float64),
+    ('stop_loss', np.float64),
+    ('take_profit', np.float64),
+    ('exit_price', np.float64),
+    ('entry_fee', np.float64),
+    ('pnl', np.float64),
+    ('liquidated', np.bool_),   # 在止损前先触及强平价，按强平价平仓
+])
+
+# 可选的保证金与强平规则(liquidation=True)，ExecutionKernel / ScenarioEngine / PortfolioEngine / MockAccount 共用：
+#   - 每个仓位占用 position_value 的逐仓保证金；开仓时已实现余额减去其他持仓的保证金后
+#     不足以支付 保证金 + 开仓手续费 则拒绝开仓
+#   - 价格触及强平价(亏损等于保证金的价格)时强平，有效止损为 止损价 与 强平价 中先触及的一个
+#   - 每笔交易的亏损(含平仓手续费)以保证金为上限，余额不会变成负数
+# 默认关闭，与原来的 MockAccount 一致：不检查保证金，按止损/止盈价结算
+
+
+def liquidation_price(entry_price, leverage: float, side: int = -1):
+    """亏损等于保证金时的价格，做空(side=-1)为 entry*(1+1/leverage)，做多为 entry*(1-1/leverage)"""
+    return entry_price * (1 - side / leverage)
+
+
+def cap_loss(pnl, margin):
+    """单笔净盈亏不低于 -保证金"""
+    return np.maximum(pnl, -margin)
+
+
+@dataclass
+class KernelResult:
+    trades: np.ndarray          # TRADE_DTYPE 结构化数组
+    equity: np.ndarray          # 每根K线处理完后的余额
+    balance: float
+    equity_peak: float
+    max_drawdown: float
+
+
+class IntrabarResolver:
+    """
+    用同一币种的低周期K线(1m/1h)判断一根K线内止损和止盈哪个先触发
+    times 为升序的毫秒时间戳，可以直接传 MarketStore.load(as_frame=False) 的 memmap，
+    查找只对需要判断的K线做 searchsorted，不会把全部低周期数据读进内存
+    """
+
+    def __init__(self, times: np.ndarray, high: np.ndarray, low: np.ndarray):
+        self.times = times
+        self.high = high
+        self.low = low
+
+    @classmethod
+    def from_frame(cls, df) -> 'IntrabarResolver':
+        from .store import to_epoch_ms
+        return cls(to_epoch_ms(df['open_time']), df['high'].to_numpy(dtype=np.float64),
+                   df['low'].to_numpy(dtype=np.float64))
+
+    @classmethod
+    def from_store(cls, store, symbol: str, interval: str, start=None, end=None) -> 'IntrabarResolver':
+        arrays = store.load(symbol, interval, start, end, columns=['high', 'low'], as_frame=False)
+        return cls(arrays['open_time'], arrays['high'], arrays['low'])
+
+    def stop_first(self, bar_start: np.ndarray, bar_end: np.ndarray,
+                   stop_loss: np.ndarray, take_profit: np.ndarray) -> np.ndarray:
+        """
+        每根K线 [bar_start, bar_end) 内第一根触及任一价位的低周期K线
+        只触及止盈时返回 False；触及止损、两者在同一根低周期K线内或没有低周期数据时返回 True(止损优先)
+        """
+        bar_start = np.asarray(bar_start, dtype=np.int64)
+        lo = np.searchsorted(self.times, bar_start, side='left')
+        hi = np.searchsorted(self.times, np.asarray(bar_end, dtype=np.int64), side='left')
+        lengths = np.maximum(hi - lo, 0)
+        result = np.ones(len(bar_start), dtype=bool)
+        has = lengths > 0
+        if not has.any():
+            return result
+
+        # 把各K线对应的低周期区间拼成一个扁平下标数组，分段求第一次触及
+        lo, lengths = lo[has], lengths[has]
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        flat = np.arange(lengths.sum()) - np.repeat(starts - lo, lengths)
+        stop = np.repeat(np.asarray(stop_loss, dtype=np.float64)[has], lengths)
+        tp = np.repeat(np.asarray(take_profit, dtype=np.float64)[has], lengths)
+        high = np.asarray(self.high[flat], dtype=np.float64)
+        low = np.asarray(self.low[flat], dtype=np.float64)
+        stop_hit = high >= stop
+        tp_hit = low <= tp
+        position = np.arange(len(flat))
+        big = len(flat)
+        first_stop = np.minimum.reduceat(np.where(stop_hit, position, big), starts)
+        first_tp = np.minimum.reduceat(np.where(tp_hit, position, big), starts)
+        result[has] = ~(first_tp < first_stop)
+        return result
+
+
+class ShortRule:
+    """
+    逐根已收盘K线的做空开平仓规则，价位与 ExecutionKernel.short_path 一致：
+    止损为开仓K线前一根的最高价，止盈为 tp_multiple 倍止损距离，同时触及时按止损处理
+    实盘和回放在开仓K线收盘后才成交，所以从下一根K线开始检查平仓；每根K线处理完后更新 prev_high
+    """
+
+    def __init__(self, tp_multiple: float = 2.0):
+        self.tp_multiple = tp_multiple
+        self.prev_high = None
+        self.stop = None
+        self.target = None
+
+    @property
+    def in_position(self) -> bool:
+        return self.stop is not None
+
+    def can_enter(self) -> bool:
+        return self.stop is None and self.prev_high is not None
+
+    def exit_due(self, bar) -> bool:
+        return self.stop is not None and (bar['high'] >= self.stop or bar['low'] <= self.target)
+
+    def entered(self, bar):
+        self.stop = self.prev_high
+        self.target = bar['close'] - (self.stop - bar['close']) * self.tp_multiple
+
+    def exited(self):
+        self.stop = self.target = None
+
+
+class ExecutionKernel:
+    """基于连续 NumPy 数组的回测执行内核，成交/手续费/止损止盈优先级与 MockAccount 一致"""
+
+    LOOKAHEAD = 64  # 批量向前探测的K线数，超出后逐笔倍增搜索
+
+    @staticmethod
+    def _first_exit(high: np.ndarray, low: np.ndarray, start: int,
+                    stop_loss: float, take_profit: float) -> int:
+        """从 start 开始找第一根触发止损或止盈的K线，没有则返回-1"""
+        n = len(high)
+        pos = start
+        chunk = ExecutionKernel.LOOKAHEAD
+        while pos < n:
+            end = min(n, pos + chunk)
+            hit = (high[pos:end] >= stop_loss) | (low[pos:end] <= take_profit)
+            j = int(hit.argmax())
+            if hit[j]:
+                return pos + j
+            pos = end
+            chunk *= 2
+        return -1
+
+    @staticmethod
+    def _candidate_exits(high: np.ndarray, low: np.ndarray, entries: np.ndarray,
+                         stop_loss: np.ndarray, take_profit: np.ndarray) -> np.ndarray:
+        """
+        对所有候选开仓点批量探测平仓位置
+        -1 表示到数据结尾都没有平仓，-2 表示探测范围内未解决
+        """
+        n = len(high)
+        exits = np.full(len(entries), -2, dtype=np.int64)
+        pending = np.arange(len(entries))
+        for offset in range(ExecutionKernel.LOOKAHEAD):
+            if len(pending) == 0:
+                break
+            bars = entries[pending] + offset
+            beyond = bars >= n
+            exits[pending[beyond]] = -1
+            pending = pending[~beyond]
+            bars = bars[~beyond]
+            hit = (high[bars] >= stop_loss[pending]) | (low[bars] <= take_profit[pending])
+            exits[pending[hit]] = bars[hit]
+            pending = pending[~hit]
+        return exits
+
+    @staticmethod
+    def short_path(high: np.ndarray, low: np.ndarray, close: np.ndarray, signal: np.ndarray,
+                   tp_multiple: float = 2.0, resolve_ambiguous: Optional[Callable] = None,
+                   leverage: Optional[float] = None) -> np.ndarray:
+        """
+        做空信号的开平仓路径：开仓/平仓K线、止损止盈和平仓价
+        只依赖行情、信号和杠杆(决定强平价)，与仓位大小、手续费无关，size/entry_fee/pnl 留为 0
+        止损为前一根K线最高价，止盈为 tp_multiple 倍风险，同一根K线同时触发时默认止损优先
+        给出 leverage 时强平价低于止损价的交易以强平价为有效止损，liquidated 为 True；None 时不考虑强平
+        resolve_ambiguous(exit_bars, stop_loss, take_profit) 返回这些K线是否止损先触发，
+        只用于开仓K线之后同时触及两个价位的K线，不影响平仓位置
+        """
+        high = np.ascontiguousarray(high, dtype=np.float64)
+        low = np.ascontiguousarray(low, dtype=np.float64)
+        close = np.ascontiguousarray(close, dtype=np.float64)
+        signal = np.asarray(signal, dtype=bool)
+
+        # 候选开仓点：第0根没有前一根K线，不参与
+        entries = np.flatnonzero(signal)
+        entries = entries[entries >= 1]
+        cand_stop = high[entries - 1]
+        cand_entry = close[entries]
+        cand_tp = cand_entry - ((cand_stop - cand_entry) * tp_multiple)
+        cand_eff = cand_stop if leverage is None else np.minimum(cand_stop, liquidation_price(cand_entry, leverage))
+        cand_exit = ExecutionKernel._candidate_exits(high, low, entries, cand_eff, cand_tp)
+
+        # 持仓期间忽略新信号，沿平仓位置串起实际成交的交易
+        next_cand = np.searchsorted(entries, cand_exit + 1).tolist()
+        exit_list = cand_exit.tolist()
+        taken = []
+        c = 0
+        while c < len(entries):
+            exit_idx = exit_list[c]
+            taken.append(c)
+            if exit_idx == -2:
+                exit_idx = ExecutionKernel._first_exit(high, low, int(entries[c]),
+                                                       cand_eff[c], cand_tp[c])
+                cand_exit[c] = exit_idx
+                if exit_idx < 0:
+                    break
+                c = int(np.searchsorted(entries, exit_idx + 1))
+                continue
+            if exit_idx < 0:
+                break
+            c = next_cand[c]
+        taken = np.asarray(taken, dtype=np.int64)
+
+        trades = np.zeros(len(taken), dtype=TRADE_DTYPE)
+        trades['entry_idx'] = entries[taken]
+        trades['exit_idx'] = cand_exit[taken]
+        trades['entry_price'] = cand_entry[taken]
+        trades['stop_loss'] = cand_stop[taken]
+        trades['take_profit'] = cand_tp[taken]
+        effective_stop = cand_eff[taken]
+
+        closed = trades['exit_idx'] >= 0
+        exit_bars = trades['exit_idx'][closed]
+        stop = effective_stop[closed]
+        stop_hit = high[exit_bars] >= stop
+        if resolve_ambiguous is not None:
+            ambiguous = stop_hit & (low[exit_bars] <= trades['take_profit'][closed]) \
+                & (exit_bars > trades['entry_idx'][closed])
+            if ambiguous.any():
+                stop_hit[ambiguous] = resolve_ambiguous(exit_bars[ambiguous], stop[ambiguous],
+                                                        trades['take_profit'][closed][ambiguous])
+        trades['exit_price'] = np.nan
+        trades['exit_price'][closed] = np.where(stop_hit, stop, trades['take_profit'][closed])
+        trades['liquidated'][closed] = stop_hit & (stop < trades['stop_loss'][closed])
+        return trades
+
+    @staticmethod
+    def run_short(high: np.ndarray, low: np.ndarray, close: np.ndarray, signal: np.ndarray,
+                  fee_rate: float, position_value: float, leverage: float,
+                  initial_balance: float, equity_peak: float = None,
+                  max_drawdown: float = 0.0, tp_multiple: float = 2.0,
+                  resolve_ambiguous: Optional[Callable] = None, liquidation: bool = False) -> KernelResult:
+        """
+        做空信号回测，开平仓路径见 short_path
+        liquidation=True 时使用模块开头的保证金和强平规则：同一时间只有一个仓位，
+        开仓前余额不足以支付保证金(position_value)和开仓手续费时拒绝开仓；
+        空仓时余额不再变化，之后的信号同样会被拒绝，所以直接截断路径
+        """
+        n = len(close)
+        if equity_peak is None:
+            equity_peak = initial_balance
+        trades = ExecutionKernel.short_path(high, low, close, signal, tp_multiple, resolve_ambiguous,
+                                            leverage=leverage if liquidation else None)
+        trades['size'] = (position_value * leverage) / trades['entry_price']
+        trades['entry_fee'] = trades['entry_price'] * trades['size'] * fee_rate
+
+        closed = trades['exit_idx'] >= 0
+        exit_price = trades['exit_price'][closed]
+        size = trades['size'][closed]
+        pnl = (exit_price - trades['entry_price'][closed]) * size * -1
+        exit_fee = exit_price * size * fee_rate
+        trades['pnl'][closed] = pnl - exit_fee
+
+        if liquidation:
+            trades['pnl'][closed] = cap_loss(trades['pnl'][closed], position_value)
+            # 之前的交易都已平仓，开仓前余额 = 初始余额 + 之前各笔的净盈亏
+            before = initial_balance + np.concatenate(([0.0], np.cumsum(trades['pnl'] - trades['entry_fee'])[:-1]))
+            short_of_margin = np.flatnonzero(before < position_value + trades['entry_fee'])
+            if len(short_of_margin):
+                trades = trades[:short_of_margin[0]]
+                closed = closed[:short_of_margin[0]]
+
+        # 按时间顺序排列资金变动：开仓手续费，然后平仓盈亏
+        m = len(trades)
+        event_bars = np.empty(m * 2, dtype=np.int64)
+        event_values = np.empty(m * 2, dtype=np.float64)
+        event_bars[0::2] = trades['entry_idx']
+        event_values[0::2] = -trades['entry_fee']
+        event_bars[1::2] = np.where(closed, trades['exit_idx'], n)
+        event_values[1::2] = trades['pnl']
+        keep = event_bars < n
+        event_bars = event_bars[keep]
+        event_values = event_values[keep]
+
+        balances = np.cumsum(np.concatenate(([initial_balance], event_values)))
+        equity = balances[np.searchsorted(event_bars, np.arange(n), side='right')]
+
+        # 与 MockAccount 一致，只在平仓时更新峰值和最大回撤
+        close_balances = balances[1:][1::2] if m else balances[:0]
+        if len(close_balances):
+            peaks = np.maximum.accumulate(np.concatenate(([equity_peak], close_balances)))[1:]
+            drawdowns = (peaks - close_balances) / peaks
+            equity_peak = float(peaks[-1])
+            max_drawdown = max(max_drawdown, float(drawdowns.max()))
+
+        return KernelResult(
+            trades=trades,
+            equity=equity,
+            balance=float(balances[-1]),
+            equity_peak=equity_peak,
+            max_drawdown=max_drawdown
+        )
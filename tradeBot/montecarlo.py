@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+from .account import MockAccount
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+@dataclass
+class MonteCarloResult:
+    final_balance: np.ndarray     # 每条路径的最终余额
+    max_drawdown: np.ndarray      # 每条路径的最大回撤(比例)
+    losing_streak: np.ndarray     # 每条路径最长连续亏损笔数
+    initial_balance: float
+
+    def bands(self, percentiles: Sequence[float] = PERCENTILES) -> pd.DataFrame:
+        """各指标的分位数，行为指标，列为分位数"""
+        return pd.DataFrame({
+            'Final Balance': np.percentile(self.final_balance, percentiles),
+            'Max Drawdown': np.percentile(self.max_drawdown, percentiles),
+            'Losing Streak': np.percentile(self.losing_streak, percentiles),
+        }, index=[f"p{p:g}" for p in percentiles]).T
+
+    def loss_probability(self) -> float:
+        """最终余额低于初始余额的路径占比"""
+        return float((self.final_balance < self.initial_balance).mean())
+
+
+class MonteCarlo:
+    """
+    对已平仓交易的盈亏序列做蒙特卡洛重采样
+    method='bootstrap' 有放回抽样，'shuffle' 只打乱顺序(最终余额不变，只看回撤和连亏)
+    每批路径组成一个二维矩阵一次性 cumsum，按 max_bytes 分批控制内存
+    回撤与 MockAccount 一致，以初始余额为起始峰值、按每笔平仓后的余额计算
+    """
+
+    @staticmethod
+    def account_pnls(account: MockAccount) -> np.ndarray:
+        """MockAccount 中每笔已平仓交易的净盈亏(order.pnl 只含平仓手续费，这里再扣掉开仓手续费)"""
+        closed = account.orders.closed()
+        return closed['pnl'] - closed['entry_price'] * closed['size'] * account.fee_rate
+
+    @staticmethod
+    def kernel_pnls(trades: np.ndarray) -> np.ndarray:
+        """ExecutionKernel 成交记录表中已平仓交易的净盈亏"""
+        closed = trades['exit_idx'] >= 0
+        return (trades['pnl'][closed] - trades['entry_fee'][closed]).astype(np.float64)
+
+    @staticmethod
+    def _path_stats(pnl: np.ndarray, initial_balance: float) -> Dict[str, np.ndarray]:
+        """pnl 为 路径数 × 交易数 矩阵"""
+        balances = np.cumsum(pnl, axis=1)
+        balances += initial_balance
+        peaks = np.maximum.accumulate(balances, axis=1)
+        np.maximum(peaks, initial_balance, out=peaks)
+        drawdown = np.subtract(peaks, balances)
+        drawdown /= peaks
+
+        losing = pnl < 0
+        runs = np.cumsum(losing, axis=1, dtype=np.int32)
+        runs -= np.maximum.accumulate(np.where(losing, 0, runs), axis=1)
+        return {
+            'final_balance': balances[:, -1],
+            'max_drawdown': drawdown.max(axis=1),
+            'losing_streak': runs.max(axis=1),
+        }
+
+    @staticmethod
+    def simulate(pnl: np.ndarray, initial_balance: float = 1000.0, n_paths: int = 10000,
+                 method: str = 'bootstrap', seed: Optional[int] = 0,
+                 max_bytes: int = 64 * 1024 * 1024) -> MonteCarloResult:
+        """重采样 n_paths 条交易序列并计算每条路径的指标"""
+        if method not in ('bootstrap', 'shuffle'):
+            raise ValueError(f"Unknown method: {method!r}")
+        pnl = np.asarray(pnl, dtype=np.float64)
+        n_trades = len(pnl)
+        if n_trades == 0:
+            return MonteCarloResult(np.full(n_paths, float(initial_balance)), np.zeros(n_paths),
+                                    np.zeros(n_paths, dtype=np.int64), initial_balance)
+
+        rng = np.random.default_rng(seed)
+        # 每批同时存在约6个 路径数 × 交易数 的8字节矩阵
+        chunk = max(1, min(n_paths, max_bytes // (n_trades * 8 * 6)))
+        out = {
+            'final_balance': np.empty(n_paths),
+            'max_drawdown': np.empty(n_paths),
+            'losing_streak': np.empty(n_paths, dtype=np.int64),
+        }
+        for start in range(0, n_paths, chunk):
+            rows = min(chunk, n_paths - start)
+            if method == 'bootstrap':
+                sample = pnl[rng.integers(0, n_trades, size=(rows, n_trades), dtype=np.int32)]
+            else:
+                sample = rng.permuted(np.broadcast_to(pnl, (rows, n_trades)), axis=1)
+            for name, values in MonteCarlo._path_stats(sample, initial_balance).items():
+                out[name][start:start + rows] = values
+        return MonteCarloResult(initial_balance=initial_balance, **out)
+
+    @staticmethod
+    def summary(result: MonteCarloResult, percentiles: Sequence[float] = (5, 50, 95)) -> Dict[str, float]:
+        """展平成一行指标，便于并入参数扫描的结果表"""
+        bands = result.bands(percentiles)
+        row = {f"MC {metric} {p}": float(value)
+               for metric, values in bands.iterrows() for p, value in values.items()}
+        row['MC Loss Probability'] = result.loss_probability()
+        return row
+
+    @staticmethod
+    def from_account(account: MockAccount, **kwargs) -> MonteCarloResult:
+        return MonteCarlo.simulate(MonteCarlo.account_pnls(account), account.initial_balance, **kwargs)
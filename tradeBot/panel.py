@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .signal_engine import SignalEngine
+
+PANEL_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class Panel:
+    """
+    多币种对齐面板
+    所有币种共用一个升序时间索引，每个字段是 symbols × bars 的二维数组
+    缺失的K线在 mask 中为 False，字段值为 NaN，不做隐式填充
+    """
+
+    def __init__(self, timestamps: np.ndarray, symbols: Sequence[str],
+                 fields: Dict[str, np.ndarray], mask: np.ndarray):
+        self.timestamps = np.asarray(timestamps, dtype='M8[ns]')
+        self.symbols = list(symbols)
+        self.fields = fields
+        self.mask = mask
+        self._rows = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.mask.shape
+
+    def row(self, symbol: str) -> int:
+        return self._rows[symbol]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.fields[name]
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame],
+                    fields: Sequence[str] = PANEL_FIELDS) -> 'Panel':
+        """由每个币种一个 DataFrame 构建面板，时间索引取并集"""
+        times = {}
+        for symbol, df in frames.items():
+            t = pd.to_datetime(df['open_time']).to_numpy(dtype='M8[ns]')
+            times[symbol] = t
+        timestamps = np.unique(np.concatenate(list(times.values()))) if times else np.empty(0, 'M8[ns]')
+
+        n_symbols, n_bars = len(frames), len(timestamps)
+        mask = np.zeros((n_symbols, n_bars), dtype=bool)
+        arrays = {name: np.full((n_symbols, n_bars), np.nan) for name in fields}
+        for i, (symbol, df) in enumerate(frames.items()):
+            # 同一时间重复的K线保留最后一根
+            pos = np.searchsorted(timestamps, times[symbol])
+            mask[i, pos] = True
+            for name in fields:
+                arrays[name][i, pos] = df[name].to_numpy(dtype=float)
+        return cls(timestamps, list(frames), arrays, mask)
+
+    @classmethod
+    def from_store(cls, store, symbols: Sequence[str], interval: str, start=None, end=None,
+                   fields: Sequence[str] = PANEL_FIELDS) -> 'Panel':
+        """从 MarketStore 读取多个币种构建面板"""
+        frames = {symbol: store.load(symbol, interval, start, end, columns=list(fields))
+                  for symbol in symbols}
+        return cls.from_frames(frames, fields)
+
+    def forward_filled(self, name: str) -> np.ndarray:
+        """每个位置之前(含)最近一根存在的K线的字段值"""
+        values = self.fields[name]
+        idx = np.where(self.mask, np.arange(values.shape[1]), -1)
+        idx = np.maximum.accumulate(idx, axis=1)
+        filled = np.take_along_axis(values, np.maximum(idx, 0), axis=1)
+        filled[idx < 0] = np.nan
+        return filled
+
+    def changes(self, name: str = 'close') -> np.ndarray:
+        """
+        百分比涨跌幅，相对同一币种上一根存在的K线
+        与对单个币种 DataFrame 做 pct_change()*100 一致，缺失位置为 NaN
+        """
+        values = self.fields[name]
+        prev = np.full_like(values, np.nan)
+        prev[:, 1:] = self.forward_filled(name)[:, :-1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            change = (values / prev - 1) * 100
+        change[~self.mask] = np.nan
+        return change
+
+    def short_signals(self, benchmark: str, symbols: Optional[List[str]] = None,
+                      change: Optional[np.ndarray] = None, **params) -> np.ndarray:
+        """
+        一次批量计算所有币种相对 benchmark 的做空信号
+        每个币种使用与 benchmark 同时存在的K线(与 _prepare_data 的 inner merge 一致，并去掉第一行)
+        返回 symbols × bars 的布尔矩阵，不参与计算的位置为 False
+        """
+        if change is None:
+            change = self.changes('close')
+        symbols = [s for s in (symbols or self.symbols) if s != benchmark]
+        rows = np.array([self.row(s) for s in symbols], dtype=np.int64)
+        bench = self.row(benchmark)
+
+        joint = self.mask[rows] & self.mask[bench]
+        # 每个币种第一根共同K线对应 _prepare_data 中被丢弃的第一行
+        first = joint.argmax(axis=1)
+        has_any = joint.any(axis=1)
+        joint[np.flatnonzero(has_any), first[has_any]] = False
+
+        sym_idx, bar_idx = np.nonzero(joint)
+        lengths = np.bincount(sym_idx, minlength=len(rows))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        segment_start = np.repeat(starts, lengths)
+
+        wld = change[rows[sym_idx], bar_idx]
+        btc = change[bench, bar_idx]
+        flat, _ = SignalEngine.compute(wld, btc, wld > btc, segment_start=segment_start, **params)
+
+        signals = np.zeros((len(self.symbols), self.shape[1]), dtype=bool)
+        signals[rows[sym_idx], bar_idx] = flat
+        return signals
+
+    def signal_frame(self, signals: np.ndarray) -> pd.DataFrame:
+        """信号矩阵转为以时间为索引、币种为列的 DataFrame"""
+        return pd.DataFrame(signals.T, index=pd.DatetimeIndex(self.timestamps, name='open_time'),
+                            columns=self.symbols)
@@ -0,0 +1,295 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .account import MockAccount, OrderSide
+from .analytics import Performance
+from .backtest import BackTest, TimeFrame
+from .kernel import ExecutionKernel, TRADE_DTYPE, cap_loss, liquidation_price
+from .panel import Panel
+
+# 组合回测的成交记录，symbol 为 Panel.symbols 中的下标，其余字段同 TRADE_DTYPE
+PORTFOLIO_TRADE_DTYPE = np.dtype([('symbol', np.int32)] + TRADE_DTYPE.descr)
+
+
+@dataclass
+class PortfolioResult:
+    trades: np.ndarray          # PORTFOLIO_TRADE_DTYPE，按开仓K线、币种排序
+    equity: np.ndarray          # 每根K线收盘时的权益(余额 + 全部持仓按收盘价计的浮动盈亏)
+    balance: np.ndarray         # 每根K线的已实现余额
+    margin: np.ndarray          # 每根K线占用的保证金
+    gross_exposure: np.ndarray  # 每根K线持仓名义价值之和(按收盘价)
+    positions: np.ndarray       # 每根K线的持仓数
+    rejected: int               # 因可用余额、杠杆或持仓数上限被拒绝的信号数
+
+
+class PortfolioEngine:
+    """
+    多币种共用保证金的组合回测，只做空，单个币种的成交规则与 ExecutionKernel.run_short 一致：
+    止损为该币种前一根K线最高价，同一根K线同时触及时止损优先，持仓期间忽略该币种的新信号
+    保证金检查与 ExecutionKernel 的 liquidation=True 规则相同(见 kernel.py 开头的说明)，
+    liquidation=True 时同样按强平价强平、单笔亏损不超过保证金；每个开仓信号在K线收盘时检查：
+      - 已实现余额 - 已占用保证金 足以支付 position_value + 开仓手续费
+      - 给出 max_leverage 时，持仓名义价值之和不超过 max_leverage 倍权益(按收盘价)
+      - 持仓数不超过 max_positions
+    同一根K线上的多个信号按 Panel.symbols 的顺序依次占用额度；单币种时结果与 BackTest 一致
+    只对有信号的K线做一次 Python 循环，逐K线的权益在最后对 symbols × bars 面板一次性计算
+    """
+
+    @staticmethod
+    def _padded(values: np.ndarray, fill: float) -> np.ndarray:
+        """每行末尾补一列哨兵后展平，使单币种的向前探测不会越过本行"""
+        n_symbols, n_bars = values.shape
+        padded = np.full((n_symbols, n_bars + 1), fill)
+        padded[:, :n_bars] = values
+        return padded.ravel()
+
+    @staticmethod
+    def run_short(panel: Panel, signals: np.ndarray, fee_rate: float, position_value: float,
+                  leverage: float, initial_balance: float, tp_multiple: float = 2.0,
+                  max_leverage: Optional[float] = None,
+                  max_positions: Optional[int] = None, liquidation: bool = False) -> PortfolioResult:
+        n_symbols, n_bars = panel.shape
+        width = n_bars + 1
+        close = panel.forward_filled('close')
+        prev_high = np.full((n_symbols, n_bars), np.nan)
+        prev_high[:, 1:] = panel.forward_filled('high')[:, :-1]
+        if max_positions is None:
+            max_positions = n_symbols
+
+        # 候选开仓点，按K线、币种排序；没有前一根K线的位置不参与
+        sym, bars = np.nonzero(np.asarray(signals, dtype=bool) & panel.mask)
+        order = np.lexsort((sym, bars))
+        sym, bars = sym[order], bars[order]
+        keep = ~np.isnan(prev_high[sym, bars])
+        sym, bars = sym[keep], bars[keep]
+        stop = prev_high[sym, bars]
+        entry = panel['close'][sym, bars]
+        tp = entry - ((stop - entry) * tp_multiple)
+        effective_stop = np.minimum(stop, liquidation_price(entry, leverage)) if liquidation else stop
+        size = (position_value * leverage) / entry
+        notional = position_value * leverage
+        entry_fee = entry * size * fee_rate
+
+        # 每行末尾的哨兵最高价为 inf，探测到它表示到数据结尾都没有平仓
+        high = PortfolioEngine._padded(panel['high'], np.inf)
+        low = PortfolioEngine._padded(panel['low'], np.nan)
+        flat_entries = sym.astype(np.int64) * width + bars
+        flat_exits = ExecutionKernel._candidate_exits(high, low, flat_entries, effective_stop, tp)
+        exit_bar = np.where(flat_exits >= 0, flat_exits - sym.astype(np.int64) * width, -2)
+        pnl = np.zeros(len(sym))
+        exit_price = np.full(len(sym), np.nan)
+        liquidated = np.zeros(len(sym), dtype=bool)
+
+        def settle(taken: np.ndarray):
+            """补齐探测范围外的平仓位置，计算平仓价和盈亏(含平仓手续费，liquidation=True 时亏损不超过保证金)"""
+            for c in taken[exit_bar[taken] == -2].tolist():
+                found = ExecutionKernel._first_exit(high, low, int(flat_entries[c]), effective_stop[c], tp[c])
+                exit_bar[c] = found - sym[c] * width
+            exit_bar[taken[exit_bar[taken] >= n_bars]] = -1
+            closed = taken[exit_bar[taken] >= 0]
+            stop_hit = panel['high'][sym[closed], exit_bar[closed]] >= effective_stop[closed]
+            exit_price[closed] = np.where(stop_hit, effective_stop[closed], tp[closed])
+            liquidated[closed] = stop_hit & (effective_stop[closed] < stop[closed])
+            pnl[closed] = (exit_price[closed] - entry[closed]) * size[closed] * -1 \
+                - exit_price[closed] * size[closed] * fee_rate
+            if liquidation:
+                pnl[closed] = cap_loss(pnl[closed], position_value)
+
+        busy_until = np.full(n_symbols, -1, dtype=np.int64)  # 各币种当前持仓的平仓K线，持有到结尾为 n_bars
+        open_ = np.empty(0, dtype=np.int64)
+        accepted = []
+        balance = initial_balance
+        rejected = 0
+        bounds = np.flatnonzero(np.diff(bars, prepend=-1, append=n_bars + 1))
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            t = int(bars[lo])
+            if len(open_):
+                done = (exit_bar[open_] >= 0) & (exit_bar[open_] <= t)
+                balance += float(pnl[open_[done]].sum())
+                open_ = open_[~done]
+            group = np.arange(lo, hi)
+            group = group[busy_until[sym[group]] < t]
+            if len(group) == 0:
+                continue
+
+            # 按顺序占用可用余额：第 j 个信号要求前 j 个的 保证金 + 手续费 之和不超过可用余额
+            free = balance - len(open_) * position_value
+            k = min(max_positions - len(open_),
+                    int(np.count_nonzero(np.cumsum(position_value + entry_fee[group]) <= free)))
+            if max_leverage is not None:
+                marks = close[sym[open_], t]
+                equity = balance + float((entry[open_] - marks) @ size[open_])
+                gross = float(marks @ size[open_])
+                k = min(k, int(np.floor((max_leverage * equity - gross)
+                                        / (notional + max_leverage * entry_fee[group].max()))))
+            k = max(k, 0)
+            rejected += len(group) - k
+            if k == 0:
+                continue
+            taken = group[:k]
+            settle(taken)
+            balance -= float(entry_fee[taken].sum())
+            busy_until[sym[taken]] = np.where(exit_bar[taken] >= 0, exit_bar[taken], n_bars)
+            open_ = np.concatenate((open_, taken))
+            accepted.append(taken)
+
+        taken = np.concatenate(accepted) if accepted else np.empty(0, dtype=np.int64)
+        trades = np.zeros(len(taken), dtype=PORTFOLIO_TRADE_DTYPE)
+        trades['symbol'] = sym[taken]
+        trades['entry_idx'] = bars[taken]
+        trades['exit_idx'] = exit_bar[taken]
+        trades['size'] = size[taken]
+        trades['entry_price'] = entry[taken]
+        trades['stop_loss'] = stop[taken]
+        trades['take_profit'] = tp[taken]
+        trades['exit_price'] = exit_price[taken]
+        trades['entry_fee'] = entry_fee[taken]
+        trades['pnl'] = pnl[taken]
+        trades['liquidated'] = liquidated[taken]
+        return PortfolioEngine.mark_to_market(trades, close, initial_balance, position_value, rejected)
+
+    @staticmethod
+    def mark_to_market(trades: np.ndarray, close: np.ndarray, initial_balance: float,
+                       position_value: float, rejected: int = 0) -> PortfolioResult:
+        """
+        由成交记录一次性计算逐K线的余额和权益
+        close 为前向填充的 symbols × bars 收盘价，持仓区间 [开仓K线, 平仓K线) 内按收盘价计浮动盈亏
+        """
+        n_symbols, n_bars = close.shape
+        closed = trades['exit_idx'] >= 0
+        exit_idx = np.where(closed, trades['exit_idx'], n_bars)
+
+        deltas = np.zeros(n_bars + 1)
+        np.add.at(deltas, trades['entry_idx'], -trades['entry_fee'])
+        np.add.at(deltas, exit_idx, np.where(closed, trades['pnl'], 0.0))
+        balance = initial_balance + np.cumsum(deltas)[:n_bars]
+
+        # 每个币种同一时间最多一个仓位，持仓区间互不重叠，可以直接写进面板
+        lengths = exit_idx - trades['entry_idx']
+        rows = np.repeat(trades['symbol'].astype(np.int64), lengths)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        cols = np.arange(lengths.sum()) - np.repeat(starts - trades['entry_idx'], lengths)
+        size = np.zeros((n_symbols, n_bars))
+        entry = np.zeros((n_symbols, n_bars))
+        size[rows, cols] = np.repeat(trades['size'], lengths)
+        entry[rows, cols] = np.repeat(trades['entry_price'], lengths)
+
+        held = size > 0
+        marks = np.where(held, close, 0.0)
+        unrealized = ((entry - marks) * size).sum(axis=0)
+        return PortfolioResult(
+            trades=trades,
+            equity=balance + unrealized,
+            balance=balance,
+            margin=held.sum(axis=0) * position_value,
+            gross_exposure=(marks * size).sum(axis=0),
+            positions=held.sum(axis=0),
+            rejected=rejected,
+        )
+
+
+class PortfolioBackTest:
+    """
+    用一个共享保证金的 MockAccount 同时回测多个币种
+    signals 为 symbols × bars 的布尔矩阵(如 Panel.short_signals 的结果)
+    """
+
+    def __init__(self, account: MockAccount, risk_free_rate: float = 0.03, tp_multiple: float = 2.0,
+                 max_leverage: Optional[float] = None, max_positions: Optional[int] = None):
+        self.account = account
+        self.risk_free_rate = risk_free_rate
+        self.tp_multiple = tp_multiple
+        self.max_leverage = max_leverage    # 持仓名义价值/权益的上限，默认只受保证金限制
+        self.max_positions = max_positions  # 同时持仓数上限，默认不限
+        self.result: Optional[PortfolioResult] = None
+        self.performance: Optional[Performance] = None
+        self.symbols = []
+
+    def _apply_result(self, panel: Panel, result: PortfolioResult):
+        """把组合结果写回 MockAccount，未平仓的仓位按最后收盘价计浮动盈亏"""
+        account = self.account
+        trades = result.trades
+        times = panel.timestamps
+        closed = trades['exit_idx'] >= 0
+        close_times = np.full(len(trades), np.datetime64('NaT'), dtype='M8[ns]')
+        close_times[closed] = times[trades['exit_idx'][closed]]
+        names = np.asarray(panel.symbols, dtype=object)[trades['symbol']]
+
+        start = account.orders.extend(
+            symbol=names,
+            side=OrderSide.SHORT,
+            size=trades['size'],
+            entry_price=trades['entry_price'],
+            stop_loss=trades['stop_loss'],
+            take_profit=trades['take_profit'],
+            open_time=times[trades['entry_idx']],
+            close_time=close_times,
+            close_price=trades['exit_price'],
+            pnl=np.where(closed, trades['pnl'], 0.0)
+        )
+        for i in np.flatnonzero(~closed).tolist():
+            account.positions[names[i]] = account.position_for(account.orders[start + i])
+        last_close = panel.forward_filled('close')[:, -1]
+        account.mark_to_market({symbol: float(last_close[i]) for i, symbol in enumerate(panel.symbols)})
+
+        account.balance = float(result.balance[-1])
+        peaks = np.maximum.accumulate(np.maximum(result.equity, account.equity_peak))
+        account.equity_peak = float(peaks[-1])
+        account.max_drawdown = max(account.max_drawdown, float(((peaks - result.equity) / peaks).max()))
+        account.daily_balance.extend(times[1:], result.equity[1:])
+
+    def run(self, panel: Panel, signals: np.ndarray, timeframe: TimeFrame = TimeFrame.HOUR) -> Dict:
+        """组合回测入口，返回与 BackTest.run 相同的指标，另加组合相关的几项"""
+        if panel.shape[1] == 0:
+            raise ValueError("empty panel")
+        account = self.account
+        result = PortfolioEngine.run_short(
+            panel, signals,
+            fee_rate=account.fee_rate,
+            position_value=account.fixed_position_value,
+            leverage=account.leverage,
+            initial_balance=account.balance,
+            tp_multiple=self.tp_multiple,
+            max_leverage=self.max_leverage,
+            max_positions=self.max_positions,
+            liquidation=account.liquidation
+        )
+        self.result = result
+        self.symbols = list(panel.symbols)
+        self._apply_result(panel, result)
+
+        backtest = BackTest(account, risk_free_rate=self.risk_free_rate, tp_multiple=self.tp_multiple)
+        metrics = backtest.generate_performance_metrics(timeframe)
+        self.performance = backtest.performance
+        equity = np.maximum(result.equity, 1e-12)
+        metrics.update({
+            "Final Equity": float(result.equity[-1]),
+            "Symbols Traded": int(len(np.unique(result.trades['symbol']))),
+            "Max Concurrent Positions": int(result.positions.max()),
+            "Peak Margin Used": float(result.margin.max()),
+            "Max Gross Leverage": f"{(result.gross_exposure / equity).max():.2f}",
+            "Rejected Signals": result.rejected,
+        })
+        return metrics
+
+    def symbol_stats(self) -> pd.DataFrame:
+        """每个币种的交易数、已平仓数、胜率和净盈亏(扣除开平仓手续费)"""
+        if self.result is None:
+            raise RuntimeError("run() first")
+        trades = self.result.trades
+        n = len(self.symbols)
+        closed = trades['exit_idx'] >= 0
+        net = np.where(closed, trades['pnl'], 0.0) - trades['entry_fee']
+        count = np.bincount(trades['symbol'], minlength=n)
+        closed_count = np.bincount(trades['symbol'], weights=closed, minlength=n)
+        wins = np.bincount(trades['symbol'], weights=closed & (trades['pnl'] > 0), minlength=n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            win_rate = wins / closed_count
+        return pd.DataFrame({
+            'trades': count,
+            'closed': closed_count.astype(np.int64),
+            'win_rate': win_rate,
+            'net_pnl': np.bincount(trades['symbol'], weights=net, minlength=n),
+        }, index=pd.Index(self.symbols, name='symbol'))
@@ -0,0 +1,275 @@
+import os
+from multiprocessing import Pool
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .account import MockAccount
+from .analytics import Analytics, Performance
+from .backtest import TimeFrame
+from .resample import annualization_factor
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
+
+MAX_POINTS = 5000     # 曲线降采样后的最大点数
+KDE_LIMIT = 50000     # 样本数超过该值时直方图不再叠加核密度曲线
+BAR_LIMIT = 2000      # 交易数超过该值时每笔盈亏改用竖线绘制
+
+
+def _pyplot(headless: bool = True):
+    """按需导入 pyplot，headless 时切到 Agg 后端离屏渲染，不需要显示器"""
+    import matplotlib
+    if headless:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留点的下标
+    首尾两点固定保留，中间分成 threshold-2 个桶，每桶保留与前一选中点、下一桶均值构成三角形面积最大的点，
+    峰谷等形状特征因此得以保留
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 桶边界，最后补一个 n 使最后一个桶的"下一桶"只包含最后一个点
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.int64), n)
+
+    # 每个桶的均值用累积和一次算出
+    csx = np.concatenate(([0.0], np.cumsum(x)))
+    csy = np.concatenate(([0.0], np.cumsum(y)))
+    counts = edges[1:] - edges[:-1]
+    avg_x = (csx[edges[1:]] - csx[edges[:-1]]) / counts
+    avg_y = (csy[edges[1:]] - csy[edges[:-1]]) / counts
+
+    out = np.empty(threshold, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+class BacktestVisualizer:
+    """
+    回测报告，绘图库在生成报告时才导入
+    保存到文件时用 Agg 后端离屏渲染；权益和回撤曲线用 LTTB 降采样到 max_points 个点
+    """
+
+    def __init__(self, account: MockAccount, timeframe: TimeFrame, risk_free_rate: float = 0.03,
+                 max_points: int = MAX_POINTS, dpi: int = 150):
+        self.account = account
+        self.timeframe = timeframe
+        self.risk_free_rate = risk_free_rate
+        self.max_points = max_points
+        self.dpi = dpi
+        self._performance = None
+
+        # 时间框架相关的标签
+        self.time_labels = {
+            TimeFrame.DAY: 'Daily',
+            TimeFrame.HOUR: 'Hourly',
+            TimeFrame.FOUR_HOUR: '4-Hour'
+        }
+        self.time_label = self.time_labels.get(timeframe, str(getattr(timeframe, 'value', timeframe)))
+
+    def _prepare_trade_data(self) -> pd.DataFrame:
+        """准备交易数据用于可视化"""
+        closed = self.account.orders.closed()
+        if len(closed) == 0:
+            return pd.DataFrame()
+        return pd.DataFrame({
+            'entry_time': closed['open_time'],
+            'exit_time': closed['close_time'],
+            'entry_price': closed['entry_price'],
+            'exit_price': closed['close_price'],
+            'pnl': closed['pnl'],
+            'holding_time': (closed['close_time'] - closed['open_time']) / np.timedelta64(1, 's') / 3600,
+        })
+
+    def _downsample(self, times: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        idx = lttb(times.view(np.int64), values, self.max_points)
+        return times[idx], values[idx]
+
+    def _histogram(self, ax: "Axes", values, bins: int, color: str) -> None:
+        """样本较少时用 seaborn 叠加核密度，样本很多时只画直方图"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) <= KDE_LIMIT:
+            import seaborn as sns
+            sns.histplot(data=values, bins=bins, kde=True, ax=ax, color=color)
+        else:
+            ax.hist(values, bins=bins, color=color, alpha=0.6)
+
+    def plot_equity_curve(self, ax: "Axes") -> None:
+        """绘制权益曲线"""
+        times, values = self._downsample(self.account.daily_balance.times,
+                                         self.account.daily_balance.values)
+        ax.plot(times, values, linewidth=2, color='blue')
+        ax.set_title(f'{self.time_label} Balance History')
+        ax.set_ylabel('Balance (USDT)')
+        ax.grid(True)
+
+    def plot_drawdown(self, ax: "Axes") -> None:
+        """绘制回撤曲线"""
+        times, drawdown = self._downsample(self.account.daily_balance.times,
+                                           self.performance.drawdown * 100)
+        ax.fill_between(times, drawdown, color='red', alpha=0.3)
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.set_title('Drawdown (%)')
+        ax.set_ylabel('Drawdown %')
+        ax.grid(True)
+
+    def plot_returns_distribution(self, ax: "Axes") -> None:
+        """绘制收益分布"""
+        self._histogram(ax, self.performance.returns * 100, bins=30, color='blue')
+        ax.set_title(f'{self.time_label} Returns Distribution')
+        ax.set_xlabel('Return (%)')
+        ax.grid(True)
+
+    def plot_pnl_distribution(self, trades: pd.DataFrame, ax: "Axes") -> None:
+        """绘制盈亏分布"""
+        self._histogram(ax, trades['pnl'], bins=20, color='blue')
+        ax.set_title('PnL Distribution')
+        ax.set_xlabel('PnL (USDT)')
+
+    def plot_holding_time_distribution(self, trades: pd.DataFrame, ax: "Axes") -> None:
+        """绘制持仓时间分布"""
+        self._histogram(ax, trades['holding_time'], bins=20, color='green')
+        ax.set_title('Holding Time Distribution')
+        ax.set_xlabel(f'Holding Time ({self.time_label})')
+
+    def plot_cumulative_pnl(self, trades: pd.DataFrame, ax: "Axes") -> None:
+        """绘制累计盈亏"""
+        cumulative_pnl = trades['pnl'].cumsum().to_numpy()
+        idx = lttb(np.arange(len(cumulative_pnl)), cumulative_pnl, self.max_points)
+        ax.plot(idx, cumulative_pnl[idx], color='purple')
+        ax.set_title('Cumulative PnL')
+        ax.set_xlabel('Trade Number')
+        ax.set_ylabel('Cumulative PnL (USDT)')
+
+    def plot_trade_pnl(self, trades: pd.DataFrame, ax: "Axes") -> None:
+        """绘制每笔交易盈亏"""
+        pnl = trades['pnl'].to_numpy()
+        colors = np.where(pnl > 0, 'green', 'red')
+        if len(pnl) <= BAR_LIMIT:
+            ax.bar(np.arange(len(pnl)), pnl, color=colors)
+        else:
+            # 每根柱子是一个 Rectangle，交易很多时改成一个 LineCollection
+            ax.vlines(np.arange(len(pnl)), 0, pnl, colors=colors, linewidth=0.5)
+        ax.set_title('PnL per Trade')
+        ax.set_xlabel('Trade Number')
+        ax.set_ylabel('PnL (USDT)')
+
+    def add_performance_stats(self, fig: "Figure") -> None:
+        """添加性能统计信息"""
+        perf = self.performance
+
+        stats_text = (
+            f'Initial Balance: ${self.account.initial_balance:.2f}\n'
+            f'Final Balance: ${self.account.balance:.2f}\n'
+            f'Total Return: {perf.total_return*100:.2f}%\n'
+            f'Max Drawdown: {self.account.max_drawdown*100:.2f}%\n'
+            f'Sharpe Ratio: {perf.sharpe_ratio:.2f}\n'
+            f'Sortino Ratio: {perf.sortino_ratio:.2f}\n'
+            f'Calmar Ratio: {perf.calmar_ratio:.2f}\n'
+            f'Profit Factor: {perf.profit_factor:.2f}\n'
+            f'Exposure: {perf.exposure*100:.2f}%\n'
+            f'Win Rate: {self.calculate_win_rate():.2f}%'
+        )
+        fig.text(0.15, 0.95, stats_text, fontsize=10, verticalalignment='top',
+                bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+
+    @property
+    def performance(self) -> Performance:
+        """指标只计算一次，供统计文字和各图表共用"""
+        if self._performance is None:
+            self._performance = Analytics.from_account(self.account, self.timeframe, self.risk_free_rate)
+        return self._performance
+
+    def calculate_win_rate(self) -> float:
+        """计算胜率(按已平仓交易)"""
+        perf = self.performance
+        if perf.closed_trades == 0:
+            return 0.0
+        return (perf.winning_trades / perf.closed_trades) * 100
+
+    def calculate_sharpe_ratio(self, returns: pd.Series) -> float:
+        """计算夏普比率"""
+        returns = np.asarray(pd.Series(returns).dropna(), dtype=np.float64)
+        return Analytics.sharpe_ratio(returns, annualization_factor(self.timeframe), self.risk_free_rate)
+
+    def generate_report(self, save_path: Optional[str] = None) -> List[str]:
+        """
+        生成完整的视觉报告
+        指定 save_path 时离屏渲染并保存为 {save_path}_performance.png / {save_path}_trades.png，返回文件路径；
+        否则弹出窗口显示
+        """
+        plt = _pyplot(headless=save_path is not None)
+        style = 'seaborn-v0_8-darkgrid' if 'seaborn-v0_8-darkgrid' in plt.style.available else 'default'
+        figures = []
+        with plt.style.context(style):
+            # 创建主要性能图表
+            fig1, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(12, 15))
+            self.plot_equity_curve(ax1)
+            self.plot_drawdown(ax2)
+            self.plot_returns_distribution(ax3)
+            self.add_performance_stats(fig1)
+            figures.append(('performance', fig1))
+
+            # 创建交易分析图表
+            trades = self._prepare_trade_data()
+            if len(trades) > 0:
+                fig2, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
+                self.plot_pnl_distribution(trades, ax1)
+                self.plot_holding_time_distribution(trades, ax2)
+                self.plot_cumulative_pnl(trades, ax3)
+                self.plot_trade_pnl(trades, ax4)
+                fig2.tight_layout()
+                figures.append(('trades', fig2))
+
+        if save_path is None:
+            plt.show()
+            return []
+        os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+        paths = []
+        for name, fig in figures:
+            path = f'{save_path}_{name}.png'
+            fig.savefig(path, dpi=self.dpi, bbox_inches='tight')
+            plt.close(fig)
+            paths.append(path)
+        return paths
+
+
+def render_report(account: MockAccount, timeframe: TimeFrame, save_path: str, **kwargs) -> List[str]:
+    """离屏渲染一份报告并保存，返回生成的文件"""
+    return BacktestVisualizer(account, timeframe, **kwargs).generate_report(save_path)
+
+
+def _render_job(job: Tuple) -> List[str]:
+    account, timeframe, save_path, kwargs = job
+    return render_report(account, timeframe, save_path, **kwargs)
+
+
+def render_reports(jobs: Sequence[Tuple[MockAccount, TimeFrame, str]], workers: Optional[int] = None,
+                   **kwargs) -> List[List[str]]:
+    """在进程池上并行渲染多份报告，jobs 为 (account, timeframe, save_path)"""
+    jobs = [(account, timeframe, save_path, kwargs) for account, timeframe, save_path in jobs]
+    if not jobs:
+        return []
+    workers = min(workers or os.cpu_count(), len(jobs))
+    if workers == 1:
+        return [_render_job(job) for job in jobs]
+    with Pool(processes=workers) as pool:
+        return pool.map(_render_job, jobs, chunksize=1)
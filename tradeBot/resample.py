@@ -0,0 +1,182 @@
+import re
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# 各列的聚合方式，未列出的数值列取桶内第一个有效值
+AGGREGATIONS = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+    'quote_volume': 'sum',
+    'count': 'sum',
+    'taker_buy_volume': 'sum',
+    'taker_buy_quote_volume': 'sum',
+    'close_time': 'last',
+}
+
+# 兼容 TimeFrame 枚举值和 Strategy 使用的字符串
+TIMEFRAME_ALIASES = {
+    'hour': '1h',
+    '4hour': '4h',
+    'day': '1d',
+}
+
+# 区分大小写：Binance 的 'M' 是月线，长度不固定，不在此表中
+_UNITS = {'m': 'm', 'min': 'm', 'h': 'h', 'H': 'h', 'd': 'D', 'D': 'D', 'w': 'W', 'W': 'W'}
+
+TRADING_DAYS = 252  # 年化按每年252个交易日计算
+
+
+def bar_length(timeframe) -> np.timedelta64:
+    """把 '15m' / '1h' / '4h' / '1d' / '3h' / TimeFrame / Timedelta 解析为K线长度，月线 '1M' 等不固定长度的周期抛 ValueError"""
+    if isinstance(timeframe, np.timedelta64):
+        return timeframe.astype('m8[ns]')
+    if isinstance(timeframe, pd.Timedelta):
+        return timeframe.to_timedelta64()
+    spec = getattr(timeframe, 'value', timeframe)
+    spec = TIMEFRAME_ALIASES.get(spec, spec)
+    match = re.fullmatch(r'(\d+)\s*([a-zA-Z]+)', str(spec).strip())
+    if match and match.group(2) == 'M':
+        raise ValueError(f"Timeframe {timeframe!r} has no fixed bar length")
+    if not match or match.group(2) not in _UNITS:
+        raise ValueError(f"Unknown timeframe: {timeframe!r}")
+    return np.timedelta64(int(match.group(1)), _UNITS[match.group(2)]).astype('m8[ns]')
+
+
+def annualization_factor(timeframe) -> float:
+    """由K线长度推算年化系数，日线为252，小时线为252*24"""
+    seconds = bar_length(timeframe) / np.timedelta64(1, 's')
+    return TRADING_DAYS * 86400 / seconds
+
+
+def _first_valid(values: np.ndarray, starts: np.ndarray, ends: np.ndarray, last: bool) -> np.ndarray:
+    """每个桶内第一个(或最后一个)非 NaN 的值，与 groupby first/last 一致"""
+    n = len(values)
+    valid = ~pd.isna(values)
+    if last:
+        idx = np.maximum.reduceat(np.where(valid, np.arange(n), -1), starts)
+        found = idx >= starts
+    else:
+        idx = np.minimum.reduceat(np.where(valid, np.arange(n), n), starts)
+        found = idx < ends
+    out = values[np.clip(idx, 0, n - 1)]
+    if not found.all():
+        out = out.astype(float) if out.dtype.kind in 'iub' else out.copy()
+        out[~found] = np.nan if out.dtype.kind != 'M' else np.datetime64('NaT')
+    return out
+
+
+def _version(df: pd.DataFrame) -> tuple:
+    """
+    源数据的廉价版本标记：行数、列名、首尾 open_time 和收盘价之和
+    追加、截取、换了数据都会改变标记，不需要对整表做校验和
+    """
+    if len(df) == 0:
+        return 0, tuple(df.columns)
+    times = df['open_time']
+    close = float(df['close'].sum()) if 'close' in df.columns else None
+    return len(df), tuple(df.columns), pd.Timestamp(times.iloc[0]), pd.Timestamp(times.iloc[-1]), close
+
+
+class Resampler:
+    """
+    统一的K线重采样服务
+    按 open_time 向下取整到K线长度分桶，用 reduceat 向量化聚合
+    结果按 (symbol, K线长度) 缓存，同一币种的不同副本(如 Strategy 拿到的 copy 和 BackTest 的原表)
+    只要版本标记相同就共用同一份结果，调用方不要修改返回的 DataFrame
+    不给 symbol 时按 DataFrame 对象缓存，只弱引用源数据，源数据被回收后对应条目随之删除
+    条目数超过 max_entries 时按最近使用淘汰
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._cache: 'OrderedDict[tuple, tuple]' = OrderedDict()   # key -> (源数据弱引用或 None, 版本标记, 结果)
+
+    def clear(self):
+        self._cache.clear()
+
+    def _prune(self):
+        for key in [key for key, entry in self._cache.items() if entry[0] is not None and entry[0]() is None]:
+            del self._cache[key]
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def infer_bar_length(df: pd.DataFrame) -> Optional[np.timedelta64]:
+        """按相邻K线时间差的中位数推断原始K线长度"""
+        times = pd.to_datetime(df['open_time']).to_numpy(dtype='M8[ns]')
+        if len(times) < 2:
+            return None
+        return np.median(np.diff(times).astype(np.int64)).astype('m8[ns]')
+
+    @staticmethod
+    def aggregate(df: pd.DataFrame, timeframe) -> pd.DataFrame:
+        """不带缓存的重采样"""
+        bar = bar_length(timeframe).astype(np.int64)
+        times = pd.to_datetime(df['open_time']).to_numpy(dtype='M8[ns]')
+        buckets = times.astype(np.int64) // bar
+        if len(buckets) == 0:
+            return df.iloc[:0].copy()
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        ends = np.append(starts[1:], len(buckets))
+
+        out = {}
+        for name in df.columns:
+            if name == 'open_time':
+                out[name] = times[starts]
+                continue
+            rule = AGGREGATIONS.get(name, 'first')
+            col = df[name]
+            if pd.api.types.is_datetime64_any_dtype(col):
+                values = col.to_numpy(dtype='M8[ns]')
+            elif pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+                values = col.to_numpy()
+            else:
+                continue
+            if rule == 'first':
+                out[name] = _first_valid(values, starts, ends, last=False)
+            elif rule == 'last':
+                out[name] = _first_valid(values, starts, ends, last=True)
+            elif rule == 'max':
+                out[name] = np.fmax.reduceat(values.astype(float), starts)
+            elif rule == 'min':
+                out[name] = np.fmin.reduceat(values.astype(float), starts)
+            else:
+                summed = np.add.reduceat(np.nan_to_num(values.astype(float)), starts)
+                out[name] = summed.astype(values.dtype) if values.dtype.kind in 'iu' else summed
+        return pd.DataFrame(out)
+
+    def resample(self, df: pd.DataFrame, timeframe, symbol: Optional[str] = None) -> pd.DataFrame:
+        """
+        重采样到 timeframe 并缓存
+        symbol 为空时按 DataFrame 对象缓存；原始数据已经是该周期时直接返回原数据
+        """
+        bar = bar_length(timeframe)
+        key = (symbol if symbol is not None else id(df), int(bar.astype(np.int64)))
+        version = _version(df)
+        entry = self._cache.get(key)
+        if entry is not None:
+            source, cached_version, result = entry
+            if (source is None or source() is df) and cached_version == version:
+                self._cache.move_to_end(key)
+                return result
+
+        base = self.infer_bar_length(df)
+        if base is not None and base >= bar:
+            # 已经是该周期时不缓存，缓存不能持有源数据
+            return df
+        result = self.aggregate(df, bar)
+        self._cache[key] = (weakref.ref(df) if symbol is None else None, version, result)
+        self._cache.move_to_end(key)
+        self._prune()
+        return result
+
+
+# Strategy / BackTest 默认共用的实例
+default_resampler = Resampler()
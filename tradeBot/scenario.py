@@ -0,0 +1,297 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from .account import MockAccount
+from .backtest import BackTest, TimeFrame
+from .kernel import ExecutionKernel, IntrabarResolver, cap_loss
+from .resample import annualization_factor
+
+# 一次广播计算的 场景数 × K线数 上限，超过时按场景分块，控制权益矩阵的内存
+CHUNK_CELLS = 1 << 23
+
+
+@dataclass
+class ScenarioResult:
+    leverage: np.ndarray        # (S,) 各场景的参数
+    position_value: np.ndarray  # (S,)
+    fee_rate: np.ndarray        # (S,)
+    path: np.ndarray            # 共用的开平仓路径(TRADE_DTYPE，size/entry_fee/pnl 为 0)，按同一杠杆计算
+    size: np.ndarray            # S × m 每笔交易的数量
+    entry_fee: np.ndarray       # S × m
+    pnl: np.ndarray             # S × m 平仓净盈亏(含平仓手续费)，未平仓为 0
+    active: np.ndarray          # S × m 实际成交的交易，保证金不足之后的为 False
+    equity: np.ndarray          # S × n 每根K线处理完后的余额，与 KernelResult.equity 一致
+    balance: np.ndarray         # (S,)
+    equity_peak: np.ndarray     # (S,)
+    max_drawdown: np.ndarray    # (S,) 与 MockAccount 一致，只在平仓时更新
+
+
+class ScenarioEngine:
+    """
+    同一条开平仓路径上批量计算多组 杠杆 × 仓位价值 × 手续费 的账户结果
+    开平仓位置只取决于行情、信号和 tp_multiple，用 ExecutionKernel.short_path 算一次，
+    各场景的数量、手续费、盈亏、余额曲线和指标都是 场景 × 交易/K线 的广播计算，
+    每个场景的结果与单独调用 ExecutionKernel.run_short 逐位一致
+    liquidation=True 时使用与 ExecutionKernel 相同的保证金和强平规则(见 kernel.py 开头的说明)：
+    强平价取决于杠杆，路径需按杠杆分别计算；单笔亏损不超过 position_value；
+    开仓前余额小于 position_value + 开仓手续费时拒绝开仓，之后空仓、余额不变，
+    后续信号同样被拒绝，所以每个场景只是在路径上的某一笔交易处截断
+    """
+
+    @staticmethod
+    def grid(leverage: Sequence[float], position_value: Sequence[float],
+             fee_rate: Sequence[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """参数网格展开为三个等长数组，杠杆变化最慢、手续费变化最快"""
+        lev, pv, fee = np.meshgrid(np.atleast_1d(np.asarray(leverage, dtype=np.float64)),
+                                   np.atleast_1d(np.asarray(position_value, dtype=np.float64)),
+                                   np.atleast_1d(np.asarray(fee_rate, dtype=np.float64)), indexing='ij')
+        return lev.ravel(), pv.ravel(), fee.ravel()
+
+    @staticmethod
+    def run_short(path: np.ndarray, n_bars: int, leverage: np.ndarray, position_value: np.ndarray,
+                  fee_rate: np.ndarray, initial_balance: float, equity_peak: float = None,
+                  max_drawdown: float = 0.0, liquidation: bool = False) -> ScenarioResult:
+        """
+        path 为 ExecutionKernel.short_path 的结果，其余参数为 (S,) 数组
+        liquidation=True 时 path 应为 short_path(..., leverage=L) 的结果，leverage 中的值都等于 L
+        """
+        leverage = np.asarray(leverage, dtype=np.float64)
+        position_value = np.asarray(position_value, dtype=np.float64)
+        fee = np.asarray(fee_rate, dtype=np.float64)[:, None]
+        if equity_peak is None:
+            equity_peak = initial_balance
+        n_scenarios, m = len(leverage), len(path)
+
+        # 运算顺序与 ExecutionKernel.run_short 相同，保证逐位一致
+        entry_price = path['entry_price'][None, :]
+        size = (position_value * leverage)[:, None] / entry_price
+        entry_fee = entry_price * size * fee
+        closed = path['exit_idx'] >= 0
+        exit_price = path['exit_price'][None, closed]
+        closed_size = size[:, closed]
+        pnl = np.zeros((n_scenarios, m))
+        pnl[:, closed] = (exit_price - entry_price[:, closed]) * closed_size * -1 - exit_price * closed_size * fee
+
+        if liquidation:
+            pnl[:, closed] = cap_loss(pnl[:, closed], position_value[:, None])
+            before = initial_balance + np.concatenate(
+                (np.zeros((n_scenarios, 1)), np.cumsum(pnl - entry_fee, axis=1)[:, :-1]), axis=1)
+            active = np.logical_and.accumulate(~(before < position_value[:, None] + entry_fee), axis=1) \
+                if m else np.zeros((n_scenarios, 0), dtype=bool)
+        else:
+            active = np.ones((n_scenarios, m), dtype=bool)
+
+        # 资金变动按 开仓手续费、平仓盈亏 交替排列，被拒绝的交易记为 0
+        event_bars = np.empty(m * 2, dtype=np.int64)
+        event_bars[0::2] = path['entry_idx']
+        event_bars[1::2] = np.where(closed, path['exit_idx'], n_bars)
+        event_values = np.empty((n_scenarios, m * 2))
+        event_values[:, 0::2] = np.where(active, -entry_fee, 0.0)
+        event_values[:, 1::2] = np.where(active, pnl, 0.0)
+        keep = event_bars < n_bars
+        is_close = np.zeros(m * 2, dtype=bool)
+        is_close[1::2] = True
+        is_close = is_close[keep]
+        close_active = np.repeat(active, 2, axis=1)[:, keep][:, is_close]
+
+        balances = np.cumsum(np.concatenate((np.full((n_scenarios, 1), float(initial_balance)),
+                                             event_values[:, keep]), axis=1), axis=1)
+        equity = balances[:, np.searchsorted(event_bars[keep], np.arange(n_bars), side='right')]
+
+        # 峰值和最大回撤只在实际成交的平仓处更新
+        close_balances = balances[:, 1:][:, is_close]
+        peaks = np.maximum.accumulate(np.concatenate(
+            (np.full((n_scenarios, 1), float(equity_peak)),
+             np.where(close_active, close_balances, -np.inf)), axis=1), axis=1)[:, 1:]
+        drawdowns = np.where(close_active, (peaks - close_balances) / np.where(close_active, peaks, 1.0), -np.inf)
+        peak = peaks[:, -1] if peaks.shape[1] else np.full(n_scenarios, float(equity_peak))
+        worst = drawdowns.max(axis=1) if drawdowns.shape[1] else np.full(n_scenarios, -np.inf)
+
+        return ScenarioResult(
+            leverage=leverage,
+            position_value=position_value,
+            fee_rate=fee[:, 0],
+            path=path,
+            size=size,
+            entry_fee=entry_fee,
+            pnl=pnl,
+            active=active,
+            equity=equity,
+            balance=balances[:, -1],
+            equity_peak=peak,
+            max_drawdown=np.maximum(max_drawdown, worst),
+        )
+
+    @staticmethod
+    def _drawdowns(times: np.ndarray, values: np.ndarray, initial_balance: float):
+        """Analytics.drawdowns 的逐行版本，返回 (最大回撤, 平均回撤, 最长水下小时数)"""
+        n_scenarios, length = values.shape
+        if length == 0:
+            zeros = np.zeros(n_scenarios)
+            return zeros, zeros, zeros
+        peaks = np.maximum(np.maximum.accumulate(values, axis=1), initial_balance)
+        drawdown = (peaks - values) / peaks
+        padded = np.zeros((n_scenarios, length + 2), dtype=np.int8)
+        padded[:, 1:-1] = drawdown > 0
+        edges = np.diff(padded, axis=1)
+        rows, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        avg = np.zeros(n_scenarios)
+        longest = np.zeros(n_scenarios)
+        if len(starts):
+            # 区间外的回撤为 0，按扁平下标分段取最大值不会受相邻区间影响
+            episode_max = np.maximum.reduceat(drawdown.ravel(), rows * length + starts)
+            counts = np.bincount(rows, minlength=n_scenarios)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                avg = np.where(counts > 0, np.bincount(rows, episode_max, n_scenarios) / counts, 0.0)
+            durations = (times[np.minimum(ends, length - 1)] - times[np.maximum(starts - 1, 0)]) \
+                / np.timedelta64(1, 's') / 3600
+            np.maximum.at(longest, rows, durations)
+        return drawdown.max(axis=1), avg, longest
+
+    @staticmethod
+    def performance(result: ScenarioResult, curve_times: np.ndarray, trade_times: np.ndarray,
+                    timeframe, initial_balance: float, risk_free_rate: float = 0.03) -> pd.DataFrame:
+        """
+        各场景的 generate_performance_metrics 指标(数值，比例为小数)，每行一个场景
+        curve_times 为权益曲线的时间(与 BackTest 写入 daily_balance 的一致)，trade_times 为K线开盘时间
+        """
+        factor = annualization_factor(timeframe)
+        times = np.asarray(curve_times, dtype='M8[ns]')[1:]
+        values = result.equity[:, 1:]
+        final = result.balance
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = values[:, 1:] / values[:, :-1] - 1
+            if returns.shape[1] >= 2:
+                mean = returns.mean(axis=1) * factor
+                std = returns.std(axis=1, ddof=1) * np.sqrt(factor)
+                downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2, axis=1)) * np.sqrt(factor)
+                sharpe = np.where(std != 0, (mean - risk_free_rate) / std, 0.0)
+                sortino = np.where(downside != 0, (mean - risk_free_rate) / downside, 0.0)
+            else:
+                sharpe = sortino = np.full(len(final), np.nan)
+            curve_dd, avg_dd, dd_hours = ScenarioEngine._drawdowns(times, values, initial_balance)
+            years = returns.shape[1] / factor
+            annual = np.where((final > 0) & (years > 0),
+                              (final / initial_balance) ** (1 / years if years > 0 else 0.0) - 1, np.nan)
+            calmar = np.where(curve_dd > 0, annual / curve_dd, np.nan)
+
+        # 成交统计，被拒绝的交易不计入
+        path = result.path
+        trade_times = np.asarray(trade_times, dtype='M8[ns]')
+        closed = path['exit_idx'] >= 0
+        done = result.active & closed[None, :]
+        pnl = np.where(done, result.pnl, 0.0)
+        opened = trade_times[path['entry_idx']]
+        holding = np.zeros(len(path))
+        holding[closed] = (trade_times[path['exit_idx'][closed]] - opened[closed]) / np.timedelta64(1, 's') / 3600
+        total = result.active.sum(axis=1)
+        n_closed = done.sum(axis=1)
+        winning = (done & (pnl > 0)).sum(axis=1)
+        gross_profit = np.where(pnl > 0, pnl, 0.0).sum(axis=1)
+        gross_loss = -np.where(pnl < 0, pnl, 0.0).sum(axis=1)
+        exposure = np.full(len(final), np.nan)
+        if len(times):
+            # 未平仓交易持有到最后一根K线
+            close_time = np.where(closed, trade_times[np.maximum(path['exit_idx'], 0)], times[-1])
+            held = np.maximum(np.searchsorted(times, close_time, side='left')
+                              - np.searchsorted(times, opened, side='left'), 0)
+            exposure = np.minimum((result.active * held).sum(axis=1) / len(times), 1.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            profit_factor = np.where(gross_loss > 0, gross_profit / gross_loss,
+                                     np.where(gross_profit > 0, np.inf, np.nan))
+            win_rate = np.where(total > 0, winning / total, np.nan)
+            avg_holding = np.where(n_closed > 0, (done * holding).sum(axis=1) / n_closed, np.nan)
+
+        table = {
+            'leverage': result.leverage,
+            'position_value': result.position_value,
+            'fee_rate': result.fee_rate,
+            'Initial Balance': np.full(len(final), float(initial_balance)),
+            'Final Balance': final,
+            'Total Return': (final - initial_balance) / initial_balance,
+            'Max Drawdown': result.max_drawdown,
+            'Sharpe Ratio': sharpe,
+            'Total Trades': total,
+            'Winning Trades': winning,
+            'Win Rate': win_rate,
+        }
+        if timeframe != TimeFrame.DAY:
+            table['Average Holding Time (hours)'] = avg_holding
+        table.update({
+            'Sortino Ratio': sortino,
+            'Calmar Ratio': calmar,
+            'Avg Drawdown': avg_dd,
+            'Max Drawdown Duration (hours)': dd_hours,
+            'Exposure': exposure,
+            'Profit Factor': profit_factor,
+            'Margin Exhausted': total < len(path),
+            'Skipped Trades': len(path) - total,
+        })
+        return pd.DataFrame(table)
+
+
+class ScenarioBackTest:
+    """
+    在一组 杠杆 × 仓位价值 × 手续费 场景上回测同一个信号序列
+    数据准备和开平仓路径只做一次(开启强平时每个杠杆一次)，结果为每个场景一行的指标表
+    账户的其余状态(初始余额、峰值、最大回撤、是否强平)取自 account，不会被修改
+    """
+
+    def __init__(self, account: MockAccount, risk_free_rate: float = 0.03, tp_multiple: float = 2.0,
+                 intrabar: Optional[IntrabarResolver] = None):
+        self.account = account
+        self.risk_free_rate = risk_free_rate
+        self.tp_multiple = tp_multiple
+        self.intrabar = intrabar
+        self.paths: Dict[Optional[float], np.ndarray] = {}   # 杠杆(不强平时为 None) -> 开平仓路径
+
+    def run(self, data: pd.DataFrame, signals: pd.DataFrame, timeframe: TimeFrame,
+            leverage: Optional[Sequence[float]] = None, position_value: Optional[Sequence[float]] = None,
+            fee_rate: Optional[Sequence[float]] = None, symbol: Optional[str] = None) -> pd.DataFrame:
+        """未给出的参数维度使用账户当前的值，symbol 含义同 BackTest._prepare_data"""
+        account = self.account
+        backtest = BackTest(account, risk_free_rate=self.risk_free_rate, tp_multiple=self.tp_multiple,
+                            intrabar=self.intrabar)
+        merged_data = backtest._prepare_data(data, signals, timeframe, symbol)
+        time_key = 'date' if timeframe == TimeFrame.DAY and 'date' in merged_data.columns else 'open_time'
+
+        high = merged_data['high'].to_numpy(dtype=float)
+        low = merged_data['low'].to_numpy(dtype=float)
+        close = merged_data['close'].to_numpy(dtype=float)
+        signal = merged_data['short_signal'].to_numpy(dtype=bool)
+        resolve = backtest._intrabar_callback(merged_data, timeframe)
+        lev, pv, fee = ScenarioEngine.grid(
+            [account.leverage] if leverage is None else leverage,
+            [account.fixed_position_value] if position_value is None else position_value,
+            [account.fee_rate] if fee_rate is None else fee_rate)
+
+        n_bars = len(merged_data)
+        step = max(1, CHUNK_CELLS // max(n_bars, 1))
+        curve_times = merged_data[time_key].to_numpy(dtype='M8[ns]')
+        trade_times = merged_data['open_time'].to_numpy(dtype='M8[ns]')
+        tables = []
+        self.paths = {}
+        liquidation = account.liquidation
+        # 网格中杠杆变化最慢，同一杠杆的场景连续排列，按段共用一条路径
+        bounds = np.flatnonzero(np.diff(lev, prepend=np.nan, append=np.nan) != 0)
+        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            leverage = float(lev[start]) if liquidation else None
+            path = self.paths.get(leverage)
+            if path is None:
+                path = self.paths[leverage] = ExecutionKernel.short_path(
+                    high, low, close, signal, tp_multiple=self.tp_multiple,
+                    resolve_ambiguous=resolve, leverage=leverage)
+            for lo in range(start, end, step):
+                part = slice(lo, min(lo + step, end))
+                result = ScenarioEngine.run_short(path, n_bars, lev[part], pv[part], fee[part],
+                                                  initial_balance=account.balance,
+                                                  equity_peak=account.equity_peak,
+                                                  max_drawdown=account.max_drawdown,
+                                                  liquidation=liquidation)
+                tables.append(ScenarioEngine.performance(result, curve_times, trade_times, timeframe,
+                                                         account.initial_balance, self.risk_free_rate))
+        return pd.concat(tables, ignore_index=True)
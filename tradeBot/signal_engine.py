@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+from typing import Tuple, List, Dict
+
+
+class SignalEngine:
+    """向量化信号引擎，结果与 Strategy._check_strategy_conditions 逐行扫描完全一致"""
+
+    @staticmethod
+    def _last_true_index(mask: np.ndarray, segment_start: np.ndarray = None) -> np.ndarray:
+        """
+        每个位置(含)之前最近一个True的下标，不存在时为-1
+        segment_start: 多段序列拼接时每个位置所在段的起点，不跨段查找
+        """
+        idx = np.where(mask, np.arange(len(mask)), -1)
+        if len(idx) == 0:
+            return idx
+        idx = np.maximum.accumulate(idx)
+        if segment_start is not None:
+            idx = np.where(idx >= segment_start, idx, -1)
+        return idx
+
+    @staticmethod
+    def _run_lengths(mask: np.ndarray, segment_start: np.ndarray = None) -> np.ndarray:
+        """以每个位置结尾的连续True长度(游程编码)，在段起点处重新计数"""
+        last_break = SignalEngine._last_true_index(~mask)
+        if segment_start is not None:
+            last_break = np.maximum(last_break, segment_start - 1)
+        return np.arange(len(mask)) - last_break
+
+    @staticmethod
+    def compute(wld_change, btc_change, wld_outperforms, streak_len: int = 3,
+                confirm_len: int = 2, warmup: int = 10,
+                segment_start: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算做空信号
+        streak_len: 跑赢期的连续周期数, confirm_len: 信号前连续跑输下跌的周期数, warmup: 预热周期数
+        segment_start: 把多个币对的序列首尾拼接后一次计算时，每个位置所在段的起点
+        返回 (short_signal, streak_end)，没有信号的位置 streak_end 为 -1
+        """
+        wld = np.asarray(wld_change, dtype=float)
+        btc = np.asarray(btc_change, dtype=float)
+        outperforms = np.asarray(wld_outperforms, dtype=bool)
+        n = len(wld)
+        positions = np.arange(n)
+        if segment_start is None:
+            segment_start = np.zeros(n, dtype=np.int64)
+
+        signals = np.zeros(n, dtype=bool)
+        streak_end = np.full(n, -1, dtype=np.int64)
+        first = max(warmup, confirm_len + 1)
+        current = positions[positions - segment_start >= first]
+        if len(current) == 0:
+            return signals, streak_end
+
+        # 单个周期: WLD 跑输 BTC 且下跌
+        weak = (wld < btc) & (wld < 0)
+        weak_run = SignalEngine._run_lengths(weak, segment_start)
+
+        # 最近的连续 streak_len 个周期跑赢的结束位置
+        last_streak = SignalEngine._last_true_index(
+            SignalEngine._run_lengths(outperforms, segment_start) >= streak_len, segment_start)
+        # 最近的连续 confirm_len 个周期跑输的结束位置
+        last_under = SignalEngine._last_true_index(
+            SignalEngine._run_lengths(~outperforms, segment_start) >= confirm_len, segment_start)
+
+        candidate_end = last_streak[current - confirm_len - 1]
+        valid = (
+            (weak_run[current - 1] >= confirm_len) &
+            (candidate_end >= 0) &
+            # 优势期结束后到确认周期之前不能出现连续 confirm_len 个周期跑输
+            (last_under[current - confirm_len] < candidate_end + confirm_len)
+        )
+
+        signals[current] = valid
+        streak_end[current[valid]] = candidate_end[valid]
+        return signals, streak_end
+
+    @staticmethod
+    def signal_details(data: pd.DataFrame, time_key: str,
+                       signals: np.ndarray, streak_end: np.ndarray) -> List[Dict]:
+        """按信号位置批量生成 signal_details"""
+        idx = np.flatnonzero(signals)
+        if len(idx) == 0:
+            return []
+        ends = streak_end[idx]
+        times = data[time_key]
+        signal_times = times.iloc[idx].tolist()
+        streak_times = times.iloc[ends].tolist()
+        wld = data['wld_change'].to_numpy()
+        btc = data['btc_change'].to_numpy()
+        pairs = np.stack([idx - 2, idx - 1], axis=1)
+        wld_pairs = wld[pairs].tolist()
+        btc_pairs = btc[pairs].tolist()
+        since = (idx - ends).tolist()
+
+        return [
+            {
+                f'signal_{time_key}': signal_times[k],
+                f'three_period_streak_end_{time_key}': streak_times[k],
+                f'periods_since_streak': since[k],
+                'wld_last_two_periods': wld_pairs[k],
+                'btc_last_two_periods': btc_pairs[k]
+            }
+            for k in range(len(idx))
+        ]
+
+    @staticmethod
+    def generate(data: pd.DataFrame, time_key: str, **params) -> Tuple[pd.DataFrame, List[Dict]]:
+        """生成 short_signal 列和 signal_details，params 透传给 compute"""
+        signals, streak_end = SignalEngine.compute(
+            data['wld_change'], data['btc_change'], data['wld_outperforms'], **params
+        )
+        data['short_signal'] = signals
+        return data, SignalEngine.signal_details(data, time_key, signals, streak_end)
+
+
+class StreamingSignal:
+    """
+    逐根K线增量计算做空信号，每根K线O(1)
+    第 i 行的信号只依赖 i 之前的数据，所以在收到第 i 行时直接返回预先算好的结果
+    streak_len / confirm_len / warmup 同 SignalEngine.compute，可以直接用参数扫描选出的值
+    """
+
+    def __init__(self, streak_len: int = 3, confirm_len: int = 2, warmup: int = 10):
+        self.streak_len = streak_len
+        self.confirm_len = confirm_len
+        self.warmup = warmup
+        self.index = -1                     # 已处理的合并行下标
+        self.last_alt_close = None
+        self.last_bench_close = None
+        self.last_changes = []              # 最近 confirm_len 个周期的 (wld_change, btc_change)，旧的在前
+        self.outperform_run = 0             # 当前连续跑赢的周期数
+        self.underperform_run = 0           # 当前连续未跑赢的周期数
+        # 截止到 index-confirm_len ... index 的最近 streak_len 连跑赢结束位置
+        self._streak_ends = (-1,) * (confirm_len + 1)
+        # 截止到 index-confirm_len+1 ... index 的最近 confirm_len 连跑输结束位置
+        self._under_ends = (-1,) * confirm_len
+        self.next_signal = False            # 下一行的信号
+        self.next_streak_end = -1
+        self.streak_end = -1                # 最近一次发出信号对应的跑赢期结束位置
+
+    @property
+    def last_streak_end(self) -> int:
+        """下一行判断时使用的跑赢期结束位置"""
+        return self._streak_ends[0]
+
+    @property
+    def underperformed_since_streak(self) -> bool:
+        """跑赢期结束后是否已经出现过连续 confirm_len 个周期跑输"""
+        return self._under_ends[0] >= self._streak_ends[0] + self.confirm_len
+
+    def _refresh_next(self):
+        """根据当前状态预先计算下一行的信号"""
+        self.next_signal = False
+        self.next_streak_end = -1
+        if self.index + 1 < max(self.warmup, self.confirm_len + 1) or len(self.last_changes) < self.confirm_len:
+            return
+        for wld, btc in self.last_changes:
+            if not (wld < btc and wld < 0):
+                return
+        if self._streak_ends[0] < 0 or self.underperformed_since_streak:
+            return
+        self.next_signal = True
+        self.next_streak_end = self._streak_ends[0]
+
+    def update_change(self, wld_change: float, btc_change: float) -> bool:
+        """输入一行涨跌幅，返回该行的 short_signal"""
+        signal = self.next_signal
+        if signal:
+            self.streak_end = self.next_streak_end
+
+        self.index += 1
+        outperforms = wld_change > btc_change
+        if outperforms:
+            self.outperform_run += 1
+            self.underperform_run = 0
+        else:
+            self.outperform_run = 0
+            self.underperform_run += 1
+
+        streak_end = self.index if self.outperform_run >= self.streak_len else self._streak_ends[-1]
+        under_end = self.index if self.underperform_run >= self.confirm_len else self._under_ends[-1]
+        self._streak_ends = self._streak_ends[1:] + (streak_end,)
+        self._under_ends = self._under_ends[1:] + (under_end,)
+        self.last_changes = (self.last_changes + [(wld_change, btc_change)])[-self.confirm_len:]
+
+        self._refresh_next()
+        return signal
+
+    def update(self, alt_bar, bench_bar) -> bool:
+        """输入一对已收盘的K线(需要 close 字段)，返回该行的 short_signal"""
+        alt_close = float(alt_bar['close'])
+        bench_close = float(bench_bar['close'])
+        if self.last_alt_close is None or self.last_bench_close is None:
+            # 第一对K线没有涨跌幅，与 _prepare_data 丢弃第一行一致
+            self.last_alt_close = alt_close
+            self.last_bench_close = bench_close
+            return False
+        wld_change = (alt_close / self.last_alt_close - 1) * 100
+        btc_change = (bench_close / self.last_bench_close - 1) * 100
+        self.last_alt_close = alt_close
+        self.last_bench_close = bench_close
+        return self.update_change(wld_change, btc_change)
+
+    @classmethod
+    def from_merged(cls, data: pd.DataFrame, last_alt_close: float = None,
+                    last_bench_close: float = None, **params) -> 'StreamingSignal':
+        """用 _prepare_data 输出的历史数据一次性(向量化)恢复状态，params 为 streak_len / confirm_len / warmup"""
+        state = cls(**params)
+        state.last_alt_close = last_alt_close
+        state.last_bench_close = last_bench_close
+        n = len(data)
+        if n == 0:
+            return state
+
+        wld = data['wld_change'].to_numpy(dtype=float)
+        btc = data['btc_change'].to_numpy(dtype=float)
+        outperforms = data['wld_outperforms'].to_numpy(dtype=bool)
+        run_out = SignalEngine._run_lengths(outperforms)
+        run_under = SignalEngine._run_lengths(~outperforms)
+        last_streak = SignalEngine._last_true_index(run_out >= state.streak_len)
+        last_under = SignalEngine._last_true_index(run_under >= state.confirm_len)
+
+        def at(arr, i):
+            return int(arr[i]) if i >= 0 else -1
+
+        j = n - 1
+        confirm_len = state.confirm_len
+        state.index = j
+        state.outperform_run = int(run_out[j])
+        state.underperform_run = int(run_under[j])
+        state._streak_ends = tuple(at(last_streak, j - k) for k in range(confirm_len, -1, -1))
+        state._under_ends = tuple(at(last_under, j - k) for k in range(confirm_len - 1, -1, -1))
+        state.last_changes = [(float(wld[i]), float(btc[i])) for i in range(max(0, n - confirm_len), n)]
+        state._refresh_next()
+        return state
+
+    @classmethod
+    def from_frames(cls, df_alt: pd.DataFrame, df_bench: pd.DataFrame, **params) -> 'StreamingSignal':
+        """用小时线原始数据热启动，之后可以直接 update 新的K线"""
+        from .strategy import Strategy
+        merged_data, _ = Strategy._prepare_data(df_alt, df_bench, 'hour')
+        return cls.from_merged(merged_data,
+                               float(df_alt['close'].iloc[-1]),
+                               float(df_bench['close'].iloc[-1]), **params)
@@ -0,0 +1,164 @@
+import json
+import os
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+MANIFEST = "manifest.json"
+TIME_COLUMN = "open_time"
+OHLCV = ["open", "high", "low", "close", "volume"]
+
+TimeLike = Union[int, str, pd.Timestamp, np.datetime64, None]
+
+
+def to_epoch_ms(value) -> np.ndarray:
+    """时间列统一转换为 int64 毫秒时间戳，支持毫秒整数、字符串和 datetime"""
+    series = pd.Series(value) if not isinstance(value, pd.Series) else value
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=np.int64)
+    return pd.to_datetime(series).to_numpy(dtype='M8[ms]').view(np.int64)
+
+
+def _bound_ms(value: TimeLike) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+
+class MarketStore:
+    """
+    二进制列式行情存储，每个 symbol/interval 一个目录
+    每列一个原始二进制文件(open_time 为 int64 毫秒，其余为 float64/float32)，用 memmap 打开
+    manifest.json 记录列类型、行数和覆盖的时间范围
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dir(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, symbol.upper(), interval)
+
+    def manifest(self, symbol: str, interval: str) -> Optional[Dict]:
+        path = os.path.join(self._dir(symbol, interval), MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, directory: str, manifest: Dict):
+        tmp = os.path.join(directory, MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, os.path.join(directory, MANIFEST))
+
+    def symbols(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.listdir(self.root))
+
+    @staticmethod
+    def _columns_from_frame(df: pd.DataFrame, float_dtype) -> Dict[str, np.ndarray]:
+        """挑出要存储的列：open_time + 所有数值列(datetime 列转毫秒)"""
+        columns = {TIME_COLUMN: to_epoch_ms(df[TIME_COLUMN])}
+        for name in df.columns:
+            if name == TIME_COLUMN:
+                continue
+            col = df[name]
+            if pd.api.types.is_datetime64_any_dtype(col) or name.endswith("_time"):
+                columns[name] = to_epoch_ms(col)
+            elif pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+                columns[name] = col.to_numpy(dtype=float_dtype)
+        return columns
+
+    def write(self, symbol: str, interval: str, df: pd.DataFrame, float_dtype=np.float64,
+              append: bool = False) -> Dict:
+        """
+        写入数据，df 需按 open_time 升序
+        append=True 时只追加比已有数据更新的行，列必须与已有数据一致
+        """
+        directory = self._dir(symbol, interval)
+        os.makedirs(directory, exist_ok=True)
+        columns = self._columns_from_frame(df, float_dtype)
+        manifest = self.manifest(symbol, interval) if append else None
+
+        if manifest is not None:
+            if set(columns) != set(manifest["columns"]):
+                raise ValueError(f"Column mismatch for {symbol} {interval}: "
+                                 f"{sorted(columns)} vs {sorted(manifest['columns'])}")
+            if manifest["rows"]:
+                keep = columns[TIME_COLUMN] > manifest["end"]
+                columns = {name: arr[keep] for name, arr in columns.items()}
+            mode = "ab"
+        else:
+            manifest = {
+                "symbol": symbol.upper(),
+                "interval": interval,
+                "rows": 0,
+                "start": None,
+                "end": None,
+                "columns": {name: arr.dtype.str for name, arr in columns.items()},
+            }
+            mode = "wb"
+
+        for name, arr in columns.items():
+            path = os.path.join(directory, name + ".bin")
+            if mode == "ab":
+                # 上次追加写完列文件、没来得及更新 manifest 就中断时，文件尾部会多出字节，
+                # 先截回 manifest 记录的行数，否则之后按行数 memmap 会错位
+                size = manifest["rows"] * np.dtype(manifest["columns"][name]).itemsize
+                if os.path.getsize(path) < size:
+                    raise ValueError(f"{path} is shorter than the {manifest['rows']} rows in the manifest")
+                os.truncate(path, size)
+            with open(path, mode) as f:
+                f.write(np.ascontiguousarray(arr, dtype=np.dtype(manifest["columns"][name])).tobytes())
+
+        times = columns[TIME_COLUMN]
+        if len(times):
+            if manifest["start"] is None:
+                manifest["start"] = int(times[0])
+            manifest["end"] = int(times[-1])
+        manifest["rows"] += len(times)
+        self._write_manifest(directory, manifest)
+        return manifest
+
+    def open(self, symbol: str, interval: str) -> Dict[str, np.ndarray]:
+        """以只读 memmap 打开所有列"""
+        manifest = self.manifest(symbol, interval)
+        if manifest is None:
+            raise FileNotFoundError(f"No stored data for {symbol} {interval} in {self.root}")
+        directory = self._dir(symbol, interval)
+        rows = manifest["rows"]
+        arrays = {}
+        for name, dtype in manifest["columns"].items():
+            if rows == 0:
+                arrays[name] = np.empty(0, dtype=np.dtype(dtype))
+            else:
+                arrays[name] = np.memmap(os.path.join(directory, name + ".bin"),
+                                         dtype=np.dtype(dtype), mode="r", shape=(rows,))
+        return arrays
+
+    def load(self, symbol: str, interval: str, start: TimeLike = None, end: TimeLike = None,
+             columns: Optional[List[str]] = None, as_frame: bool = True):
+        """
+        读取 [start, end] 区间的数据
+        as_frame=False 返回零拷贝的 memmap 切片(open_time 为毫秒)，否则返回 DataFrame
+        """
+        arrays = self.open(symbol, interval)
+        times = arrays[TIME_COLUMN]
+        lo = 0 if start is None else int(np.searchsorted(times, _bound_ms(start), side="left"))
+        hi = len(times) if end is None else int(np.searchsorted(times, _bound_ms(end), side="right"))
+        names = [TIME_COLUMN] + [c for c in (columns or arrays) if c != TIME_COLUMN]
+        sliced = {name: arrays[name][lo:hi] for name in names}
+        if not as_frame:
+            return sliced
+
+        frame = {}
+        for name, arr in sliced.items():
+            if name == TIME_COLUMN or name.endswith("_time"):
+                frame[name] = pd.to_datetime(np.asarray(arr), unit="ms")
+            else:
+                frame[name] = np.asarray(arr)
+        return pd.DataFrame(frame)
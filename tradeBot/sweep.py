@@ -0,0 +1,375 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+from functools import partial
+from multiprocessing import Pool, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .account import MockAccount
+from .analytics import Analytics
+from .backtest import BackTest, TimeFrame
+from .cache import StageCache, fingerprint
+from .kernel import ExecutionKernel
+from .montecarlo import MonteCarlo
+from .resample import Resampler
+from .signal_engine import SignalEngine
+from .strategy import Strategy
+
+# 可调参数及默认值
+SWEEP_DEFAULTS = {
+    'tp_multiple': 2.0,            # 止盈/止损距离倍数
+    'streak_len': 3,               # 跑赢期连续周期数
+    'confirm_len': 2,              # 信号前连续跑输周期数
+    'warmup': 10,                  # 预热周期数
+    'leverage': 20.0,
+    'fixed_position_value': 10.0,
+}
+# 只影响信号的参数，其余参数变化时信号可以复用
+SIGNAL_PARAMS = ('streak_len', 'confirm_len', 'warmup')
+
+# 各缓存阶段依赖的代码，所在模块的源码变化时对应的缓存失效
+INDICATOR_CODE = (Strategy, Resampler, BackTest)
+SIGNAL_CODE = (SignalEngine,)
+# 回测结果还取决于本模块的 _backtest / _run_one，本模块改动后同样失效
+BACKTEST_CODE = (ExecutionKernel, BackTest, Analytics, MockAccount, MonteCarlo, sys.modules[__name__])
+
+
+class SharedArrays:
+    """把一组 NumPy 数组放进共享内存，子进程按名字挂载，不需要逐个任务 pickle 数据"""
+
+    _attached = []  # 子进程中挂载的共享内存，保持引用防止映射被回收
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self._blocks = []
+        self.specs = {}
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)[...] = arr
+            self._blocks.append(block)
+            self.specs[name] = (block.name, arr.shape, arr.dtype.str)
+
+    @staticmethod
+    def attach(specs: Dict) -> Dict[str, np.ndarray]:
+        """按 specs 挂载共享内存，返回只读数组"""
+        arrays = {}
+        for name, (block_name, shape, dtype) in specs.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            arr.flags.writeable = False
+            arrays[name] = arr
+            SharedArrays._attached.append(block)
+        return arrays
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# 子进程内的数据，由 _init_worker 填充
+_WORKER = {}
+
+
+def _init_worker(specs: Dict, timeframe: str, initial_balance: float, risk_free_rate: float):
+    arrays = SharedArrays.attach(specs)
+    frame = pd.DataFrame({
+        'open_time': arrays['open_time'].view('M8[ns]'),
+        'high': arrays['high'],
+        'low': arrays['low'],
+        'close': arrays['close'],
+    })
+    _WORKER.update(arrays=arrays, frame=frame, timeframe=TimeFrame(timeframe),
+                   initial_balance=initial_balance, risk_free_rate=risk_free_rate)
+
+
+def _numeric_metrics(metrics: Dict) -> Dict:
+    """把 generate_performance_metrics 的格式化字符串转成数值，便于排序"""
+    result = {}
+    for key, value in metrics.items():
+        if key == 'Returns':
+            continue
+        if isinstance(value, str):
+            if value == 'N/A':
+                value = np.nan
+            elif value.endswith('%'):
+                value = float(value[:-1]) / 100
+            else:
+                value = float(value)
+        result[key] = value
+    return result
+
+
+def _signal_name(params: Dict) -> str:
+    return 'signals_' + '_'.join(str(params[name]) for name in SIGNAL_PARAMS)
+
+
+def _compute_signals(arrays: Dict[str, np.ndarray], params: Dict) -> np.ndarray:
+    """整段历史上的信号，已对齐到回测K线"""
+    signals, _ = SignalEngine.compute(
+        arrays['wld_change'], arrays['btc_change'], arrays['wld_outperforms'],
+        streak_len=params['streak_len'], confirm_len=params['confirm_len'],
+        warmup=params['warmup']
+    )
+    return signals[arrays['signal_rows']]
+
+
+def _signals(params: Dict) -> np.ndarray:
+    """
+    整段历史上的信号(已对齐到回测K线)，按信号参数缓存在子进程内
+    信号只依赖过去的数据，不同参数组合或重叠的时间窗口可以直接切片复用
+    主进程已经从 StageCache 取到的信号放在共享内存里，直接使用
+    """
+    arrays = _WORKER['arrays']
+    name = _signal_name(params)
+    if name in arrays:
+        return arrays[name]
+    cache = _WORKER.setdefault('signals', {})
+    if name not in cache:
+        cache[name] = _compute_signals(arrays, params)
+    return cache[name]
+
+
+def _backtest(params: Dict, lo: int = 0, hi: Optional[int] = None,
+              state: Optional[Tuple[float, float, float]] = None):
+    """
+    子进程中对回测K线 [lo, hi) 执行一组参数的回测，返回 BackTest 和内核结果
+    state 为 (余额, 余额峰值, 最大回撤)，用于接着上一段回测的账户状态继续，默认从初始余额开始
+    """
+    merged_data = _WORKER['frame'].iloc[lo:hi].copy(deep=False)
+    merged_data['short_signal'] = _signals(params)[lo:hi]
+
+    balance = _WORKER['initial_balance'] if state is None else state[0]
+    account = MockAccount(initial_balance=balance, leverage=params['leverage'])
+    account.fixed_position_value = params['fixed_position_value']
+    if state is not None:
+        account.equity_peak, account.max_drawdown = state[1], state[2]
+    backtest = BackTest(account, risk_free_rate=_WORKER['risk_free_rate'],
+                        tp_multiple=params['tp_multiple'])
+    result = backtest._execute_trades(merged_data, _WORKER['timeframe'])
+    return backtest, result
+
+
+def _evaluate(params: Dict, lo: int = 0, hi: Optional[int] = None,
+              state: Optional[Tuple[float, float, float]] = None):
+    """子进程中对回测K线 [lo, hi) 执行一组参数的回测，返回数值指标和内核结果"""
+    backtest, result = _backtest(params, lo, hi, state)
+    metrics = backtest.generate_performance_metrics(_WORKER['timeframe'])
+    return _numeric_metrics(metrics), result
+
+
+def _render_one(task) -> List[str]:
+    """子进程中重跑一组参数并离屏渲染报告，账户不需要在进程间传递"""
+    from .report import render_report
+    params, save_path, kwargs = task
+    backtest, _ = _backtest(params)
+    return render_report(backtest.account, _WORKER['timeframe'], save_path,
+                         risk_free_rate=_WORKER['risk_free_rate'], **kwargs)
+
+
+def _run_one(params: Dict, mc_paths: int = 0) -> Dict:
+    """子进程中执行一组参数的回测，mc_paths>0 时附带交易序列蒙特卡洛的分位数"""
+    metrics, result = _evaluate(params)
+    row = {**params, **metrics}
+    if mc_paths:
+        mc = MonteCarlo.simulate(MonteCarlo.kernel_pnls(result.trades), _WORKER['initial_balance'],
+                                 n_paths=mc_paths)
+        row.update(MonteCarlo.summary(mc))
+    return row
+
+
+class ParameterSweep:
+    """
+    在进程池上对参数网格并行回测，返回按指标排序的结果表
+    给出 cache 时，信号输入、每组信号参数的信号和每组参数的回测结果都按内容缓存，
+    重跑只改了 tp_multiple 等回测参数的扫描时不再计算信号
+    """
+
+    def __init__(self, df_alt: pd.DataFrame, df_bench: pd.DataFrame,
+                 timeframe: TimeFrame = TimeFrame.HOUR, initial_balance: float = 1000.0,
+                 risk_free_rate: float = 0.02, cache: Optional[StageCache] = None):
+        self.timeframe = timeframe
+        self.initial_balance = initial_balance
+        self.risk_free_rate = risk_free_rate
+        self.throughput = None
+        self.cache = cache
+        if cache is None:
+            self.arrays = self._prepare_arrays(df_alt.copy(), df_bench.copy())
+        else:
+            self.data_key = fingerprint(df_alt, df_bench)
+            self.arrays = cache.cached('indicators', lambda: self._prepare_arrays(df_alt.copy(), df_bench.copy()),
+                                       self.data_key, code=INDICATOR_CODE, timeframe=timeframe.value)
+
+    def _prepare_arrays(self, df_alt: pd.DataFrame, df_bench: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """信号输入和回测K线只计算一次，之后所有参数组合共用"""
+        signal_data, _ = Strategy._prepare_data(df_alt.copy(), df_bench, self.timeframe.value)
+
+        data = df_alt
+        data['open_time'] = pd.to_datetime(data['open_time'])
+        if self.timeframe == TimeFrame.FOUR_HOUR:
+            data = Strategy._convert_to_4h(data)
+        signal_data['short_signal'] = False
+        merged_data = BackTest(MockAccount())._prepare_data(data, signal_data, self.timeframe)
+
+        signal_rows = pd.Index(signal_data['open_time']).get_indexer(merged_data['open_time'])
+        return {
+            'wld_change': signal_data['wld_change'].to_numpy(dtype=np.float64),
+            'btc_change': signal_data['btc_change'].to_numpy(dtype=np.float64),
+            'wld_outperforms': signal_data['wld_outperforms'].to_numpy(dtype=bool),
+            'signal_rows': signal_rows.astype(np.int64),
+            'open_time': merged_data['open_time'].to_numpy(dtype='M8[ns]').view(np.int64),
+            'high': merged_data['high'].to_numpy(dtype=np.float64),
+            'low': merged_data['low'].to_numpy(dtype=np.float64),
+            'close': merged_data['close'].to_numpy(dtype=np.float64),
+        }
+
+    @staticmethod
+    def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+        """参数网格展开为参数组合列表，未指定的参数使用默认值"""
+        unknown = set(grid) - set(SWEEP_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+        names = list(grid)
+        combos = []
+        for values in itertools.product(*(grid[name] for name in names)):
+            params = dict(SWEEP_DEFAULTS)
+            params.update(zip(names, values))
+            combos.append(params)
+        return combos
+
+    def _cached_signals(self, combos: List[Dict]) -> Dict[str, np.ndarray]:
+        """网格中每组信号参数的信号，从缓存读取或在主进程计算一次"""
+        signals = {}
+        for params in combos:
+            name = _signal_name(params)
+            if name not in signals:
+                signal_params = {k: params[k] for k in SIGNAL_PARAMS}
+                signals[name] = self.cache.cached(
+                    'signals', lambda: _compute_signals(self.arrays, signal_params),
+                    self.data_key, code=SIGNAL_CODE, timeframe=self.timeframe.value, **signal_params)
+        return signals
+
+    def _backtest_key(self, params: Dict, mc_paths: int) -> str:
+        return self.cache.key('backtest', self.data_key, code=BACKTEST_CODE, timeframe=self.timeframe.value,
+                              initial_balance=self.initial_balance, risk_free_rate=self.risk_free_rate,
+                              mc_paths=mc_paths, **params)
+
+    def run(self, grid: Dict[str, List], workers: Optional[int] = None,
+            sort_by: str = 'Sharpe Ratio', ascending: bool = False,
+            mc_paths: int = 0) -> pd.DataFrame:
+        """运行网格中的所有组合"""
+        combos = self.expand_grid(grid)
+        workers = workers or os.cpu_count()
+        start = time.perf_counter()
+        arrays = self.arrays
+        rows = [None] * len(combos)
+        todo = list(range(len(combos)))
+        if self.cache is not None:
+            keys = [self._backtest_key(params, mc_paths) for params in combos]
+            rows = [self.cache.get('backtest', key) for key in keys]
+            todo = [i for i, row in enumerate(rows) if row is None]
+            if todo:
+                arrays = {**self.arrays, **self._cached_signals([combos[i] for i in todo])}
+        if todo:
+            with SharedArrays(arrays) as shared:
+                with Pool(processes=workers, initializer=_init_worker,
+                          initargs=(shared.specs, self.timeframe.value,
+                                    self.initial_balance, self.risk_free_rate)) as pool:
+                    chunksize = max(1, len(todo) // (workers * 4))
+                    computed = pool.map(partial(_run_one, mc_paths=mc_paths), [combos[i] for i in todo],
+                                        chunksize=chunksize)
+            for i, row in zip(todo, computed):
+                rows[i] = row
+                if self.cache is not None:
+                    self.cache.put('backtest', keys[i], row)
+        elapsed = time.perf_counter() - start
+        self.throughput = len(combos) / elapsed if elapsed > 0 else float('inf')
+
+        table = pd.DataFrame(rows)
+        if len(table) and sort_by in table.columns:
+            table = table.sort_values(sort_by, ascending=ascending, na_position='last')
+        return table.reset_index(drop=True)
+
+    def render_reports(self, table: pd.DataFrame, out_dir: str, top: int = 5,
+                       workers: Optional[int] = None, **kwargs) -> List[List[str]]:
+        """为结果表前 top 行的参数组合并行生成回测报告，文件名为 {out_dir}/rank{N}_*.png"""
+        names = [name for name in SWEEP_DEFAULTS if name in table.columns]
+        tasks = []
+        for rank, row in enumerate(table.head(top).to_dict('records'), 1):
+            params = dict(SWEEP_DEFAULTS)
+            params.update({name: type(SWEEP_DEFAULTS[name])(row[name]) for name in names})
+            tasks.append((params, os.path.join(out_dir, f'rank{rank}'), kwargs))
+        if not tasks:
+            return []
+        os.makedirs(out_dir, exist_ok=True)
+        workers = min(workers or os.cpu_count(), len(tasks))
+        with SharedArrays(self.arrays) as shared:
+            with Pool(processes=workers, initializer=_init_worker,
+                      initargs=(shared.specs, self.timeframe.value,
+                                self.initial_balance, self.risk_free_rate)) as pool:
+                return pool.map(_render_one, tasks, chunksize=1)
+
+
+def _parse_grid(items: List[str]) -> Dict[str, List]:
+    """解析 name=v1,v2,v3 形式的参数"""
+    grid = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        caster = type(SWEEP_DEFAULTS.get(name, 0.0))
+        grid[name] = [caster(v) for v in values.split(',') if v]
+    return grid
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep for BackTest")
+    parser.add_argument('--alt', required=True, help="alt coin *_format.csv")
+    parser.add_argument('--bench', required=True, help="benchmark *_format.csv")
+    parser.add_argument('--timeframe', default='hour', choices=[tf.value for tf in TimeFrame])
+    parser.add_argument('--grid', action='append', default=[],
+                        help="name=v1,v2,... (repeatable), names: " + ", ".join(SWEEP_DEFAULTS))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--sort', default='Sharpe Ratio')
+    parser.add_argument('--ascending', action='store_true')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', default=None, help="save the full table as csv")
+    parser.add_argument('--mc-paths', type=int, default=0,
+                        help="Monte Carlo bootstrap paths per backtest (0 = off)")
+    parser.add_argument('--reports', type=int, default=0,
+                        help="render report images for the top N parameter sets")
+    parser.add_argument('--report-dir', default='reports')
+    parser.add_argument('--cache', default=None, metavar='DIR',
+                        help="reuse signal inputs, signals and backtest results cached in DIR")
+    parser.add_argument('--cache-size', type=float, default=2048, help="cache size limit in MB")
+    args = parser.parse_args(argv)
+
+    cache = StageCache(args.cache, max_bytes=int(args.cache_size * 2 ** 20)) if args.cache else None
+    sweep = ParameterSweep(pd.read_csv(args.alt), pd.read_csv(args.bench), TimeFrame(args.timeframe), cache=cache)
+    table = sweep.run(_parse_grid(args.grid), workers=args.workers,
+                      sort_by=args.sort, ascending=args.ascending, mc_paths=args.mc_paths)
+    print(table.head(args.top).to_string())
+    print(f"{len(table)} backtests, {sweep.throughput:.1f} backtests/s")
+    if cache is not None:
+        print("cache: " + ", ".join(f"{stage} {c['memo'] + c['disk']} hit / {c['miss']} miss"
+                                    for stage, c in cache.stats.items()))
+    if args.output:
+        table.to_csv(args.output, index=False)
+    if args.reports:
+        paths = sweep.render_reports(table, args.report_dir, top=args.reports, workers=args.workers)
+        print(f"{sum(len(p) for p in paths)} report images written to {args.report_dir}")
+    return table
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""
+实盘链路的延迟埋点
+
+    with TELEMETRY.span('signal'):
+        ...
+
+span 用 time.perf_counter_ns (单调时钟) 计时，结果累计到固定分桶的直方图里，
+另有简单计数器。默认关闭，关闭时 span() 返回共用的空上下文，只多一次属性判断。
+MetricsServer 在本地端口以 Prometheus 文本格式输出，BackTest.run 的分阶段耗时也记在这里
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Optional, Sequence
+
+# 直方图上界(秒)，1微秒到1分钟，每个数量级 1/2.5/5 三档
+DEFAULT_BUCKETS = tuple(m * 10.0 ** e for e in range(-6, 1) for m in (1, 2.5, 5)) + (10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """固定分桶的延迟直方图，内部按纳秒计数"""
+
+    __slots__ = ('bounds_ns', 'counts', 'sum_ns', 'count', 'min_ns', 'max_ns')
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds_ns = [int(round(b * 1e9)) for b in buckets]
+        self.counts = [0] * (len(self.bounds_ns) + 1)   # 最后一档为 +Inf
+        self.sum_ns = 0
+        self.count = 0
+        self.min_ns = 0
+        self.max_ns = 0
+
+    def observe_ns(self, ns: int):
+        self.counts[bisect_left(self.bounds_ns, ns)] += 1
+        self.sum_ns += ns
+        self.count += 1
+        if ns > self.max_ns:
+            self.max_ns = ns
+        if ns < self.min_ns or self.count == 1:
+            self.min_ns = ns
+
+    def quantile(self, q: float) -> float:
+        """按分桶线性插值估算分位数(秒)，首末两档用实际的最小/最大值收窄"""
+        if not self.count:
+            return float('nan')
+        rank = q * self.count
+        seen = 0
+        lower = 0
+        for i, n in enumerate(self.counts):
+            upper = self.bounds_ns[i] if i < len(self.bounds_ns) else self.max_ns
+            if n and seen + n >= rank:
+                lower, upper = max(lower, self.min_ns), min(upper, self.max_ns)
+                return (lower + (upper - lower) * (rank - seen) / n) / 1e9
+            seen += n
+            lower = upper
+        return self.max_ns / 1e9
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'total_s': self.sum_ns / 1e9,
+            'mean_us': self.sum_ns / self.count / 1000 if self.count else 0.0,
+            'p50_us': self.quantile(0.5) * 1e6,
+            'p90_us': self.quantile(0.9) * 1e6,
+            'p99_us': self.quantile(0.99) * 1e6,
+            'max_us': self.max_ns / 1000,
+        }
+
+
+class _Span:
+    __slots__ = ('telemetry', 'stage', 'start_ns')
+
+    def __init__(self, telemetry: 'Telemetry', stage: str):
+        self.telemetry = telemetry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.observe_ns(self.stage, time.perf_counter_ns() - self.start_ns)
+        if exc_type is not None:
+            self.telemetry.inc(self.stage + '_errors')
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Telemetry:
+    """
+    按阶段名累计的延迟直方图和计数器
+    只在事件循环线程里写，MetricsServer 的线程只读，不加锁
+    """
+
+    def __init__(self, enabled: bool = False, buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 namespace: str = 'tradebot'):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.namespace = namespace
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.started = time.time()
+
+    def enable(self) -> 'Telemetry':
+        self.enabled = True
+        return self
+
+    def disable(self) -> 'Telemetry':
+        self.enabled = False
+        return self
+
+    def reset(self):
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def span(self, stage: str):
+        """计时上下文，出现异常时额外计数 {stage}_errors"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def start(self) -> int:
+        """跨回调计时的起点，关闭时返回 0，配合 stop 使用"""
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def stop(self, stage: str, start_ns: int):
+        if start_ns and self.enabled:
+            self.observe_ns(stage, time.perf_counter_ns() - start_ns)
+
+    def observe_ns(self, stage: str, ns: int):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram(self.buckets)
+        histogram.observe_ns(ns)
+
+    def observe(self, stage: str, seconds: float):
+        """记录外部算好的耗时，如K线收盘(交易所时钟)到本地收到的间隔"""
+        if self.enabled:
+            self.observe_ns(stage, max(int(seconds * 1e9), 0))
+
+    def inc(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {stage: h.summary() for stage, h in sorted(self.histograms.items())}
+
+    def dump(self, path: str):
+        """各阶段耗时汇总和计数器写成 JSON"""
+        with open(path, 'w') as f:
+            json.dump({'stages': self.summary(), 'counters': dict(sorted(self.counters.items()))}, f, indent=2)
+
+    def prometheus(self) -> str:
+        """Prometheus 文本格式(0.0.4)"""
+        ns = self.namespace
+        lines = [f"# HELP {ns}_uptime_seconds Seconds since telemetry was started or reset",
+                 f"# TYPE {ns}_uptime_seconds gauge",
+                 f"{ns}_uptime_seconds {time.time() - self.started:.3f}",
+                 f"# HELP {ns}_latency_seconds Latency of instrumented stages",
+                 f"# TYPE {ns}_latency_seconds histogram"]
+        for stage, h in sorted(self.histograms.items()):
+            label = _label(stage)
+            cumulative = 0
+            for bound, n in zip(self.buckets, h.counts):
+                cumulative += n
+                lines.append(f'{ns}_latency_seconds_bucket{{stage="{label}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{ns}_latency_seconds_bucket{{stage="{label}",le="+Inf"}} {h.count}')
+            lines.append(f'{ns}_latency_seconds_sum{{stage="{label}"}} {h.sum_ns / 1e9:.9f}')
+            lines.append(f'{ns}_latency_seconds_count{{stage="{label}"}} {h.count}')
+        lines += [f"# HELP {ns}_events_total Counted events",
+                  f"# TYPE {ns}_events_total counter"]
+        for name, n in sorted(self.counters.items()):
+            lines.append(f'{ns}_events_total{{event="{_label(name)}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# 进程内共用的实例，live --metrics-port / backtest --profile 时打开
+TELEMETRY = Telemetry()
+
+
+class MetricsServer:
+    """
+    本地 HTTP 端点，GET /metrics 返回 Prometheus 文本，GET /metrics.json 返回分位数汇总
+    跑在后台线程里，下单等同步调用阻塞事件循环时也能抓取
+    """
+
+    def __init__(self, telemetry: Telemetry = TELEMETRY, host: str = '127.0.0.1', port: int = 0):
+        self.telemetry = telemetry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def _handler(self):
+        from http.server import BaseHTTPRequestHandler
+
+        telemetry = self.telemetry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/metrics':
+                    body, content_type = telemetry.prometheus(), 'text/plain; version=0.0.4; charset=utf-8'
+                elif path == '/metrics.json':
+                    body, content_type = json.dumps({'stages': telemetry.summary(),
+                                                     'counters': telemetry.counters}), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'MetricsServer':
+        # http.server 只在用到时导入，不拖慢离线命令的冷启动
+        from http.server import ThreadingHTTPServer
+
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,201 @@
+import argparse
+import os
+import time
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .backtest import TimeFrame
+from .sweep import ParameterSweep, SharedArrays, _evaluate, _init_worker, _parse_grid, SWEEP_DEFAULTS
+
+WindowSize = Union[int, str, pd.Timedelta]
+
+
+@dataclass
+class WalkForwardResult:
+    windows: pd.DataFrame    # 每个窗口的区间、选中的参数、训练期得分和测试期指标
+    equity: pd.Series        # 拼接后的样本外余额曲线
+
+
+def _rank_key(value: float, ascending: bool) -> float:
+    """NaN 排在最后"""
+    if value is None or value != value:
+        return np.inf
+    return value if ascending else -value
+
+
+def _select_window(task: Tuple) -> Dict:
+    """子进程中处理一个窗口的训练期：对参数网格回测并按 sort_by 选出最优参数"""
+    k, train_lo, train_hi, combos, sort_by, ascending = task
+    best, best_key, best_metrics = None, None, None
+    for params in combos:
+        metrics, _ = _evaluate(params, train_lo, train_hi)
+        key = _rank_key(metrics.get(sort_by), ascending)
+        if best is None or key < best_key:
+            best, best_key, best_metrics = params, key, metrics
+    return {
+        'window': k,
+        'params': best,
+        'train_score': best_metrics.get(sort_by),
+    }
+
+
+def _test_window(task: Tuple) -> Dict:
+    """子进程中用选中的参数评估测试期，账户从上一个测试期结束时的状态继续"""
+    params, test_lo, test_hi, state = task
+    test_metrics, result = _evaluate(params, test_lo, test_hi, state)
+    return {
+        'test_metrics': test_metrics,
+        'test_equity': result.equity,
+        'state': (result.balance, result.equity_peak, result.max_drawdown),
+    }
+
+
+class WalkForward:
+    """
+    滚动(或锚定)训练/测试窗口的前推检验
+    每个窗口在训练期上对参数网格回测并按 sort_by 选出最优参数，再在紧随其后的测试期上评估
+    训练期在进程池上并行，行情数组放在共享内存里，信号按参数在子进程内缓存后切片复用
+    测试期依次运行，余额、峰值和回撤从上一个测试期结束时接着算
+    """
+
+    def __init__(self, df_alt: pd.DataFrame, df_bench: pd.DataFrame,
+                 timeframe: TimeFrame = TimeFrame.HOUR, initial_balance: float = 1000.0,
+                 risk_free_rate: float = 0.02):
+        self.timeframe = timeframe
+        self.initial_balance = initial_balance
+        self.risk_free_rate = risk_free_rate
+        self.throughput = None
+        # 与参数扫描共用同一套数据准备
+        self.arrays = ParameterSweep(df_alt, df_bench, timeframe, initial_balance,
+                                     risk_free_rate).arrays
+        self.times = self.arrays['open_time'].view('M8[ns]')
+
+    def _offset(self, start: int, size: WindowSize) -> int:
+        """从第 start 根K线起 size(K线数或时间长度)之后的位置"""
+        if isinstance(size, (int, np.integer)):
+            return min(start + int(size), len(self.times))
+        end = self.times[start] + pd.Timedelta(size).to_timedelta64()
+        return int(np.searchsorted(self.times, end, side='left'))
+
+    def windows(self, train: WindowSize, test: WindowSize, step: Optional[WindowSize] = None,
+                anchored: bool = False) -> List[Tuple[int, int, int, int]]:
+        """
+        (train_lo, train_hi, test_lo, test_hi) 形式的K线下标区间，右端不含
+        step 默认等于 test，使测试期首尾相接；anchored=True 时训练期始终从第一根K线开始
+        最后一个测试期不足 test 长度时截到数据结尾
+        """
+        step = test if step is None else step
+        n = len(self.times)
+        result = []
+        start = 0
+        while start < n:
+            train_hi = self._offset(start, train)
+            test_hi = self._offset(train_hi, test) if train_hi < n else n
+            if train_hi >= n or test_hi <= train_hi:
+                break
+            result.append((0 if anchored else start, train_hi, train_hi, test_hi))
+            next_start = self._offset(start, step)
+            if next_start <= start:
+                break
+            start = next_start
+        return result
+
+    def run(self, grid: Dict[str, List], train: WindowSize, test: WindowSize,
+            step: Optional[WindowSize] = None, anchored: bool = False,
+            workers: Optional[int] = None, sort_by: str = 'Sharpe Ratio',
+            ascending: bool = False) -> WalkForwardResult:
+        """运行所有窗口，返回每个窗口的结果和拼接后的样本外余额"""
+        combos = ParameterSweep.expand_grid(grid)
+        windows = self.windows(train, test, step, anchored)
+        tasks = [(k, w[0], w[1], combos, sort_by, ascending) for k, w in enumerate(windows)]
+        # 锚定模式下越靠后的窗口越长，先派发大窗口让各进程负载均衡
+        tasks.sort(key=lambda task: task[2] - task[1], reverse=True)
+        workers = min(workers or os.cpu_count(), max(len(tasks), 1))
+
+        start = time.perf_counter()
+        with SharedArrays(self.arrays) as shared:
+            with Pool(processes=workers, initializer=_init_worker,
+                      initargs=(shared.specs, self.timeframe.value,
+                                self.initial_balance, self.risk_free_rate)) as pool:
+                results = sorted(pool.map(_select_window, tasks, chunksize=1), key=lambda r: r['window'])
+                # 测试期依赖上一个窗口的期末余额，只能按时间顺序逐个回测(每个窗口一次，开销很小)
+                state = None
+                for (_, _, test_lo, test_hi), res in zip(windows, results):
+                    res.update(pool.apply(_test_window, ((res['params'], test_lo, test_hi, state),)))
+                    state = res['state']
+        elapsed = time.perf_counter() - start
+        self.throughput = len(tasks) * (len(combos) + 1) / elapsed if elapsed > 0 else float('inf')
+        return self._stitch(windows, results, list(grid))
+
+    def _stitch(self, windows: List[Tuple[int, int, int, int]], results: List[Dict],
+                grid_names: List[str]) -> WalkForwardResult:
+        """
+        按测试期顺序拼接余额曲线
+        每个测试期都从上一个测试期的期末余额开始，所以各段余额直接首尾相接
+        """
+        rows, times, values = [], [], []
+        for (train_lo, train_hi, test_lo, test_hi), res in zip(windows, results):
+            values.append(res['test_equity'])
+            times.append(self.times[test_lo:test_hi])
+
+            row = {
+                'window': res['window'],
+                'train_start': self.times[train_lo], 'train_end': self.times[train_hi - 1],
+                'test_start': self.times[test_lo], 'test_end': self.times[test_hi - 1],
+            }
+            row.update({name: res['params'][name] for name in grid_names})
+            row['train_score'] = res['train_score']
+            row.update({f'test {key}': value for key, value in res['test_metrics'].items()})
+            rows.append(row)
+
+        if values:
+            equity = pd.Series(np.concatenate(values), index=pd.DatetimeIndex(np.concatenate(times)),
+                               name='balance')
+        else:
+            equity = pd.Series(dtype=float, name='balance')
+        return WalkForwardResult(windows=pd.DataFrame(rows), equity=equity)
+
+
+def _window_size(text: str) -> WindowSize:
+    return int(text) if text.isdigit() else text
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Parallel walk-forward evaluation for BackTest")
+    parser.add_argument('--alt', required=True, help="alt coin *_format.csv")
+    parser.add_argument('--bench', required=True, help="benchmark *_format.csv")
+    parser.add_argument('--timeframe', default='hour', choices=[tf.value for tf in TimeFrame])
+    parser.add_argument('--train', required=True, help="bars (e.g. 2000) or duration (e.g. 90D)")
+    parser.add_argument('--test', required=True, help="bars or duration")
+    parser.add_argument('--step', default=None, help="bars or duration, defaults to --test")
+    parser.add_argument('--anchored', action='store_true', help="train windows always start at the first bar")
+    parser.add_argument('--grid', action='append', default=[],
+                        help="name=v1,v2,... (repeatable), names: " + ", ".join(SWEEP_DEFAULTS))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--sort', default='Sharpe Ratio')
+    parser.add_argument('--ascending', action='store_true')
+    parser.add_argument('--output', default=None, help="save per-window table as csv")
+    parser.add_argument('--equity-output', default=None, help="save stitched equity as csv")
+    args = parser.parse_args(argv)
+
+    wf = WalkForward(pd.read_csv(args.alt), pd.read_csv(args.bench), TimeFrame(args.timeframe))
+    result = wf.run(_parse_grid(args.grid), _window_size(args.train), _window_size(args.test),
+                    step=_window_size(args.step) if args.step else None, anchored=args.anchored,
+                    workers=args.workers, sort_by=args.sort, ascending=args.ascending)
+    print(result.windows.to_string())
+    if len(result.equity):
+        print(f"out-of-sample: {result.equity.iloc[0]:.2f} -> {result.equity.iloc[-1]:.2f} "
+              f"over {len(result.windows)} windows, {wf.throughput:.1f} backtests/s")
+    if args.output:
+        result.windows.to_csv(args.output, index=False)
+    if args.equity_output:
+        result.equity.to_csv(args.equity_output)
+    return result
+
+
+if __name__ == '__main__':
+    main()